@@ -1,7 +1,13 @@
 import os
+import time
+import asyncio
+import threading
 
-from mcore.db import MongoDB
-from mcore.errors import MStackAuthenticationError, NotFoundError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from mcore.db import MongoDB, AsyncMongoDB, STORED_DOCUMENT_CONTEXT
+from mcore.errors import MStackAuthenticationError, MStackBusyError, NotFoundError
 from mcore.models import User, UserCreator, UserPasswordHash, Profile
 
 from datetime import datetime, timedelta
@@ -13,17 +19,33 @@ from passlib.context import CryptContext
 __all__ = [
     'verify_password',
     'get_password_hash',
+    'PasswordHashPool',
+    'hash_pool',
+    'verify_password_async',
+    'get_password_hash_async',
     'authenticate_user',
     'create_access_token',
     'create_new_user',
     'delete_user',
-    'delete_profile'
+    'delete_profile',
+    'authenticate_user_async',
+    'create_new_user_async',
+    'delete_user_async',
+    'delete_profile_async',
+    'user_token_claims',
+    'TokenUserCache',
+    'user_cache'
 ]
 
 
 MSTACK_AUTH_SECRET_KEY = os.environ.get('MSTACK_AUTH_SECRET_KEY')   # openssl rand -hex 32
 MSTACK_AUTH_ALGORITHM = os.environ.get('MSTACK_AUTH_ALGORITHM', 'HS256')
 MSTACK_AUTH_LOGIN_EXPIRATION_MINUTES = os.environ.get('MSTACK_AUTH_LOGIN_EXPIRATION_MINUTES', 60 * 24 * 7)
+MSTACK_AUTH_USER_CACHE_SIZE = int(os.environ.get('MSTACK_AUTH_USER_CACHE_SIZE', 10_000))   # 0 disables the cache
+MSTACK_AUTH_USER_CACHE_TTL = float(os.environ.get('MSTACK_AUTH_USER_CACHE_TTL', 60))   # seconds
+MSTACK_AUTH_SIGNED_CLAIMS = os.environ.get('MSTACK_AUTH_SIGNED_CLAIMS', '0').lower() in ('1', 't', 'true')
+MSTACK_AUTH_HASH_WORKERS = int(os.environ.get('MSTACK_AUTH_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+MSTACK_AUTH_HASH_QUEUE_SIZE = int(os.environ.get('MSTACK_AUTH_HASH_QUEUE_SIZE', 64))
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
@@ -38,18 +60,93 @@ def get_password_hash(password:str) -> str:
     return pwd_context.hash(password)
 
 
-def authenticate_user(email: str, password: str) -> User:
-    db = MongoDB.from_cache()
+class PasswordHashPool:
+    """
+    runs bcrypt hashing and verification in a bounded thread pool so logins don't block the event loop,
+    bcrypt releases the GIL so the workers hash in parallel
+
+    at most workers + queue_size calls are pending at once, further calls fail fast with MStackBusyError
+    instead of queueing without bound during a login storm
+    """
+
+    def __init__(self, workers:int=MSTACK_AUTH_HASH_WORKERS, queue_size:int=MSTACK_AUTH_HASH_QUEUE_SIZE) -> None:
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 0)
+        self.pending = 0
+        self._executor:ThreadPoolExecutor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                raise MStackBusyError('Too many concurrent password checks, try again later')
+            
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mstack-auth-hash')
+            
+            self.pending += 1
+        
+        # decrement when the work finishes, not when the caller stops waiting, so cancelled requests still count #
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+    
+    def _done(self, _:Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+    
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+hash_pool = PasswordHashPool()
+
+
+async def verify_password_async(plain_password:str, hashed_password:str) -> bool:
+    return await hash_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password:str) -> str:
+    return await hash_pool.run(get_password_hash, password)
+
 
+def _user_password_pipeline(email:str) -> list[dict]:
+    """aggregation on the users collection that joins the password hash, one round trip on the email and user_id indexes"""
+    return [
+        {'$match': {'email': email.lower()}},
+        {'$limit': 1},
+        {'$lookup': {
+            'from': UserPasswordHash.DB_NAME,
+            'localField': '_id',
+            'foreignField': 'user_id',
+            'as': 'password_hashes'
+        }}
+    ]
+
+
+def _user_and_password_hash(documents:list[dict]) -> tuple[User, UserPasswordHash]:
     try:
-        user:User = db.find_one(User, {'email': email.lower()})
+        document = documents[0]
     except IndexError:
         raise MStackAuthenticationError('Invalid username or password (a)')
     
     try:
-        user_pw:UserPasswordHash = list(db.find(UserPasswordHash, {'user_id': user.id}))[0]
+        user_pw = UserPasswordHash.model_validate(document.pop('password_hashes')[0], context=STORED_DOCUMENT_CONTEXT)
     except IndexError:
         raise MStackAuthenticationError('Invalid username or password (b)')
+    
+    return User.model_validate(document, context=STORED_DOCUMENT_CONTEXT), user_pw
+
+
+def authenticate_user(email: str, password: str) -> User:
+    db = MongoDB.from_cache()
+    user, user_pw = _user_and_password_hash(db.aggregate(User, _user_password_pipeline(email)))
 
     if not verify_password(password, user_pw.hashed_password):
         raise MStackAuthenticationError('Invalid username or password (c)')
@@ -70,6 +167,17 @@ def create_access_token(data: dict, expires_delta:timedelta | None = None):
     return jwt.encode(to_encode, MSTACK_AUTH_SECRET_KEY, algorithm=MSTACK_AUTH_ALGORITHM)
 
 
+def user_token_claims(user:User) -> dict:
+    """
+    claims for a login token, the sub is the user id, in signed claims mode the user is embedded in the
+    token so current_user can skip the database, these claims are trusted until the token expires
+    """
+    claims = {'sub': str(user.id)}
+    if MSTACK_AUTH_SIGNED_CLAIMS:
+        claims['user'] = user.model_dump(mode='json')
+    return claims
+
+
 def create_new_user(user_creator:UserCreator) -> User:
     db = MongoDB.from_cache()
 
@@ -105,6 +213,7 @@ def delete_user(user:User) -> None:
         pass
     
     db.delete(User, id=user.id)
+    user_cache.invalidate(user.id)
 
 
 def delete_profile(profile:Profile, logged_in_user:User) -> None:
@@ -116,3 +225,165 @@ def delete_profile(profile:Profile, logged_in_user:User) -> None:
     
     db = MongoDB.from_cache()
     db.delete(Profile, id=profile.id)
+
+
+#
+# token user cache
+#
+
+
+class TokenUserCache:
+    """
+    bounded LRU cache of users keyed by the token sub (the user id) so authenticated requests 
+    don't need to read the user from the database, entries expire after ttl seconds
+
+    the cache is per process, invalidate() removes a user from this process only, other workers
+    will serve their cached copy until it expires so keep the ttl short
+    """
+
+    def __init__(self, max_size:int=MSTACK_AUTH_USER_CACHE_SIZE, ttl:float=MSTACK_AUTH_USER_CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users:OrderedDict[str, tuple[float, User]] = OrderedDict()
+        self._revoked:OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id:str) -> User | None:
+        user_id = str(user_id)
+        with self._lock:
+            try:
+                expires, user = self._users[user_id]
+            except KeyError:
+                self.misses += 1
+                return None
+            
+            if expires < time.monotonic():
+                del self._users[user_id]
+                self.misses += 1
+                return None
+            
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return user.model_copy()
+    
+    def set(self, user:User) -> None:
+        if self.max_size <= 0:
+            return
+        
+        user_id = str(user.id)
+        with self._lock:
+            if self._is_revoked(user_id):
+                # a request that read the user before it was deleted must not put it back #
+                return
+            
+            self._users[user_id] = (time.monotonic() + self.ttl, user.model_copy())
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id:str) -> None:
+        """call when a user is deleted or updated"""
+        user_id = str(user_id)
+        with self._lock:
+            self._users.pop(user_id, None)
+
+            # remember the id for the life of a token so signed claims and in flight reads are rejected #
+            self._revoked[user_id] = time.monotonic() + float(MSTACK_AUTH_LOGIN_EXPIRATION_MINUTES) * 60
+            self._revoked.move_to_end(user_id)
+            while len(self._revoked) > max(self.max_size, 1):
+                self._revoked.popitem(last=False)
+
+    def is_revoked(self, user_id:str) -> bool:
+        with self._lock:
+            return self._is_revoked(str(user_id))
+
+    def _is_revoked(self, user_id:str) -> bool:
+        try:
+            expires = self._revoked[user_id]
+        except KeyError:
+            return False
+        
+        if expires < time.monotonic():
+            del self._revoked[user_id]
+            return False
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self._revoked.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._users),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'signed_claims': MSTACK_AUTH_SIGNED_CLAIMS
+        }
+
+
+user_cache = TokenUserCache()
+
+
+#
+# async variants used by the web server
+#
+
+
+async def authenticate_user_async(email: str, password: str) -> User:
+    db = AsyncMongoDB.from_cache()
+    user, user_pw = _user_and_password_hash(await db.aggregate(User, _user_password_pipeline(email)))
+
+    if not await verify_password_async(password, user_pw.hashed_password):
+        raise MStackAuthenticationError('Invalid username or password (c)')
+    
+    return user
+
+
+async def create_new_user_async(user_creator:UserCreator) -> User:
+    db = AsyncMongoDB.from_cache()
+
+    user = user_creator.create_model()
+    user.email = user.email.lower()
+
+    try:
+        await db.find_one(User, {'email': user.email})
+    except NotFoundError:
+        """see note in create_new_user"""
+    else:
+        raise MStackAuthenticationError('Email already registered')
+
+    await db.create(user)
+
+    user_password_hash = UserPasswordHash(user_id=user.id, hashed_password=await get_password_hash_async(user_creator.password1))
+    await db.create(user_password_hash)
+
+    return user
+
+
+async def delete_user_async(user:User) -> None:
+    db = AsyncMongoDB.from_cache()
+    try:
+        user_pw:UserPasswordHash = await db.find_one(UserPasswordHash, {'user_id': user.id})
+        await db.delete(UserPasswordHash, id=user_pw.id)
+    except NotFoundError:
+        pass
+    
+    await db.delete(User, id=user.id)
+    user_cache.invalidate(user.id)
+
+
+async def delete_profile_async(profile:Profile, logged_in_user:User) -> None:
+    if profile.user_cid != logged_in_user.cid:
+        raise MStackAuthenticationError('Only logged in user can delete their own profile')
+    
+    db = AsyncMongoDB.from_cache()
+    await db.delete(Profile, id=profile.id)
@@ -1,16 +1,22 @@
 import os 
+import threading
 
 from io import BytesIO
+from hashlib import sha3_256
 from pathlib import Path
-from typing import List, Callable, BinaryIO
+from typing import List, Type, Callable, BinaryIO, Generator
 from os.path import join
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from mcore.errors import MStackClientError, NotFoundError
 from mserve import IndexResponse
-from mcore.types import ModelIdType, ContentIdType
+from mcore.types import ModelIdType, ContentId, ContentIdType
 from mcore.models import *
 
+from pydantic import BaseModel
+
 import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from requests.exceptions import RequestException
 
 
@@ -40,18 +46,21 @@ class MStackClient:
     def _call(self, method:str, endpoint:str, *args, **kwargs) -> dict:
         url = join(self.url_base, endpoint)
         try:
-            self.response = self.session.request(method, url, *args, **kwargs)
+            response = self.session.request(method, url, *args, **kwargs)
         except RequestException as e:
             raise MStackClientError(str(e), url, e)
         
-        if self.response.status_code == 404:
+        # parts are sent from several threads, each call checks its own response, self.response is only kept for callers to inspect #
+        self.response = response
+
+        if response.status_code == 404:
             raise NotFoundError(f'Not Found: {url}')
         
         try:
-            self.response.raise_for_status()
-            return self.response.json()
+            response.raise_for_status()
+            return response.json()
         except RequestException as e:
-            raise MStackClientError(str(e), url, e, self.response)
+            raise MStackClientError(str(e), url, e, response)
         
     def _get(self, endpoint: str, *args, **kwargs) -> dict:
         return self._call('GET', endpoint, *args, **kwargs)
@@ -79,6 +88,36 @@ class MStackClient:
         else:
             raise MStackClientError(f'must provide cid or id')
 
+    def iter_all(self, list_op:Callable[..., list], size:int=50) -> Generator:
+        """
+        walk an entire collection page by page with a list method such as client.profile_list,
+        each page is requested with the id of the last item from the previous page so the cost per page stays constant
+        """
+        after = None
+        while True:
+            page = list_op(size=size, after=after)
+            yield from page
+
+            if len(page) < size:
+                break
+
+            after = str(page[-1].id)
+
+    @staticmethod
+    def _fields_param(fields:List[str] = None) -> str | None:
+        return None if fields is None else ','.join(fields)
+
+    @staticmethod
+    def _load(model_type:Type[BaseModel], data:dict, fields:List[str] = None) -> BaseModel:
+        """a model from response data, when fields were requested it is a partial model with only those fields"""
+        if fields is None:
+            return model_type(**data)
+        return partial_model(model_type, fields)(**data)
+
+    @staticmethod
+    def _batch_ids(ids:List[str] = None, cids:List[str] = None) -> dict:
+        return BatchIds(ids=ids, cids=cids).model_dump(mode='json')
+
     #
     # main
     #
@@ -103,17 +142,21 @@ class MStackClient:
         data = self._post('core/users', json=user_creator.model_dump())
         return User(**data)
 
-    def user_read(self, id:str = None, cid:str = None) -> User:
+    def user_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> User:
         url = self._model_id_type_url('core/users', id, cid)
-        data = self._get(url)
-        return User(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(User, data, fields)
+
+    def user_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[User]:
+        data = self._post('core/users/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[User](**data)
 
     def user_delete(self) -> None:
         self._delete('core/users/me')
 
-    def user_list(self, offset:int=0, size:int=50) -> List[User]:
-        data = self._get('core/users', params={'offset': offset, 'size': size})
-        return [User(**user) for user in data]
+    def user_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[User]:
+        data = self._get('core/users', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(User, user, fields) for user in data]
 
     # profiles #
 
@@ -121,18 +164,29 @@ class MStackClient:
         data = self._post('core/profiles', json=profile_creator.model_dump())
         return Profile(**data)
     
-    def profile_read(self, id:str = None, cid:str = None) -> Profile:
+    def profile_create_many(self, profile_creators: List[ProfileCreator]) -> List[Profile]:
+        data = self._post('core/profiles/batch', json=[creator.model_dump() for creator in profile_creators])
+        return [Profile(**profile) for profile in data]
+    
+    def profile_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> Profile:
         url = self._model_id_type_url('core/profiles', id, cid)
-        data = self._get(url)
-        return Profile(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(Profile, data, fields)
+
+    def profile_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[Profile]:
+        data = self._post('core/profiles/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[Profile](**data)
     
     def profile_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/profiles', id, cid)
         self._delete(url)
 
-    def profile_list(self, offset:int=0, size:int=50) -> List[Profile]:
-        data = self._get('core/profiles', params={'offset': offset, 'size': size})
-        return [Profile(**profile) for profile in data]
+    def profile_delete_many(self, ids:List[str] = None, cids:List[str] = None) -> None:
+        self._post('core/profiles/batch/delete', json=self._batch_ids(ids, cids))
+
+    def profile_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[Profile]:
+        data = self._get('core/profiles', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(Profile, profile, fields) for profile in data]
 
     # file upload #
 
@@ -147,23 +201,49 @@ class MStackClient:
     def file_uploader_delete(self, id:str = None) -> None:
         self._delete(f'core/file-uploader/{id}')
 
-    def file_uploaders_list(self, offset:int=0, size:int=50) -> List[FileUploader]:
-        data = self._get('core/file-uploader', params={'offset': offset, 'size': size})
+    def file_uploaders_list(self, offset:int=0, size:int=50, after:str=None) -> List[FileUploader]:
+        data = self._get('core/file-uploader', params={'offset': offset, 'size': size, 'after': after})
         return [FileUploader(**uploader) for uploader in data]
     
     def upload_chunk(self, id:str, chunk:bytes) -> FileUploader:
         data = self._post(f'core/file-uploader/{id}', files={'chunk': BytesIO(chunk)})
         return FileUploader(**data)
 
+    def upload_part(self, id:str, part_number:int, data:bytes) -> FileUploader:
+        """the part is sent with its checksum so the server rejects it if it was corrupted on the way"""
+        headers = {'Content-Type': 'application/octet-stream', FILE_UPLOAD_CHECKSUM_HEADER: sha3_256(data).hexdigest()}
+        data = self._put(f'core/file-uploader/{id}/parts/{part_number}', data=data, headers=headers)
+        return FileUploader(**data)
+
+    def upload_part_reset(self, id:str, part_number:int) -> FileUploader:
+        data = self._delete(f'core/file-uploader/{id}/parts/{part_number}')
+        return FileUploader(**data)
+
+    def file_uploader_ranges(self, id:str) -> FileUploaderRanges:
+        data = self._get(f'core/file-uploader/{id}/ranges')
+        return FileUploaderRanges(**data)
+
+    def upload_stream(self, id:str, file_obj:BinaryIO) -> FileUploader:
+        """send the rest of file_obj in one streamed request, neither side holds more than a buffer in memory"""
+        data = self._put(f'core/file-uploader/{id}', data=file_obj, headers={'Content-Type': 'application/octet-stream'})
+        return FileUploader(**data)
+
     def upload_file(
             self, 
             file_path:str | Path, 
             type:FileUploadTypes, 
             extension:str=None,
             chunk_size=250_000, 
-            on_update:Callable[[], FileUploader]=None
+            on_update:Callable[[], FileUploader]=None,
+            stream:bool=False,
+            part_size:int=None,
+            concurrency:int=4
         ) -> FileUploader:
-        """if extension is not provided, it will be inferred from the file_path"""
+        """
+        if extension is not provided, it will be inferred from the file_path,
+        if stream is True the file is sent in a single streamed request instead of chunk_size requests,
+        if part_size is set the file is sent as parts of part_size bytes, concurrency parts at a time
+        """
         
         if isinstance(file_path, str):
             file_path = Path(file_path)
@@ -172,7 +252,7 @@ class MStackClient:
         ext = file_path.suffix[1:] if extension is None else extension
         
         with open(file_path, 'rb') as file:
-            return self.upload_file_obj(file, type, size, ext, chunk_size, on_update)
+            return self.upload_file_obj(file, type, size, ext, chunk_size, on_update, stream, part_size, concurrency)
     
     def upload_file_obj(
             self, 
@@ -182,10 +262,62 @@ class MStackClient:
             extension:str,
             chunk_size=250_000, 
             on_update:Callable[[], FileUploader]=None, 
+            stream:bool=False,
+            part_size:int=None,
+            concurrency:int=4
         ) -> FileUploader:
         
-        uploader = self.file_uploader_create(FileUploaderCreator(total_size=size, type=type, ext=extension))
+        uploader = self.file_uploader_create(FileUploaderCreator(total_size=size, type=type, ext=extension, part_size=part_size))
+
+        if part_size is not None:
+            return self._upload_parts(uploader, file_obj, concurrency, on_update)
+
+        return self._upload_append(uploader, file_obj, chunk_size, on_update, stream)
+
+    def resume_upload(
+            self, 
+            id:str, 
+            file_path:str | Path,
+            chunk_size=250_000, 
+            on_update:Callable[[], FileUploader]=None,
+            stream:bool=False,
+            concurrency:int=4
+        ) -> FileUploader:
+        """continue an interrupted upload_file of file_path to uploader id without sending data the server already has"""
+        with open(file_path, 'rb') as file:
+            return self.resume_upload_obj(id, file, chunk_size, on_update, stream, concurrency)
 
+    def resume_upload_obj(
+            self, 
+            id:str, 
+            file_obj:BinaryIO,
+            chunk_size=250_000, 
+            on_update:Callable[[], FileUploader]=None,
+            stream:bool=False,
+            concurrency:int=4
+        ) -> FileUploader:
+        """
+        continue an interrupted upload from file_obj, positioned where the upload started,
+        part uploads compare the checksum of every received part with the local data and only send 
+        missing parts or parts that don't match, other uploads continue from the last recorded byte
+        """
+        uploader = self.file_uploader_read(id)
+        if uploader.status != FileUploadStatus.uploading:
+            return uploader
+
+        if uploader.part_size is not None:
+            return self._upload_parts(uploader, file_obj, concurrency, on_update)
+
+        file_obj.seek(uploader.total_uploaded, os.SEEK_CUR)
+        return self._upload_append(uploader, file_obj, chunk_size, on_update, stream)
+
+    def _upload_append(self, uploader:FileUploader, file_obj:BinaryIO, chunk_size:int, on_update:Callable[[], FileUploader]=None, stream:bool=False) -> FileUploader:
+        """send the rest of file_obj in one streamed request or in chunk_size requests"""
+        if stream:
+            uploader = self.upload_stream(uploader.id, file_obj)
+            if on_update is not None:
+                on_update(uploader)
+            return uploader
 
         while True:
             chunk = file_obj.read(chunk_size)
@@ -198,19 +330,127 @@ class MStackClient:
 
         return uploader
 
-    def download_file(cid: ContentIdType):
-        raise NotImplementedError('download_file not implemented')
+    def _upload_parts(self, uploader:FileUploader, file_obj:BinaryIO, concurrency:int, on_update:Callable[[], FileUploader]=None) -> FileUploader:
+        """
+        send every part of uploader from file_obj concurrently, at most concurrency parts are held in memory,
+        parts the server already has are skipped if their checksum matches the local data and reset and sent again if not
+        """
+        if isinstance(self.session, requests.Session) and concurrency > DEFAULT_POOLSIZE:
+            self.session.mount(self.url_base, HTTPAdapter(pool_maxsize=concurrency))
+
+        start = file_obj.tell()
+        read_lock = threading.Lock()
+        received = {part_number: uploader.part_checksums.get(str(part_number)) for part_number in uploader.parts}
+
+        def send_part(part_number:int) -> FileUploader | None:
+            offset, size = uploader.part_range(part_number)
+            with read_lock:
+                file_obj.seek(start + offset)
+                data = file_obj.read(size)
+
+            if part_number in received:
+                if received[part_number] == sha3_256(data).hexdigest():
+                    return None
+                self.upload_part_reset(uploader.id, part_number)
+            return self.upload_part(uploader.id, part_number, data)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(send_part, part_number) for part_number in range(uploader.part_count)]
+            for future in as_completed(futures):
+                try:
+                    update = future.result()
+                except Exception:
+                    # don't send the rest of the file once a part has failed #
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+                if update is None:
+                    continue
+                if update.total_uploaded >= uploader.total_uploaded:
+                    uploader = update
+                if on_update is not None:
+                    on_update(update)
+
+        return uploader
+
+    def download_file(
+            self, 
+            payload_cid:ContentIdType | str, 
+            file_path:str | Path, 
+            chunk_size:int=1024 * 1024, 
+            resume:bool=True,
+            on_progress:Callable[[int], None]=None
+        ) -> Path:
+        """
+        stream a stored payload to file_path chunk_size bytes at a time, if resume is True and file_path 
+        already holds the start of the payload only the missing range is requested,
+        on_progress is called with the number of bytes on disk after each chunk,
+        the file is checked against the payload cid's digest and downloaded again in full if a resumed prefix was corrupt
+        """
+        
+        cid = ContentId.validate(payload_cid)
+        path = Path(file_path)
+
+        offset = path.stat().st_size if resume and path.exists() else 0
+        if offset == cid.size and self._is_payload(path, cid):
+            return path
+        if offset >= cid.size:
+            offset = 0
+
+        url = join(self.url_base, f'core/payloads/{cid}')
+        for start in ([offset, 0] if offset > 0 else [0]):
+            size = self._download_range(url, path, start, chunk_size, on_progress)
+            if size != cid.size:
+                raise MStackClientError(f'incomplete download: {size} of {cid.size} bytes', url, None, self.response)
+            if self._is_payload(path, cid):
+                return path
+
+        raise MStackClientError(f'downloaded file does not match payload: {cid}', url, None, self.response)
+
+    @staticmethod
+    def _is_payload(path:Path, cid:ContentId) -> bool:
+        with path.open('rb') as stream:
+            return ContentId.from_io(stream, path.stat().st_size, cid.ext) == cid
+
+    def _download_range(self, url:str, path:Path, offset:int, chunk_size:int, on_progress:Callable[[int], None]=None) -> int:
+        """write the payload at url to path from offset to the end, returns the size of the file"""
+        headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+        try:
+            with self.session.get(url, headers=headers, stream=True) as self.response:
+                if self.response.status_code == 404:
+                    raise NotFoundError(f'Not Found: {url}')
+                self.response.raise_for_status()
+
+                # a server that ignores Range sends the whole payload #
+                if self.response.status_code != 206:
+                    offset = 0
+                
+                with path.open('r+b' if offset > 0 else 'wb') as file:
+                    file.seek(offset)
+                    file.truncate()
+                    for block in self.response.iter_content(chunk_size):
+                        file.write(block)
+                        offset += len(block)
+                        if on_progress is not None:
+                            on_progress(offset)
+        except RequestException as e:
+            raise MStackClientError(str(e), url, e, self.response)
+        
+        return offset
 
     # images #
 
-    def image_file_list(self, offset:int=0, size:int=50) -> List[ImageFile]:
-        data = self._get('core/image-files', params={'offset': offset, 'size': size})
-        return [ImageFile(**image_file) for image_file in data]
+    def image_file_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[ImageFile]:
+        data = self._get('core/image-files', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(ImageFile, image_file, fields) for image_file in data]
     
-    def image_file_read(self, id:str = None, cid:str = None) -> ImageFile:
+    def image_file_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> ImageFile:
         url = self._model_id_type_url('core/image-files', id, cid)
-        data = self._get(url)
-        return ImageFile(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(ImageFile, data, fields)
+
+    def image_file_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[ImageFile]:
+        data = self._post('core/image-files/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[ImageFile](**data)
     
     def image_file_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/image-files', id, cid)
@@ -220,14 +460,18 @@ class MStackClient:
         data = self._post('core/image-release', json=image_release_creator.model_dump())
         return ImageRelease(**data)
     
-    def image_release_list(self, offset:int=0, size:int=50) -> List[ImageRelease]:
-        data = self._get('core/image-release', params={'offset': offset, 'size': size})
-        return [ImageRelease(**image_release) for image_release in data]
+    def image_release_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[ImageRelease]:
+        data = self._get('core/image-release', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(ImageRelease, image_release, fields) for image_release in data]
     
-    def image_release_read(self, id:str = None, cid:str = None) -> ImageRelease:
+    def image_release_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> ImageRelease:
         url = self._model_id_type_url('core/image-release', id, cid)
-        data = self._get(url)
-        return ImageRelease(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(ImageRelease, data, fields)
+
+    def image_release_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[ImageRelease]:
+        data = self._post('core/image-release/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[ImageRelease](**data)
     
     def image_release_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/image-release', id, cid)
@@ -235,14 +479,18 @@ class MStackClient:
 
     # audio #
 
-    def audio_file_list(self, offset:int=0, size:int=50) -> List[AudioFile]:
-        data = self._get('core/audio-files', params={'offset': offset, 'size': size})
-        return [AudioFile(**audio_file) for audio_file in data]
+    def audio_file_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[AudioFile]:
+        data = self._get('core/audio-files', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(AudioFile, audio_file, fields) for audio_file in data]
     
-    def audio_file_read(self, id:str = None, cid:str = None) -> AudioFile:
+    def audio_file_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> AudioFile:
         url = self._model_id_type_url('core/audio-files', id, cid)
-        data = self._get(url)
-        return AudioFile(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(AudioFile, data, fields)
+
+    def audio_file_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[AudioFile]:
+        data = self._post('core/audio-files/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[AudioFile](**data)
     
     def audio_file_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/audio-files', id, cid)
@@ -252,14 +500,18 @@ class MStackClient:
         data = self._post('core/audio-release', json=audio_release_creator.model_dump())
         return AudioRelease(**data)
     
-    def audio_release_list(self, offset:int=0, size:int=50) -> List[AudioRelease]:
-        data = self._get('core/audio-release', params={'offset': offset, 'size': size})
-        return [AudioRelease(**audio_release) for audio_release in data]
+    def audio_release_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[AudioRelease]:
+        data = self._get('core/audio-release', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(AudioRelease, audio_release, fields) for audio_release in data]
     
-    def audio_release_read(self, id:str = None, cid:str = None) -> AudioRelease:
+    def audio_release_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> AudioRelease:
         url = self._model_id_type_url('core/audio-release', id, cid)
-        data = self._get(url)
-        return AudioRelease(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(AudioRelease, data, fields)
+
+    def audio_release_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[AudioRelease]:
+        data = self._post('core/audio-release/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[AudioRelease](**data)
 
     def audio_release_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/audio-release', id, cid)
@@ -267,14 +519,18 @@ class MStackClient:
 
     # video #
 
-    def video_file_list(self, offset:int=0, size:int=50) -> List[VideoFile]:
-        data = self._get('core/video-files', params={'offset': offset, 'size': size})
-        return [VideoFile(**video_file) for video_file in data]
+    def video_file_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[VideoFile]:
+        data = self._get('core/video-files', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(VideoFile, video_file, fields) for video_file in data]
     
-    def video_file_read(self, id:str = None, cid:str = None) -> VideoFile:
+    def video_file_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> VideoFile:
         url = self._model_id_type_url('core/video-files', id, cid)
-        data = self._get(url)
-        return VideoFile(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(VideoFile, data, fields)
+
+    def video_file_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[VideoFile]:
+        data = self._post('core/video-files/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[VideoFile](**data)
     
     def video_file_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/video-files', id, cid)
@@ -284,14 +540,18 @@ class MStackClient:
         data = self._post('core/video-release', json=video_release_creator.model_dump())
         return VideoRelease(**data)
     
-    def video_release_list(self, offset:int=0, size:int=50) -> List[VideoRelease]:
-        data = self._get('core/video-release', params={'offset': offset, 'size': size})
-        return [VideoRelease(**video_release) for video_release in data]
+    def video_release_list(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[VideoRelease]:
+        data = self._get('core/video-release', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(VideoRelease, video_release, fields) for video_release in data]
     
-    def video_release_read(self, id:str = None, cid:str = None) -> VideoRelease:
+    def video_release_read(self, id:str = None, cid:str = None, fields:List[str] = None) -> VideoRelease:
         url = self._model_id_type_url('core/video-release', id, cid)
-        data = self._get(url)
-        return VideoRelease(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(VideoRelease, data, fields)
+
+    def video_release_read_many(self, ids:List[str] = None, cids:List[str] = None) -> BatchReadResult[VideoRelease]:
+        data = self._post('core/video-release/batch/read', json=self._batch_ids(ids, cids))
+        return BatchReadResult[VideoRelease](**data)
 
     def video_release_delete(self, id:str = None, cid:str = None) -> None:
         url = self._model_id_type_url('core/video-release', id, cid)
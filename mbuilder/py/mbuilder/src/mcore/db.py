@@ -1,12 +1,15 @@
-from mcore.errors import MStackDBError, NotFoundError
+from mcore.errors import MStackDBError, MStackUserError, NotFoundError
 from mcore.types import ContentId
+from mcore.models import partial_model
 
 from os import environ
 
-from typing import Type, Generator, Union
+from typing import Type, Generator, AsyncGenerator, Iterable, Union
 from bson import ObjectId
-from pymongo import MongoClient
+from bson.errors import InvalidId
+from pymongo import MongoClient, AsyncMongoClient, IndexModel, UpdateOne, ReturnDocument, ASCENDING
 from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 from pydantic import BaseModel
 
 __all__ = [
@@ -14,7 +17,10 @@ __all__ = [
     'MONGO_DB_URI',
     'DEFAULT_MONGO_DB_NAME',
     'MONGO_DB_NAME',
-    'MongoDB'
+    'STORED_DOCUMENT_CONTEXT',
+    'indexed_models',
+    'MongoDB',
+    'AsyncMongoDB'
 ]
 
 
@@ -25,9 +31,180 @@ DEFAULT_MONGO_DB_NAME = 'mdev'
 MONGO_DB_NAME = environ.get('MONGO_DB_NAME', DEFAULT_MONGO_DB_NAME)
 
 _MONGO_DB = None
+_ASYNC_MONGO_DB = None
 
 InstanceOrType = Union[Type[BaseModel], BaseModel]
 
+
+def _collection_name(model: InstanceOrType) -> str:
+    try:
+        return model.__class__.DB_NAME
+    except AttributeError:
+        try:
+            return model.DB_NAME
+        except AttributeError:
+            raise MStackDBError(f'Invalid model: does not define a database collection')
+
+
+def _id_query(model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None, method:str='read') -> dict:
+    query = {}
+
+    try:
+        query['_id'] = ObjectId(model.id)
+    except AttributeError:
+        if id is not None:
+            query['_id'] = ObjectId(id)
+
+    try:
+        query['cid'] = str(model.cid)
+    except AttributeError:
+        if cid is not None:
+            query['cid'] = str(cid)
+
+    if '_id' not in query and 'cid' not in query:
+        raise MStackDBError(f'must supply id and or cid to {method} method')
+    
+    return query
+
+
+# ContentModel keeps the cid stored with a document instead of recomputing it from the content #
+STORED_DOCUMENT_CONTEXT = {'stored_document': True}
+
+def _load(model_type:Type[BaseModel], document:dict) -> BaseModel:
+    return model_type.model_validate(document, context=STORED_DOCUMENT_CONTEXT)
+
+def _model_from_document(model:InstanceOrType, collection_name:str, query:dict, document:dict | None) -> BaseModel:
+    if document is None:
+        item = ' '.join([f'{k}: {v}' for k, v in query.items()]).replace('_', '')
+        raise NotFoundError(f'item not found: {collection_name}: {item}')
+    
+    model_type = model if isinstance(model, type) else model.__class__
+    return _load(model_type, document)
+
+
+def indexed_models() -> list[Type[BaseModel]]:
+    """
+    returns every imported model that defines DB_NAME and INDEXES, these are the models that
+    ensure_indexes builds indexes for when it is not given an explicit list of models
+    """
+    models = {}
+    pending = [BaseModel]
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        name = getattr(cls, 'DB_NAME', None)
+        if isinstance(name, str) and getattr(cls, 'INDEXES', None):
+            models.setdefault(name, cls)
+
+    return list(models.values())
+
+
+def _plan_stages(explain:dict) -> list[str]:
+    """flatten the stages of the winning plan from the output of a cursor's explain() call"""
+    stages = []
+    pending = [explain['queryPlanner']['winningPlan']]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(node['stage'])
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+
+    return stages
+
+
+def _index_probe_filter(index:IndexModel) -> dict:
+    """an equality filter on each key of an index, used to verify the query planner selects an index for it"""
+    return {key: None for key in index.document['key'].keys()}
+
+
+def _many_query(ids:Iterable[Union[str, ObjectId]]=None, cids:Iterable[Union[str, ContentId]]=None, method:str='read_many') -> tuple[str, list, dict]:
+    """returns the field, the list of keys in request order and the $in query for a bulk read or delete by ids or cids"""
+    if (ids is None) == (cids is None):
+        raise MStackDBError(f'must supply either ids or cids to {method} method')
+    
+    if ids is not None:
+        keys = [ObjectId(id) for id in ids]
+        return '_id', keys, {'_id': {'$in': keys}}
+    else:
+        keys = [str(cid) for cid in cids]
+        return 'cid', keys, {'cid': {'$in': keys}}
+
+
+def _order_many(model_type:Type[BaseModel], field:str, keys:list, documents:Iterable[dict]) -> tuple[list[BaseModel], list[str]]:
+    """order documents from a bulk read by the requested keys, returns (models, keys of missing items)"""
+    by_key = {}
+    for document in documents:
+        by_key.setdefault(document[field], document)
+
+    models = []
+    missing = []
+    for key in keys:
+        try:
+            models.append(_load(model_type, by_key[key]))
+        except KeyError:
+            missing.append(str(key))
+    
+    return models, missing
+
+
+def _update_many_requests(models:list[BaseModel]) -> list[UpdateOne]:
+    return [UpdateOne({'_id': ObjectId(model.id)}, {'$set': model.model_dump(by_alias=True)}) for model in models]
+
+
+def _raw_fields(model_type:Type[BaseModel]) -> tuple[dict, dict]:
+    """the projection of a model's stored fields, and the stored keys to rename to field names, ex: _id -> id"""
+    projection = {}
+    renames = {}
+    for name, field in model_type.model_fields.items():
+        if field.exclude:
+            continue
+        key = field.serialization_alias or field.alias or name
+        projection[key] = 1
+        if key != name:
+            renames[key] = name
+    return projection, renames
+
+def _fields_query(model_type:Type[BaseModel], fields:Iterable[str] | None, kwargs:dict) -> Type[BaseModel]:
+    """the model to load documents into, when fields are requested the query is projected to them and a partial model is loaded"""
+    if fields is None:
+        return model_type
+    
+    load_type = partial_model(model_type, fields)
+    kwargs['projection'] = _raw_fields(load_type)[0]
+    return load_type
+
+def _raw_document(document:dict, renames:dict) -> dict:
+    return {renames.get(key, key): str(value) if isinstance(value, ObjectId) else value for key, value in document.items()}
+
+
+def _page_query(filter:dict | None, after:Union[str, ObjectId, None], kwargs:dict) -> dict | None:
+    """
+    pages are ordered by _id (unless the caller supplies a sort) so that after, the id of the last item 
+    in the previous page, can seek to the next page on the _id index instead of skipping over every prior item,
+    the cursor is only valid for the _id order so after can't be combined with another sort
+    """
+    kwargs.setdefault('sort', [('_id', ASCENDING)])
+
+    if not after:
+        return filter
+    
+    if [tuple(key) for key in kwargs['sort']] != [('_id', ASCENDING)]:
+        raise MStackUserError(f'Pagination cursor requires sorting by _id ascending, got: {kwargs["sort"]}')
+
+    try:
+        after_query = {'_id': {'$gt': ObjectId(after)}}
+    except (InvalidId, TypeError):
+        raise MStackUserError(f'Invalid pagination cursor: {after}')
+    
+    if not filter:
+        return after_query
+    else:
+        return {'$and': [filter, after_query]}
+
+
 class MongoDB:
 
     def __init__(self):
@@ -38,50 +215,24 @@ class MongoDB:
             pass
 
     def get_collection(self, model: InstanceOrType) -> Collection:
-        try:
-            name = model.__class__.DB_NAME
-        except AttributeError:
-            try:
-                name = model.DB_NAME
-            except AttributeError:
-                raise MStackDBError(f'Invalid model: does not define a database collection')
-        
-        return self.db[name]
+        return self.db[_collection_name(model)]
+    
+    def start_session(self, **kwargs):
+        return self.client.start_session(**kwargs)
 
     def create(self, model:BaseModel) -> BaseModel:
         collection = self.get_collection(model)
         result = collection.insert_one(model.model_dump(by_alias=True, exclude=['id']))
         model.id = result.inserted_id
 
-    def read(self, model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None) -> BaseModel:
-        query = {}
-
-        try:
-            query['_id'] = ObjectId(model.id)
-        except AttributeError:
-            if id is not None:
-                query['_id'] = ObjectId(id)
-
-        try:
-            query['cid'] = str(model.cid)
-        except AttributeError:
-            if cid is not None:
-                query['cid'] = str(cid)
-
-        if '_id' not in query and 'cid' not in query:
-            raise MStackDBError('must supply id and or cid to read method')
-
+    def read(self, model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None, fields:Iterable[str]=None) -> BaseModel:
+        query = _id_query(model, id, cid, 'read')
         collection = self.get_collection(model)
-        document = collection.find_one(query)
-
-        if document is None:
-            item = ' '.join([f'{k}: {v}' for k, v in query.items()]).replace('_', '')
-            raise NotFoundError(f'item not found: {collection.name}: {item}')
-        else:
-            try:
-                return model(**document)
-            except TypeError:
-                return model.__class__(**document)
+        kwargs = {}
+        if fields is not None:
+            model = _fields_query(model if isinstance(model, type) else model.__class__, fields, kwargs)
+        document = collection.find_one(query, **kwargs)
+        return _model_from_document(model, collection.name, query, document)
     
     def update(self, model:BaseModel) -> None:
         dumped_data = model.model_dump(by_alias=True)
@@ -92,30 +243,29 @@ class MongoDB:
             raise NotFoundError(f'Item not found in database')
 
     def delete(self, model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None) -> None:
-        query = {}
-
-        try:
-            query['_id'] = ObjectId(model.id)
-        except AttributeError:
-            if id is not None:
-                query['_id'] = ObjectId(id)
-
-        try:
-            query['cid'] = str(model.cid)
-        except AttributeError:
-            if cid is not None:
-                query['cid'] = str(cid)
-
-        if '_id' not in query and 'cid' not in query:
-            raise MStackDBError('must supply id and or cid to delete method')
-
+        query = _id_query(model, id, cid, 'delete')
         collection = self.get_collection(model)
         collection.delete_one(query)
 
-    def find(self, model_type: Type[BaseModel], filter=None, offset:int=0, size:int=50, **kwargs) -> Generator[BaseModel, None, None]:
+    def find(self, model_type: Type[BaseModel], filter=None, offset:int=0, size:int=50, after:Union[str, ObjectId]=None, fields:Iterable[str]=None, **kwargs) -> Generator[BaseModel, None, None]:
+        """if fields are given only those fields are read and partial models with just them (and id) are yielded"""
+        collection = self.get_collection(model_type)
+        filter = _page_query(filter, after, kwargs)
+        load_type = _fields_query(model_type, fields, kwargs)
+        for entry in collection.find(filter=filter, skip=offset, limit=size, **kwargs):
+            yield _load(load_type, entry)
+
+    def find_raw(self, model_type: Type[BaseModel], filter=None, offset:int=0, size:int=50, after:Union[str, ObjectId]=None, **kwargs) -> Generator[dict, None, None]:
+        """
+        like find but yields the stored documents projected to the model's fields without validating them,
+        _id is renamed to id and ObjectIds are converted to strings, for serving trusted documents as json
+        """
+        projection, renames = _raw_fields(model_type)
+        kwargs.setdefault('projection', projection)
         collection = self.get_collection(model_type)
+        filter = _page_query(filter, after, kwargs)
         for entry in collection.find(filter=filter, skip=offset, limit=size, **kwargs):
-            yield model_type(**entry)
+            yield _raw_document(entry, renames)
 
     def find_one(self, model_type: Type[BaseModel], filter=None, **kwargs) -> BaseModel:
         collection = self.get_collection(model_type)
@@ -123,7 +273,101 @@ class MongoDB:
         if entry is None:
             raise NotFoundError(f'Item not found in database')
         else:
-            return model_type(**entry)
+            return _load(model_type, entry)
+
+    def find_one_and_update(self, model_type: Type[BaseModel], filter:dict, update:dict, **kwargs) -> BaseModel:
+        """
+        atomically apply an update operator document such as {'$inc': ...} to the first item matching filter,
+        returns the updated model, raises NotFoundError if nothing matched
+        """
+        kwargs.setdefault('return_document', ReturnDocument.AFTER)
+        collection = self.get_collection(model_type)
+        entry = collection.find_one_and_update(filter, update, **kwargs)
+        if entry is None:
+            raise NotFoundError(f'Item not found in database')
+        else:
+            return _load(model_type, entry)
+
+    def aggregate(self, model_type: Type[BaseModel], pipeline:list[dict], **kwargs) -> list[dict]:
+        """run an aggregation pipeline on the model's collection, returns the raw documents"""
+        collection = self.get_collection(model_type)
+        return list(collection.aggregate(pipeline, **kwargs))
+
+    def create_many(self, models:list[BaseModel], ordered:bool=True) -> list[BaseModel]:
+        """
+        insert models of the same type in one round trip and set their ids, 
+        if ordered is False the server continues inserting after an error
+        """
+        if len(models) == 0:
+            return models
+        
+        collection = self.get_collection(models[0])
+        result = collection.insert_many([model.model_dump(by_alias=True, exclude=['id']) for model in models], ordered=ordered)
+        for model, id in zip(models, result.inserted_ids):
+            model.id = id
+        return models
+
+    def read_many(self, model_type:Type[BaseModel], ids:Iterable[Union[str, ObjectId]]=None, cids:Iterable[Union[str, ContentId]]=None) -> tuple[list[BaseModel], list[str]]:
+        """
+        read items by ids or cids with a single $in query, 
+        returns (models in request order, ids or cids that were not found)
+        """
+        field, keys, query = _many_query(ids, cids, 'read_many')
+        collection = self.get_collection(model_type)
+        return _order_many(model_type, field, keys, collection.find(query))
+    
+    def update_many(self, models:list[BaseModel], ordered:bool=True) -> int:
+        """update models of the same type with a single bulk write, returns the number of matched documents"""
+        if len(models) == 0:
+            return 0
+        
+        collection = self.get_collection(models[0])
+        result = collection.bulk_write(_update_many_requests(models), ordered=ordered)
+        if result.matched_count != len(models):
+            raise NotFoundError(f'{len(models) - result.matched_count} of {len(models)} items not found in database')
+        return result.matched_count
+
+    def delete_many(self, model_type:Type[BaseModel], ids:Iterable[Union[str, ObjectId]]=None, cids:Iterable[Union[str, ContentId]]=None) -> int:
+        """delete items by ids or cids with a single $in query, returns the number of deleted documents"""
+        _, _, query = _many_query(ids, cids, 'delete_many')
+        collection = self.get_collection(model_type)
+        return collection.delete_many(query).deleted_count
+
+    def ensure_indexes(self, model_types:Iterable[Type[BaseModel]]=None) -> dict[str, list[str]]:
+        """
+        create the INDEXES declared by each model, creating an existing index is a no-op so this is safe to run at startup,
+        returns a dict of collection name to index names
+        """
+        if model_types is None:
+            model_types = indexed_models()
+
+        created = {}
+        for model_type in model_types:
+            collection = self.get_collection(model_type)
+            created[collection.name] = collection.create_indexes(model_type.INDEXES)
+        return created
+    
+    def explain(self, model_type: Type[BaseModel], filter=None, **kwargs) -> list[str]:
+        """returns the stages of the winning query plan for a find query, ex: ['FETCH', 'IXSCAN'] or ['COLLSCAN']"""
+        collection = self.get_collection(model_type)
+        return _plan_stages(collection.find(filter, **kwargs).explain())
+
+    def verify_indexes(self, model_types:Iterable[Type[BaseModel]]=None) -> dict[str, dict[str, bool]]:
+        """
+        runs explain() on a query against the keys of each declared index,
+        returns a dict of collection name to {index name: is index covered}
+        """
+        if model_types is None:
+            model_types = indexed_models()
+
+        report = {}
+        for model_type in model_types:
+            collection = self.get_collection(model_type)
+            report[collection.name] = {}
+            for index in model_type.INDEXES:
+                stages = self.explain(model_type, _index_probe_filter(index))
+                report[collection.name][index.document['name']] = 'COLLSCAN' not in stages
+        return report
 
     @classmethod
     def from_cache(cls) -> 'MongoDB':
@@ -133,3 +377,172 @@ class MongoDB:
             return _MONGO_DB
         else:
             return _MONGO_DB
+
+
+class AsyncMongoDB:
+    """
+    asyncio counterpart to MongoDB, it exposes the same methods as coroutines so that
+    the web server can query the database without blocking the event loop
+    """
+
+    def __init__(self):
+        self.client:AsyncMongoClient = AsyncMongoClient(MONGO_DB_URI)
+        try:
+            self.db = self.client[MONGO_DB_NAME]
+        except TypeError:
+            pass
+
+    def get_collection(self, model: InstanceOrType) -> AsyncCollection:
+        return self.db[_collection_name(model)]
+    
+    def start_session(self, **kwargs):
+        return self.client.start_session(**kwargs)
+
+    async def create(self, model:BaseModel) -> BaseModel:
+        collection = self.get_collection(model)
+        result = await collection.insert_one(model.model_dump(by_alias=True, exclude=['id']))
+        model.id = result.inserted_id
+
+    async def read(self, model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None, fields:Iterable[str]=None) -> BaseModel:
+        query = _id_query(model, id, cid, 'read')
+        collection = self.get_collection(model)
+        kwargs = {}
+        if fields is not None:
+            model = _fields_query(model if isinstance(model, type) else model.__class__, fields, kwargs)
+        document = await collection.find_one(query, **kwargs)
+        return _model_from_document(model, collection.name, query, document)
+    
+    async def update(self, model:BaseModel) -> None:
+        dumped_data = model.model_dump(by_alias=True)
+
+        collection = self.get_collection(model)
+        result = await collection.update_one({'_id': ObjectId(model.id)}, {'$set': dumped_data})
+        if result.modified_count != 1:
+            raise NotFoundError(f'Item not found in database')
+
+    async def delete(self, model:InstanceOrType, id:Union[str, ObjectId]=None, cid: Union[str, ContentId]=None) -> None:
+        query = _id_query(model, id, cid, 'delete')
+        collection = self.get_collection(model)
+        await collection.delete_one(query)
+
+    async def find(self, model_type: Type[BaseModel], filter=None, offset:int=0, size:int=50, after:Union[str, ObjectId]=None, fields:Iterable[str]=None, **kwargs) -> AsyncGenerator[BaseModel, None]:
+        """if fields are given only those fields are read and partial models with just them (and id) are yielded"""
+        collection = self.get_collection(model_type)
+        filter = _page_query(filter, after, kwargs)
+        load_type = _fields_query(model_type, fields, kwargs)
+        async for entry in collection.find(filter=filter, skip=offset, limit=size, **kwargs):
+            yield _load(load_type, entry)
+
+    async def find_raw(self, model_type: Type[BaseModel], filter=None, offset:int=0, size:int=50, after:Union[str, ObjectId]=None, **kwargs) -> AsyncGenerator[dict, None]:
+        """
+        like find but yields the stored documents projected to the model's fields without validating them,
+        _id is renamed to id and ObjectIds are converted to strings, for serving trusted documents as json
+        """
+        projection, renames = _raw_fields(model_type)
+        kwargs.setdefault('projection', projection)
+        collection = self.get_collection(model_type)
+        filter = _page_query(filter, after, kwargs)
+        async for entry in collection.find(filter=filter, skip=offset, limit=size, **kwargs):
+            yield _raw_document(entry, renames)
+
+    async def find_one(self, model_type: Type[BaseModel], filter=None, **kwargs) -> BaseModel:
+        collection = self.get_collection(model_type)
+        entry = await collection.find_one(filter, **kwargs)
+        if entry is None:
+            raise NotFoundError(f'Item not found in database')
+        else:
+            return _load(model_type, entry)
+
+    async def find_one_and_update(self, model_type: Type[BaseModel], filter:dict, update:dict, **kwargs) -> BaseModel:
+        kwargs.setdefault('return_document', ReturnDocument.AFTER)
+        collection = self.get_collection(model_type)
+        entry = await collection.find_one_and_update(filter, update, **kwargs)
+        if entry is None:
+            raise NotFoundError(f'Item not found in database')
+        else:
+            return _load(model_type, entry)
+
+    async def aggregate(self, model_type: Type[BaseModel], pipeline:list[dict], **kwargs) -> list[dict]:
+        collection = self.get_collection(model_type)
+        cursor = await collection.aggregate(pipeline, **kwargs)
+        return await cursor.to_list()
+
+    async def create_many(self, models:list[BaseModel], ordered:bool=True) -> list[BaseModel]:
+        if len(models) == 0:
+            return models
+        
+        collection = self.get_collection(models[0])
+        result = await collection.insert_many([model.model_dump(by_alias=True, exclude=['id']) for model in models], ordered=ordered)
+        for model, id in zip(models, result.inserted_ids):
+            model.id = id
+        return models
+
+    async def read_many(self, model_type:Type[BaseModel], ids:Iterable[Union[str, ObjectId]]=None, cids:Iterable[Union[str, ContentId]]=None) -> tuple[list[BaseModel], list[str]]:
+        field, keys, query = _many_query(ids, cids, 'read_many')
+        collection = self.get_collection(model_type)
+        return _order_many(model_type, field, keys, await collection.find(query).to_list())
+    
+    async def update_many(self, models:list[BaseModel], ordered:bool=True) -> int:
+        if len(models) == 0:
+            return 0
+        
+        collection = self.get_collection(models[0])
+        result = await collection.bulk_write(_update_many_requests(models), ordered=ordered)
+        if result.matched_count != len(models):
+            raise NotFoundError(f'{len(models) - result.matched_count} of {len(models)} items not found in database')
+        return result.matched_count
+
+    async def delete_many(self, model_type:Type[BaseModel], ids:Iterable[Union[str, ObjectId]]=None, cids:Iterable[Union[str, ContentId]]=None) -> int:
+        _, _, query = _many_query(ids, cids, 'delete_many')
+        collection = self.get_collection(model_type)
+        result = await collection.delete_many(query)
+        return result.deleted_count
+
+    async def ensure_indexes(self, model_types:Iterable[Type[BaseModel]]=None) -> dict[str, list[str]]:
+        """see MongoDB.ensure_indexes"""
+        if model_types is None:
+            model_types = indexed_models()
+
+        created = {}
+        for model_type in model_types:
+            collection = self.get_collection(model_type)
+            created[collection.name] = await collection.create_indexes(model_type.INDEXES)
+        return created
+
+    @classmethod
+    def from_cache(cls) -> 'AsyncMongoDB':
+        global _ASYNC_MONGO_DB
+        if _ASYNC_MONGO_DB is None:
+            _ASYNC_MONGO_DB = cls()
+        return _ASYNC_MONGO_DB
+
+
+if __name__ == '__main__':
+    import argparse
+    import importlib
+
+    parser = argparse.ArgumentParser(description='Manage database indexes declared by models')
+    parser.add_argument('command', choices=['ensure-indexes', 'verify-indexes'])
+    parser.add_argument('--models', '-m', nargs='*', default=[], help='additional model modules to import, ex: mart.models')
+    args = parser.parse_args()
+
+    importlib.import_module('mcore.models')
+    for module_name in args.models:
+        importlib.import_module(module_name)
+
+    db = MongoDB()
+
+    match args.command:
+        case 'ensure-indexes':
+            for collection_name, index_names in db.ensure_indexes().items():
+                print(f'{collection_name}: {", ".join(index_names)}')
+        case 'verify-indexes':
+            covered = True
+            for collection_name, indexes in db.verify_indexes().items():
+                for index_name, is_covered in indexes.items():
+                    covered = covered and is_covered
+                    print(f'{collection_name}.{index_name}: {"ok" if is_covered else "COLLSCAN"}')
+            if not covered:
+                raise SystemExit(1)
+        case _:
+            raise ValueError(f'invalid command: {args.command}')
@@ -30,3 +30,7 @@ class MStackDBError(MStackCoreError):
 
 class NotFoundError(MStackCoreError):
     pass
+
+
+class MStackBusyError(MStackCoreError):
+    pass
@@ -1,26 +1,34 @@
 import os
 import shutil
 import random
+import struct
+import threading
+
+from collections import OrderedDict
+from functools import lru_cache
 
 from enum import Enum
 
-from typing import Annotated, ClassVar, Union, Optional, Type
+from typing import Annotated, ClassVar, Iterable, Union, Optional, Type, TypeVar, Generic
 from pathlib import Path
 from datetime import datetime
 
-from mcore.errors import MStackFilePayloadError
+from mcore.errors import MStackFilePayloadError, MStackUserError
 from mcore.types import unique_list_validator, TagList
 from mcore.util import utc_now, random_name, random_email, random_phone_number, example_cid, adjectives, nouns, random_tags
 
 from lorem_text import lorem
 from pymediainfo import MediaInfo
 from bson import ObjectId
+from pymongo import IndexModel, ASCENDING
 from pydantic_extra_types.phone_numbers import PhoneNumber
 from pydantic import (
     BaseModel,
     Field,
     EmailStr,
     model_validator,
+    create_model,
+    ValidationInfo,
     conlist
 )
 
@@ -28,10 +36,19 @@ from mcore.types import ContentId, MongoId, id_schema, db_id_kwargs, cid_kwargs,
 
 __all__ = [
     'init_storage_directories',
+    'storage_relative_path',
+    'storage_path',
+    'locate_payload',
     'mediainfo',
+    'image_header_size',
+    'ProbeCache',
+    'probe_cache',
 
     'ContentModel',
     'ModelCreator',
+    'BatchIds',
+    'BatchReadResult',
+    'partial_model',
     
     'UserId',
     'UserCid',
@@ -50,6 +67,10 @@ __all__ = [
     'FileUploadTypes',
     'FileUploader',
     'FileUploaderCreator',
+    'FileUploaderRanges',
+    'FILE_UPLOAD_MIN_PART_SIZE',
+    'FILE_UPLOAD_MAX_PARTS',
+    'FILE_UPLOAD_CHECKSUM_HEADER',
 
     'ImageFileId',
     'ImageFileCid',
@@ -111,27 +132,198 @@ MEDIAINFO_LIB_PATH = os.environ.get('MEDIAINFO_LIB_PATH', '')   # '/opt/homebrew
 MSERVE_LOCAL_STORAGE_DIRECTORY = os.environ.get('MSERVE_LOCAL_STORAGE_DIRECTORY', '/app/data/files')
 MSERVE_LOCAL_UPLOAD_DIRECTORY = os.environ.get('MSERVE_LOCAL_UPLOAD_DIRECTORY', '/app/data/uploads')
 
+# payloads are stored in nested directories named by the first characters of their hash so no directory 
+# holds millions of files, ex: levels=2 width=2 stores 0Wh2aaOS...jpg at Wh/2a/0Wh2aaOS...jpg, levels=0 is flat #
+MSERVE_STORAGE_SHARD_LEVELS = int(os.environ.get('MSERVE_STORAGE_SHARD_LEVELS', 0))
+MSERVE_STORAGE_SHARD_WIDTH = int(os.environ.get('MSERVE_STORAGE_SHARD_WIDTH', 2))
+
 def init_storage_directories():
     for directory in [MSERVE_LOCAL_STORAGE_DIRECTORY, MSERVE_LOCAL_UPLOAD_DIRECTORY]:
         if not os.path.exists(directory):
             os.makedirs(directory)
 
+def storage_relative_path(payload_cid: Union[ContentId, str], levels:int=None, width:int=None) -> Path:
+    """path of a payload relative to MSERVE_LOCAL_STORAGE_DIRECTORY, names that aren't content ids are not sharded"""
+    levels = MSERVE_STORAGE_SHARD_LEVELS if levels is None else levels
+    width = MSERVE_STORAGE_SHARD_WIDTH if width is None else width
+    
+    name = str(payload_cid)
+    hash = payload_cid.hash if isinstance(payload_cid, ContentId) else name[1:44]
+    if levels <= 0 or len(hash) < levels * width:
+        return Path(name)
+    
+    return Path(*[hash[n * width:(n + 1) * width] for n in range(levels)], name)
+
+def storage_path(payload_cid: Union[ContentId, str]) -> Path:
+    return Path(MSERVE_LOCAL_STORAGE_DIRECTORY) / storage_relative_path(payload_cid)
+
+def locate_payload(payload_cid: Union[ContentId, str]) -> Path:
+    """
+    the stored path of a payload, while a store is being migrated to a new layout with 
+    migrate-storage a payload may still be at its flat path so that is checked second
+    """
+    path = storage_path(payload_cid)
+    if path.exists():
+        return path
+    
+    flat_path = Path(MSERVE_LOCAL_STORAGE_DIRECTORY) / str(payload_cid)
+    if flat_path.exists():
+        return flat_path
+    return path
+
+MSTACK_PROBE_CACHE_SIZE = int(os.environ.get('MSTACK_PROBE_CACHE_SIZE', 10_000))
+
 def mediainfo(path: Union[str, Path]) -> MediaInfo:
     library_file = None if MEDIAINFO_LIB_PATH == '' else MEDIAINFO_LIB_PATH
     return MediaInfo.parse(path, library_file=library_file)
 
+
+# jpeg start of frame markers, the other 0xC_ markers are huffman / arithmetic tables #
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _jpeg_size(file) -> tuple[int, int] | None:
+    file.seek(2)
+    while True:
+        marker = file.read(2)
+        if len(marker) != 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] == 0xFF:
+            # fill byte #
+            file.seek(-1, os.SEEK_CUR)
+            continue
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            # markers without a length #
+            continue
+        
+        length_bytes = file.read(2)
+        if len(length_bytes) != 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+
+        if marker[1] in _JPEG_SOF_MARKERS:
+            frame = file.read(5)
+            if len(frame) != 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        
+        file.seek(length - 2, os.SEEK_CUR)
+
+def image_header_size(path: Union[str, Path]) -> tuple[int, int] | None:
+    """
+    (width, height) read from the header of a png, gif, bmp, webp or jpeg file without decoding it,
+    None if the format is not recognized so the caller can fall back to mediainfo
+    """
+    try:
+        with open(path, 'rb') as file:
+            head = file.read(32)
+
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+            
+            if head.startswith(b'BM') and len(head) >= 26:
+                width, height = struct.unpack('<ii', head[18:26])
+                return width, abs(height)
+            
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                chunk = head[12:16]
+                if chunk == b'VP8 ':
+                    width, height = struct.unpack('<HH', head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b'VP8L':
+                    bits = int.from_bytes(head[21:25], 'little')
+                    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                if chunk == b'VP8X':
+                    return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+                return None
+            
+            if head.startswith(b'\xff\xd8'):
+                return _jpeg_size(file)
+            
+    except (OSError, struct.error):
+        return None
+    
+    return None
+
+
+class ProbeCache:
+    """
+    metadata extracted by BaseFile.probe keyed by file type and payload cid, 
+    the same payload always probes the same so entries never go stale, only the
+    least recently used entries are dropped when there are more than max_size
+    """
+
+    def __init__(self, max_size:int=MSTACK_PROBE_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._entries:OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_type:Type['BaseFile'], payload_cid:ContentId) -> dict | None:
+        key = (file_type.__name__, str(payload_cid))
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(self._entries[key])
+            except KeyError:
+                self.misses += 1
+                return None
+            
+    def set(self, file_type:Type['BaseFile'], payload_cid:ContentId, probe:dict) -> None:
+        if self.max_size <= 0:
+            return
+        
+        with self._lock:
+            self._entries[(file_type.__name__, str(payload_cid))] = dict(probe)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+probe_cache = ProbeCache()
+
 #
 # base models
 #
 
+# documents loaded by MongoDB and AsyncMongoDB keep their stored cid instead of recomputing it,
+# set this to recompute it on every load as new models do, or call verify_cid to check one model #
+MSTACK_VERIFY_STORED_CIDS = os.environ.get('MSTACK_VERIFY_STORED_CIDS', '0').lower() in ('1', 't', 'true')
+
 class ContentModel(BaseModel):
 
+    # indexes created by MongoDB.ensure_indexes for models that define DB_NAME #
+    INDEXES: ClassVar[list[IndexModel]] = [IndexModel('cid')]
+
     @model_validator(mode='after')
-    def generate_cid(self) -> 'ContentModel':
-        data = self.model_dump(exclude={'id', 'cid'})
-        self.cid = ContentId.from_dict(data)
+    def generate_cid(self, info:ValidationInfo) -> 'ContentModel':
+        if self._trusts_stored_cid(info):
+            return self
+        self.cid = self.compute_cid()
         return self
 
+    def _trusts_stored_cid(self, info:ValidationInfo) -> bool:
+        if MSTACK_VERIFY_STORED_CIDS or not info.context or not info.context.get('stored_document'):
+            return False
+        return getattr(self, 'cid', None) is not None
+
+    def compute_cid(self) -> ContentId:
+        return ContentId.from_dict(self.model_dump(exclude={'id', 'cid'}))
+
+    def verify_cid(self) -> bool:
+        """true if the cid matches the model's content, for integrity checks on models loaded from the db"""
+        return self.cid == self.compute_cid()
+
 
 class ModelCreator(BaseModel):
 
@@ -168,6 +360,66 @@ class ModelCreator(BaseModel):
         return model
 
 
+#
+# batch operations
+#
+
+class BatchIds(BaseModel):
+    """request body for batch reads and deletes, supply either ids or cids"""
+
+    ids: Optional[conlist(MongoId, min_length=1, max_length=500)] = None
+    cids: Optional[conlist(ContentIdType, min_length=1, max_length=500)] = None
+
+    model_config = {
+        'json_schema_extra': {
+            'examples': [
+                {
+                    'ids': ['6546a5cd1a209851b7136441', '6546a5cd1a209851b7136442']
+                }
+            ]
+        }
+    }
+
+    @model_validator(mode='after')
+    def validate_ids_or_cids(self) -> 'BatchIds':
+        if (self.ids is None) == (self.cids is None):
+            raise ValueError('must supply either ids or cids')
+        return self
+
+
+BatchModel = TypeVar('BatchModel', bound=BaseModel)
+
+class BatchReadResult(BaseModel, Generic[BatchModel]):
+    """items are returned in the order they were requested, missing lists the requested ids or cids that were not found"""
+
+    items: list[BatchModel]
+    missing: list[str]
+
+
+#
+# field projection
+#
+
+@lru_cache(maxsize=512)
+def _partial_model(model_type:Type[BaseModel], fields:frozenset[str]) -> Type[BaseModel]:
+    definitions = {name: (field.annotation, field) for name, field in model_type.model_fields.items() if name in fields}
+    return create_model(f'{model_type.__name__}Fields', **definitions)
+
+def partial_model(model_type:Type[BaseModel], fields:Iterable[str]) -> Type[BaseModel]:
+    """
+    a model with only the given fields of model_type, plus id, for reads and lists that request fields=,
+    it is a plain BaseModel so a partial ContentModel keeps its stored cid instead of hashing the partial content
+    """
+    fields = frozenset(fields)
+    unknown = fields - model_type.model_fields.keys()
+    if unknown:
+        raise MStackUserError(f'Unknown fields for {model_type.__name__}: {", ".join(sorted(unknown))}')
+    
+    if 'id' in model_type.model_fields:
+        fields |= {'id'}
+    return _partial_model(model_type, fields)
+
+
 #
 # user
 #
@@ -175,6 +427,7 @@ class ModelCreator(BaseModel):
 
 class User(ContentModel):
     DB_NAME: ClassVar[str] = 'users'
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('email', unique=True)]
 
     id: UserId = Field(**db_id_kwargs)
     cid: UserCid = Field(**cid_kwargs)
@@ -206,6 +459,8 @@ UserPasswordHashId = Annotated[MongoId, id_schema('a string representing a user
 
 class UserPasswordHash(BaseModel):
     DB_NAME: ClassVar[str] = 'user_password_hashes'
+    INDEXES: ClassVar[list[IndexModel]] = [IndexModel('user_id', unique=True)]
+
     id: UserPasswordHashId = Field(**db_id_kwargs)
     user_id: UserId
     hashed_password: str
@@ -273,6 +528,7 @@ class UserCreator(ModelCreator):
 class Profile(ContentModel):
     SNAKE_CASE: ClassVar[str] = 'profile'
     DB_NAME: ClassVar[str] = 'profiles'
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid')]
     ENDPOINT: ClassVar[str] = True
 
     id: ProfileId = Field(**db_id_kwargs)
@@ -409,8 +665,16 @@ class FileUploadTypes(str, Enum):
     video = 'video'
 
 
+FILE_UPLOAD_MIN_PART_SIZE = 64 * 1024
+FILE_UPLOAD_MAX_PARTS = 10_000
+FILE_UPLOAD_CHECKSUM_HEADER = 'X-Checksum-Sha3-256'   # optional hex digest of a part, the part is rejected if it doesn't match
+
 class FileUploader(BaseModel):
     DB_NAME: ClassVar[str] = 'file_uploads'
+    INDEXES: ClassVar[list[IndexModel]] = [
+        IndexModel([('status', ASCENDING), ('modifed', ASCENDING)]),
+        IndexModel('user_cid')
+    ]
 
     id: FileUploaderId = Field(**db_id_kwargs)
     type: FileUploadTypes
@@ -428,7 +692,19 @@ class FileUploader(BaseModel):
     total_uploaded: int = 0
     error: Optional[str] = None
 
+    # sha3-256 hash computed while the file was uploaded, None if it must be computed at ingest #
+    payload_hash: Optional[str] = None
+
+    # part uploads - if part_size is set the file is sent as numbered parts of part_size bytes (the last may be 
+    # shorter) that can arrive in any order, parts lists the part numbers received so far #
+    part_size: Optional[int] = None
+    parts: list[int] = []
+    part_checksums: dict[str, str] = {}   # part number -> sha3-256 hex digest of the part as written
+
+    # ingest claim, the lock owner must renew lease_expires while it works or the upload is queued again #
     lock: Optional[str] = None
+    lease_expires: Optional[datetime] = None
+    attempts: int = 0
 
     model_config = {
         'json_schema_extra': {
@@ -460,6 +736,46 @@ class FileUploader(BaseModel):
         ext = self.ext if self.ext.startswith('.') else f'.{self.ext}'
         
         return Path(MSERVE_LOCAL_UPLOAD_DIRECTORY) / f'{self.id}{ext}'
+    
+    @property
+    def part_count(self) -> int:
+        if self.part_size is None:
+            raise ValueError('FileUploader does not use part uploads')
+        return -(-self.total_size // self.part_size)
+    
+    def part_range(self, part_number:int) -> tuple[int, int]:
+        """returns (offset, size) of a part in the file"""
+        if not 0 <= part_number < self.part_count:
+            raise ValueError(f'part number must be from 0 to {self.part_count - 1}')
+        
+        offset = part_number * self.part_size
+        return offset, min(self.part_size, self.total_size - offset)
+
+    def persisted_ranges(self) -> list[tuple[int, int]]:
+        """byte ranges [start, end) of the file that have been received and recorded"""
+        if self.part_size is None:
+            return [(0, self.total_uploaded)] if self.total_uploaded > 0 else []
+        
+        ranges = []
+        for part_number in sorted(self.parts):
+            start, size = self.part_range(part_number)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], start + size)
+            else:
+                ranges.append((start, start + size))
+        return ranges
+    
+    def missing_parts(self) -> list[int]:
+        received = set(self.parts)
+        return [part_number for part_number in range(self.part_count) if part_number not in received]
+
+    def payload_cid(self) -> ContentId | None:
+        """payload content id from the hash computed during upload, matches ContentId.from_filepath(self.local_path())"""
+        if self.payload_hash is None:
+            return None
+        
+        ext = ''.join(self.local_path().suffixes)[1:]
+        return ContentId(hash=self.payload_hash, size=self.total_size, ext=ext)
 
 
 class FileUploaderCreator(ModelCreator):
@@ -468,6 +784,7 @@ class FileUploaderCreator(ModelCreator):
     type: FileUploadTypes
     total_size: int
     ext: str
+    part_size: Optional[int] = Field(default=None, ge=FILE_UPLOAD_MIN_PART_SIZE)
 
     model_config = {
         'json_schema_extra': {
@@ -481,26 +798,88 @@ class FileUploaderCreator(ModelCreator):
         }
     }
 
+    @model_validator(mode='after')
+    def validate_part_count(self) -> 'FileUploaderCreator':
+        if self.part_size is not None and self.total_size > self.part_size * FILE_UPLOAD_MAX_PARTS:
+            raise ValueError(f'part_size is too small, an upload can have at most {FILE_UPLOAD_MAX_PARTS} parts')
+        return self
+
+
+class FileUploaderRanges(BaseModel):
+    """what an uploader has persisted so an interrupted upload can be verified and resumed"""
+
+    id: FileUploaderId
+    status: FileUploadStatus
+    total_size: int
+    total_uploaded: int
+    part_size: Optional[int] = None
+    ranges: list[tuple[int, int]]
+    missing_parts: Optional[list[int]] = None
+    part_checksums: dict[str, str] = {}
+
+    @classmethod
+    def from_uploader(cls, uploader:FileUploader) -> 'FileUploaderRanges':
+        return cls(
+            id=uploader.id,
+            status=uploader.status,
+            total_size=uploader.total_size,
+            total_uploaded=uploader.total_uploaded,
+            part_size=uploader.part_size,
+            ranges=uploader.persisted_ranges(),
+            missing_parts=None if uploader.part_size is None else uploader.missing_parts(),
+            part_checksums=uploader.part_checksums
+        )
+
 
 class BaseFile(ContentModel):
 
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid'), IndexModel('payload_cid')]
+
+    # fields extracted from the payload by probe, the same for every file with the same payload cid #
+    PROBE_FIELDS: ClassVar[tuple[str, ...]] = ()
+
     @property
     def local_path(self) -> Path:
         if self.payload_cid is None:
             raise ValueError('File must have a cid to get a local path')
-        return Path(MSERVE_LOCAL_STORAGE_DIRECTORY) / str(self.payload_cid)
+        return storage_path(self.payload_cid)
     
     @classmethod
-    def from_filepath(cls:'BaseFile', filepath:Union[str, Path], user_cid: UserCid) -> 'BaseFile':
-        raise NotImplementedError('from_filepath must be implemented by subclasses')
+    def probe(cls, filepath:Union[str, Path]) -> dict:
+        """the PROBE_FIELDS of the file at filepath"""
+        raise NotImplementedError('probe must be implemented by subclasses')
+
+    @classmethod
+    def from_filepath(cls:'BaseFile', filepath:Union[str, Path], user_cid: UserCid, payload_cid:ContentId = None, probe:dict = None) -> 'BaseFile':
+        """
+        if payload_cid is not provided it is computed by reading the file, 
+        if probe is not provided it is taken from probe_cache or the file is probed
+        """
+        if payload_cid is None:
+            payload_cid = ContentId.from_filepath(filepath)
+
+        if probe is None:
+            probe = probe_cache.get(cls, payload_cid)
+            if probe is None:
+                probe = cls.probe(filepath)
+                probe_cache.set(cls, payload_cid, probe)
+
+        return cls(user_cid=user_cid, payload_cid=payload_cid, **probe)
 
     @classmethod
-    def ingest(cls:'BaseFile', filepath:Union[str, Path], user_cid: UserCid, leave_original:bool = False) -> 'BaseFile':
-        item = cls.from_filepath(filepath, user_cid)
+    def ingest(cls:'BaseFile', filepath:Union[str, Path], user_cid: UserCid, leave_original:bool = False, payload_cid:ContentId = None, probe:dict = None) -> 'BaseFile':
+        """
+        move the file into storage at its payload cid, payloads are content addressed so if the payload is 
+        already stored the copy is skipped, a moved file replaces the stored one which is identical
+        """
+        item = cls.from_filepath(filepath, user_cid, payload_cid, probe)
+        item.local_path.parent.mkdir(parents=True, exist_ok=True)
         if leave_original:
-            shutil.copyfile(filepath, item.local_path)
+            if not item.local_path.exists():
+                shutil.copyfile(filepath, item.local_path)
         else:
-            os.rename(filepath, item.local_path)
+            # replace in one rename instead of checking first, a concurrent delete of the same payload can't leave it missing #
+            os.replace(filepath, item.local_path)
         
         return item
 
@@ -517,6 +896,7 @@ ImageFilePayloadCid = Annotated[ContentIdType, id_schema('a string representing
 
 class ImageFile(BaseFile):
     DB_NAME: ClassVar[str] = 'image_files'
+    PROBE_FIELDS: ClassVar[tuple[str, ...]] = ('height', 'width')
 
     id: ImageFileId = Field(**db_id_kwargs)
     cid: ImageFileCid = Field(**cid_kwargs)
@@ -544,8 +924,11 @@ class ImageFile(BaseFile):
 
 
     @classmethod
-    def from_filepath(cls:'ImageFile', filepath:Union[str, Path], user_cid: UserCid) -> 'ImageFile':
-        payload_cid = ContentId.from_filepath(filepath)
+    def probe(cls, filepath:Union[str, Path]) -> dict:
+        size = image_header_size(filepath)
+        if size is not None and size[0] > 0 and size[1] > 0:
+            return {'width': size[0], 'height': size[1]}
+        
         info = mediainfo(filepath)
         try:
             height = info.image_tracks[0].height
@@ -555,7 +938,7 @@ class ImageFile(BaseFile):
         except AttributeError:
             raise MStackFilePayloadError(f'Unknown error getting media info: {filepath}')
 
-        return cls(user_cid=user_cid, payload_cid=payload_cid, height=height, width=width)
+        return {'height': height, 'width': width}
 
 
 AltImageFormatList = Annotated[
@@ -569,6 +952,8 @@ ImageReleaseCid = Annotated[ContentIdType, id_schema('a string representing an i
 
 class ImageRelease(ContentModel):
     DB_NAME: ClassVar[str] = 'image_release'
+    FILE_MODEL: ClassVar[Type[ImageFile]] = ImageFile
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid')]
 
     id: ImageReleaseId = Field(**db_id_kwargs)
     cid: ImageReleaseCid = Field(**cid_kwargs)
@@ -621,6 +1006,7 @@ AudioFilePayloadCid = Annotated[ContentIdType, id_schema('a string representing
 
 class AudioFile(BaseFile):
     DB_NAME: ClassVar[str] = 'audio_files'
+    PROBE_FIELDS: ClassVar[tuple[str, ...]] = ('duration', 'bit_rate')
 
     id: AudioFileId = Field(**db_id_kwargs)
     cid: AudioFileCid = Field(**cid_kwargs)
@@ -647,8 +1033,7 @@ class AudioFile(BaseFile):
     }
 
     @classmethod
-    def from_filepath(cls:'AudioFile', filepath:Union[str, Path], user_cid: UserCid) -> 'AudioFile':
-        payload_cid = ContentId.from_filepath(filepath)
+    def probe(cls, filepath:Union[str, Path]) -> dict:
         info = mediainfo(filepath)
         if len(info.audio_tracks) == 0:
             raise MStackFilePayloadError(f'Does not contain audio track(s): {filepath}')
@@ -661,7 +1046,7 @@ class AudioFile(BaseFile):
         except (AttributeError, IndexError):
             raise MStackFilePayloadError(f'Unknown error getting media info: {filepath}')
 
-        return cls(user_cid=user_cid, payload_cid=payload_cid, duration=duration, bit_rate=bit_rate)
+        return {'duration': duration, 'bit_rate': bit_rate}
 
 
 AltAudioFormatList = Annotated[
@@ -675,6 +1060,8 @@ AudioReleaseCid = Annotated[ContentIdType, id_schema('a string representing an a
 
 class AudioRelease(ContentModel):
     DB_NAME: ClassVar[str] = 'audio_release'
+    FILE_MODEL: ClassVar[Type[AudioFile]] = AudioFile
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid')]
 
     id: AudioReleaseId = Field(**db_id_kwargs)
     cid: AudioReleaseCid = Field(**cid_kwargs)
@@ -722,6 +1109,7 @@ VideoFilePayloadCid = Annotated[ContentIdType, id_schema('a string representing
 
 class VideoFile(BaseFile):
     DB_NAME: ClassVar[str] = 'video_files'
+    PROBE_FIELDS: ClassVar[tuple[str, ...]] = ('height', 'width', 'duration', 'bit_rate', 'has_audio')
 
     id: VideoFileId = Field(**db_id_kwargs)
     cid: VideoFileCid = Field(**cid_kwargs)
@@ -754,8 +1142,7 @@ class VideoFile(BaseFile):
     }
 
     @classmethod
-    def from_filepath(cls:'VideoFile', filepath:Union[str, Path], user_cid: UserCid) -> 'VideoFile':
-        payload_cid = ContentId.from_filepath(filepath)
+    def probe(cls, filepath:Union[str, Path]) -> dict:
         info = mediainfo(filepath)
 
         if len(info.video_tracks) == 0:
@@ -772,7 +1159,7 @@ class VideoFile(BaseFile):
         
         has_audio = len(info.audio_tracks) > 0
 
-        return cls(user_cid=user_cid, payload_cid=payload_cid, height=height, width=width, duration=duration, bit_rate=bit_rate, has_audio=has_audio)
+        return {'height': height, 'width': width, 'duration': duration, 'bit_rate': bit_rate, 'has_audio': has_audio}
 
 
 AltVideoFormatList = Annotated[
@@ -786,6 +1173,8 @@ VideoReleaseCid = Annotated[ContentIdType, id_schema('a string representing a vi
 
 class VideoRelease(ContentModel):
     DB_NAME: ClassVar[str] = 'video_release'
+    FILE_MODEL: ClassVar[Type[VideoFile]] = VideoFile
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid')]
 
     id: VideoReleaseId = Field(**db_id_kwargs)
     cid: VideoReleaseCid = Field(**cid_kwargs)
@@ -836,6 +1225,7 @@ TextFilePayloadCid = Annotated[ContentIdType, id_schema('a string representing a
 
 class TextFile(ContentModel):
     DB_NAME: ClassVar[str] = 'text_files'
+    INDEXES: ClassVar[list[IndexModel]] = ContentModel.INDEXES + [IndexModel('user_cid'), IndexModel('payload_cid')]
 
     id: TextFileId = Field(**db_id_kwargs)
     cid: TextFileCid = Field(**cid_kwargs)
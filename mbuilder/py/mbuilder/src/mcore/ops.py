@@ -1,13 +1,28 @@
 import os
+import asyncio
 import logging
+import threading
+import time
 
-from typing import Callable, BinaryIO, List
+from collections import OrderedDict
+from hashlib import sha3_256
+
+from typing import Callable, BinaryIO, Type, AsyncIterator
 from pathlib import Path
 
-from mcore.db import MongoDB
-from mcore.errors import MStackUserError, NotFoundError
-from mcore.auth import create_new_user, delete_user, delete_profile
+from mcore.db import MongoDB, AsyncMongoDB
+from mcore.errors import MStackUserError, MStackAuthenticationError, NotFoundError
+from mcore.auth import (
+    create_new_user, 
+    delete_user, 
+    delete_profile,
+    create_new_user_async,
+    delete_user_async,
+    delete_profile_async
+)
 from mcore.models import *
+from mcore.types import ContentId
+from mcore.util import utc_now
 
 """
 Note on file deletions:
@@ -28,12 +43,292 @@ while keeping the code application logic simple.
 __all__ = [
     'SDK_DEFAULT_OFFSET',
     'SDK_DEFAULT_SIZE',
-    'MCoreOps'
+    'MCoreOps',
+    'AsyncMCoreOps',
+    'UploadHashes',
+    'upload_hashes'
 ]
 
 SDK_DEFAULT_OFFSET = int(os.environ.get('MSTACK_SDK_DEFAULT_LIST_OFFSET', 0))
 SDK_DEFAULT_SIZE = int(os.environ.get('MSTACK_SDK_DEFAULT_LIST_SIZE', 50))
 
+
+MSTACK_UPLOAD_BUFFER_SIZE = int(os.environ.get('MSTACK_UPLOAD_BUFFER_SIZE', 1024 * 1024))
+MSTACK_PAYLOAD_UNLINK_GRACE_SECONDS = int(os.environ.get('MSTACK_PAYLOAD_UNLINK_GRACE_SECONDS', 300))
+MSTACK_UPLOAD_HASH_CACHE_SIZE = int(os.environ.get('MSTACK_UPLOAD_HASH_CACHE_SIZE', 1000))   # 0 disables upload hashing
+
+
+class UploadHashes:
+    """
+    running sha3-256 of in progress uploads so ingest doesn't need to read the whole file again,
+    each hash is keyed by uploader id and stored with the offset the next chunk must start at
+
+    hashlib state can't be serialized so it lives in the process that received the data, if a chunk 
+    arrives at another process or out of order the chain is dropped and ingest computes the hash instead
+    """
+
+    def __init__(self, max_size:int=MSTACK_UPLOAD_HASH_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._hashes:OrderedDict[str, tuple[int, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, uploader_id:str, offset:int, data:bytes) -> None:
+        if self.max_size <= 0:
+            return
+        
+        key = str(uploader_id)
+        with self._lock:
+            entry = self._hashes.pop(key, None)
+
+        if offset == 0:
+            hash_obj = sha3_256()
+        elif entry is not None and entry[0] == offset:
+            hash_obj = entry[1]
+        else:
+            return
+        
+        # hashing releases the GIL, keep it outside the lock #
+        hash_obj.update(data)
+
+        with self._lock:
+            self._hashes[key] = (offset + len(data), hash_obj)
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+
+    def pop_hash(self, uploader_id:str, size:int) -> str | None:
+        """remove and return the content id hash of a finished upload of size bytes, None if the chain was broken"""
+        with self._lock:
+            entry = self._hashes.pop(str(uploader_id), None)
+
+        if entry is None or entry[0] != size:
+            return None
+        return ContentId.from_digest(entry[1].digest(), size, '').hash
+    
+    def discard(self, uploader_id:str) -> None:
+        with self._lock:
+            self._hashes.pop(str(uploader_id), None)
+
+
+upload_hashes = UploadHashes()
+
+
+def _open_upload(uploader:FileUploader) -> BinaryIO:
+    """
+    open the uploader's file for appending, creating it and its parent directory if needed,
+    bytes past total_uploaded were written by a request that failed before recording them 
+    and are truncated so a resumed upload continues from the recorded offset
+    """
+    path = uploader.local_path()
+    try:
+        file = path.open('ab')
+    except FileNotFoundError:
+        os.makedirs(path.parent, exist_ok=True)
+        file = path.open('ab')
+
+    size = file.tell()
+    if size > uploader.total_uploaded:
+        file.truncate(uploader.total_uploaded)
+    elif size < uploader.total_uploaded:
+        file.close()
+        raise MStackUserError(f'FileUploader {uploader.id} file is missing uploaded data, {size} of {uploader.total_uploaded} bytes on disk')
+    return file
+
+
+def _write_upload(file:BinaryIO, data:bytes, uploader:FileUploader) -> int:
+    """write data at the uploader's current offset and add it to the running hash"""
+    written = file.write(data)
+    file.flush()
+    upload_hashes.update(uploader.id, uploader.total_uploaded, data)
+    return written
+
+
+def _append_chunk(uploader:FileUploader, chunk:bytes) -> int:
+    """append chunk to the uploader's file, returns bytes written"""
+    with _open_upload(uploader) as file:
+        return _write_upload(file, chunk, uploader)
+
+
+def _open_part_file(uploader:FileUploader) -> int:
+    """open the uploader's file for positional writes, preallocating it to the full upload size, returns a file descriptor"""
+    path = uploader.local_path()
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        os.makedirs(path.parent, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    if os.fstat(fd).st_size < uploader.total_size:
+        os.ftruncate(fd, uploader.total_size)
+    return fd
+
+
+def _write_part(fd:int, data:bytes, offset:int, uploader:FileUploader, part_hash) -> int:
+    """write data at offset, adding it to the part's checksum and the upload's running hash"""
+    view = memoryview(data)
+    written = 0
+    while written < len(view):
+        written += os.pwrite(fd, view[written:], offset + written)
+    part_hash.update(data)
+    upload_hashes.update(uploader.id, offset, data)
+    return written
+
+
+def _check_part_checksum(uploader:FileUploader, part_number:int, checksum:str, expected:str | None) -> None:
+    """the part's data on disk is left to be overwritten by the next attempt since the part isn't recorded"""
+    if expected is not None and checksum != expected.lower():
+        upload_hashes.discard(uploader.id)
+        raise MStackUserError(f'FileUploader {uploader.id} part {part_number} checksum {checksum} does not match {expected}')
+
+
+def _check_upload(uploader:FileUploader) -> None:
+    if uploader.status != FileUploadStatus.uploading:
+        raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value}')
+    
+    if uploader.part_size is not None:
+        raise MStackUserError(f'FileUploader {uploader.id} accepts numbered parts only')
+    
+    if uploader.total_uploaded >= uploader.total_size:
+        raise MStackUserError(f'FileUploader {uploader.id} is already at or over upload size')
+
+
+def _check_part_upload(uploader:FileUploader, part_number:int) -> tuple[int, int]:
+    """returns (offset, size) of the part"""
+    if uploader.status != FileUploadStatus.uploading:
+        raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value}')
+    
+    if uploader.part_size is None:
+        raise MStackUserError(f'FileUploader {uploader.id} does not accept parts, create it with a part_size')
+    
+    if part_number in uploader.parts:
+        raise MStackUserError(f'FileUploader {uploader.id} part {part_number} is already uploaded')
+    
+    try:
+        return uploader.part_range(part_number)
+    except ValueError as e:
+        raise MStackUserError(f'FileUploader {uploader.id}: {e}')
+
+
+def _check_part_reset(uploader:FileUploader, part_number:int) -> tuple[int, int]:
+    """returns (offset, size) of the part"""
+    if uploader.part_size is None:
+        raise MStackUserError(f'FileUploader {uploader.id} does not accept parts, create it with a part_size')
+    
+    try:
+        return uploader.part_range(part_number)
+    except ValueError as e:
+        raise MStackUserError(f'FileUploader {uploader.id}: {e}')
+
+
+def _is_over_size(uploader:FileUploader, size:int) -> bool:
+    return uploader.total_uploaded + size > uploader.total_size
+
+
+# atomic uploader updates - progress is added with $inc and only applies while the uploader is uploading #
+
+def _uploading_filter(uploader:FileUploader) -> dict:
+    return {'_id': uploader.id, 'status': FileUploadStatus.uploading.value}
+
+def _upload_progress(written:int) -> dict:
+    return {'$inc': {'total_uploaded': written}, '$set': {'modifed': utc_now()}}
+
+def _part_filter(uploader:FileUploader, part_number:int) -> dict:
+    return {**_uploading_filter(uploader), 'parts': {'$ne': part_number}}
+
+def _part_progress(part_number:int, written:int, checksum:str) -> dict:
+    update = {**_upload_progress(written), '$addToSet': {'parts': part_number}}
+    update['$set'][f'part_checksums.{part_number}'] = checksum
+    return update
+
+def _part_reset_filter(uploader:FileUploader, part_number:int) -> dict:
+    return {**_uploading_filter(uploader), 'parts': part_number}
+
+def _part_reset(part_number:int, size:int) -> dict:
+    return {
+        '$inc': {'total_uploaded': -size}, 
+        '$pull': {'parts': part_number}, 
+        '$unset': {f'part_checksums.{part_number}': ''},
+        '$set': {'modifed': utc_now()}
+    }
+
+def _upload_complete_filter(uploader:FileUploader) -> dict:
+    return {**_uploading_filter(uploader), 'total_uploaded': uploader.total_size}
+
+def _upload_status(status:FileUploadStatus, error:str=None) -> dict:
+    return {'$set': {'status': status.value, 'error': error, 'modifed': utc_now()}}
+
+def _upload_finished(uploader:FileUploader) -> dict:
+    update = _upload_status(FileUploadStatus.process_queue)
+    update['$set']['payload_hash'] = upload_hashes.pop_hash(uploader.id, uploader.total_size)
+    return update
+
+
+def _release_name(release_type:Type[ContentModel]) -> str:
+    return release_type.DB_NAME.replace('_', ' ')
+
+
+def _release_file_cids(release:ImageRelease | AudioRelease | VideoRelease | ModelCreator) -> list[str]:
+    """unique cids of the master and alt format files of a release or release creator, master first"""
+    return list(dict.fromkeys(str(cid) for cid in [release.master, *(release.alt_formats or [])]))
+
+
+def _check_release_files(release_type:Type[ContentModel], files:list[ImageFile | AudioFile | VideoFile], missing:list[str], logged_in_user:User) -> None:
+    """validate the files read for a new release in memory, they must all exist and belong to the logged in user"""
+    release_name = _release_name(release_type)
+
+    if len(missing) > 0:
+        raise MStackUserError(f'Error creating {release_name}: files not found: {", ".join(missing)}')
+    
+    for file in files:
+        if file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to create {release_name} with file {file.cid}')
+
+
+def _check_release_owner(release:ImageRelease | AudioRelease | VideoRelease, logged_in_user:User) -> None:
+    if release.user_cid != logged_in_user.cid:
+        raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete {_release_name(type(release))} {release.cid}')
+
+
+# payloads are stored once by payload cid and shared by every file entry with that payload #
+
+PAYLOAD_FILE_MODELS = (ImageFile, AudioFile, VideoFile)
+
+
+def _payload_filter(files:list[ImageFile | AudioFile | VideoFile]) -> dict:
+    return {'payload_cid': {'$in': list({str(file.payload_cid) for file in files})}}
+
+
+def _is_recently_stored(path:Path) -> bool:
+    """
+    ingest replaces the payload before its file entry is created, a payload changed within 
+    MSTACK_PAYLOAD_UNLINK_GRACE_SECONDS may belong to an entry that doesn't exist yet so 
+    it is left for the clean files process which checks references again
+    """
+    try:
+        return time.time() - path.stat().st_ctime < MSTACK_PAYLOAD_UNLINK_GRACE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def _unlink_files(files:list[ImageFile | AudioFile | VideoFile], referenced:set[str]=frozenset()) -> None:
+    """
+    delete local files after their db entries are deleted, skipping payloads in referenced,
+    errors are logged and left for the clean up process
+    """
+    for file in files:
+        if str(file.payload_cid) in referenced:
+            continue
+
+        path = locate_payload(file.payload_cid)
+        if _is_recently_stored(path):
+            continue
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f'error deleting file cid={file.cid} path={path.as_posix()}: {e}', exc_info=True)
+
+
 class MCoreOps:
 
     def __init__(self) -> None:
@@ -41,14 +336,18 @@ class MCoreOps:
 
     # users #
 
-    def user_create(user_creator:UserCreator) -> User:
+    def user_create(self, user_creator:UserCreator) -> User:
         return create_new_user(user_creator)
     
-    def user_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[User]:
-        return list(self.db.find(User, offset=offset, size=size))
+    def user_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[User]:
+        return list(self.db.find(User, offset=offset, size=size, after=after, fields=fields))
+    
+    def user_read(self, id:UserId=None, cid: UserCid=None, fields:list[str]=None) -> User:
+        return self.db.read(User, id=id, cid=cid, fields=fields)
     
-    def user_read(self, id:UserId=None, cid: UserCid=None) -> User:
-        return self.db.read(User, id=id, cid=cid)
+    def user_read_many(self, ids:list[UserId]=None, cids:list[UserCid]=None) -> BatchReadResult[User]:
+        items, missing = self.db.read_many(User, ids=ids, cids=cids)
+        return BatchReadResult[User](items=items, missing=missing)
     
     def user_delete(self, logged_in_user: User) -> None:
         delete_user(logged_in_user)
@@ -60,11 +359,20 @@ class MCoreOps:
         self.db.create(profile)
         return profile
     
-    def profile_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[Profile]:
-        return list(self.db.find(Profile, offset=offset, size=size))
+    def profile_create_many(self, creators:list[ProfileCreator], logged_in_user:User) -> list[Profile]:
+        profiles = [creator.create_model(user_cid=logged_in_user.cid) for creator in creators]
+        self.db.create_many(profiles)
+        return profiles
+    
+    def profile_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[Profile]:
+        return list(self.db.find(Profile, offset=offset, size=size, after=after, fields=fields))
     
-    def profile_read(self, id:ProfileId=None, cid:ProfileCid=None) -> Profile:
-        return self.db.read(Profile, id=id, cid=cid)
+    def profile_read(self, id:ProfileId=None, cid:ProfileCid=None, fields:list[str]=None) -> Profile:
+        return self.db.read(Profile, id=id, cid=cid, fields=fields)
+    
+    def profile_read_many(self, ids:list[ProfileId]=None, cids:list[ProfileCid]=None) -> BatchReadResult[Profile]:
+        items, missing = self.db.read_many(Profile, ids=ids, cids=cids)
+        return BatchReadResult[Profile](items=items, missing=missing)
     
     def profile_delete(self, logged_in_user:User, id:ProfileId=None, cid:ProfileCid=None) -> None:
         try:
@@ -73,6 +381,17 @@ class MCoreOps:
         except NotFoundError:
             return
 
+    def profile_delete_many(self, logged_in_user:User, ids:list[ProfileId]=None, cids:list[ProfileCid]=None) -> None:
+        profiles, _ = self.db.read_many(Profile, ids=ids, cids=cids)
+        if len(profiles) == 0:
+            return
+
+        for profile in profiles:
+            if profile.user_cid != logged_in_user.cid:
+                raise MStackAuthenticationError('Only logged in user can delete their own profile')
+
+        self.db.delete_many(Profile, ids=[profile.id for profile in profiles])
+
     # file uploader #
 
     def file_uploader_create(self, creator:FileUploaderCreator, logged_in_user:User) -> FileUploader:
@@ -80,8 +399,8 @@ class MCoreOps:
         self.db.create(uploader)
         return uploader
     
-    def file_uploader_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[FileUploader]:
-        return list(self.db.find(FileUploader, offset=offset, size=size))
+    def file_uploader_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None) -> list[FileUploader]:
+        return list(self.db.find(FileUploader, offset=offset, size=size, after=after))
     
     def file_uploader_read(self, id:FileUploaderId) -> FileUploader:
         return self.db.read(FileUploader, id=id)
@@ -94,50 +413,75 @@ class MCoreOps:
         self.db.delete(FileUploader, id=id)
 
     def upload_chunk(self, uploader: FileUploader, chunk: bytes) -> FileUploader:
+        _check_upload(uploader)
+        if _is_over_size(uploader, len(chunk)):
+            self._upload_error(uploader, 'file upload is over upload size')
 
-        # init upload #
-        
-        if uploader.status != FileUploadStatus.uploading:
-            raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value}')
-        
-        if uploader.total_uploaded >= uploader.total_size:
-            raise MStackUserError(f'FileUploader {uploader.id} is already at or over upload size')
+        written = _append_chunk(uploader, chunk)
+        return self._record_upload(uploader, written)
+    
+    def upload_part(self, uploader: FileUploader, part_number:int, data: bytes, checksum:str=None) -> FileUploader:
+        """
+        write one part of a part upload at its offset, parts can be sent concurrently and in any order,
+        if checksum is given the part is only recorded if the sha3-256 hex digest of the data matches
+        """
+        offset, size = _check_part_upload(uploader, part_number)
+        if len(data) != size:
+            raise MStackUserError(f'FileUploader {uploader.id} part {part_number} must be {size} bytes, received {len(data)}')
         
-        # touch / create path if doesn't exist #
-
-        path = uploader.local_path()
-
+        part_hash = sha3_256()
+        fd = _open_part_file(uploader)
         try:
-            path.touch()
-        except FileNotFoundError:
-            os.makedirs(path.parent, exist_ok=True)
-            path.touch()
-        
-        # write chunk to disk #
-        
-        with path.open('ab') as f:
-            written = f.write(chunk)
+            written = _write_part(fd, data, offset, uploader, part_hash)
+        finally:
+            os.close(fd)
+
+        _check_part_checksum(uploader, part_number, part_hash.hexdigest(), checksum)
+        return self._record_upload(uploader, written, part_number, part_hash.hexdigest())
+    
+    def upload_part_reset(self, uploader: FileUploader, part_number:int) -> FileUploader:
+        """forget a received part so it can be sent again, used when resuming finds a part that doesn't match the source"""
+        _, size = _check_part_reset(uploader, part_number)
         
-        uploader.total_uploaded += written
-        uploader.update_timestamp()
+        upload_hashes.discard(uploader.id)
+        try:
+            return self.db.find_one_and_update(FileUploader, _part_reset_filter(uploader, part_number), _part_reset(part_number, size))
+        except NotFoundError:
+            raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value} or part {part_number} is not uploaded')
+    
+    def _record_upload(self, uploader:FileUploader, written:int, part_number:int=None, checksum:str=None) -> FileUploader:
+        """
+        add written bytes to the uploader's progress, moving it to the process queue when the upload is finished,
+        for part uploads the part number and checksum are recorded in the same update so a part is only counted once
+        """
+        if part_number is None:
+            filter, update = _uploading_filter(uploader), _upload_progress(written)
+        else:
+            filter, update = _part_filter(uploader, part_number), _part_progress(part_number, written, checksum)
         
-        # file upload error #
-
-        if uploader.total_uploaded > uploader.total_size:
-            uploader.status = FileUploadStatus.error
-            uploader.error = 'file upload is over upload size'
-            self.db.update(uploader)
-            raise MStackUserError(f'FileUploader {uploader.id} is over upload size')
+        try:
+            uploader = self.db.find_one_and_update(FileUploader, filter, update)
+        except NotFoundError:
+            raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value} or part is already uploaded')
         
-        # file upload finished, update status #
-
         if uploader.total_uploaded == uploader.total_size:
-            uploader.status = FileUploadStatus.process_queue
-
-        self.db.update(uploader)
+            uploader = self.db.find_one_and_update(FileUploader, _upload_complete_filter(uploader), _upload_finished(uploader))
 
         return uploader
     
+    def _upload_error(self, uploader:FileUploader, error:str) -> None:
+        upload_hashes.discard(uploader.id)
+        self.db.find_one_and_update(FileUploader, {'_id': uploader.id}, _upload_status(FileUploadStatus.error, error))
+        raise MStackUserError(f'FileUploader {uploader.id}: {error}')
+
+    def _unlink_unreferenced(self, files:list[ImageFile | AudioFile | VideoFile]) -> None:
+        """delete the payloads of deleted file entries that no remaining image, audio or video file references"""
+        filter = _payload_filter(files)
+        referenced = set()
+        for file_type in PAYLOAD_FILE_MODELS:
+            referenced.update(self.db.get_collection(file_type).distinct('payload_cid', filter))
+        _unlink_files(files, referenced)
+    
     def upload_file(
             self, 
             file_path:str | Path, 
@@ -180,13 +524,67 @@ class MCoreOps:
 
         return uploader
 
+    # releases #
+
+    def _release_create(self, creator:ModelCreator, logged_in_user:User) -> ImageRelease | AudioRelease | VideoRelease:
+        """shared by all release types, reads the master and alt format files with a single $in query"""
+        release_type = creator.MODEL
+        files, missing = self.db.read_many(release_type.FILE_MODEL, cids=_release_file_cids(creator))
+        _check_release_files(release_type, files, missing, logged_in_user)
+
+        release = creator.create_model(user_cid=logged_in_user.cid)
+        self.db.create(release)
+        return release
+    
+    def _release_delete(self, release_type:Type[ContentModel], logged_in_user:User, id:str=None, cid:str=None, delete_files:bool=False) -> None:
+
+        # see note on file deletions at the top of this file
+
+        try:
+            release = self.db.read(release_type, id=id, cid=cid)
+        except NotFoundError:
+            return
+
+        _check_release_owner(release, logged_in_user)
+
+        logging.info(f'deleting {_release_name(release_type)} {release.cid} delete_files={delete_files}')
+        
+        if delete_files:
+            
+            # get files from db with a single $in query - ignoring missing files #
+
+            files, _ = self.db.read_many(release_type.FILE_MODEL, cids=_release_file_cids(release))
+
+            # delete files and release in transaction #
+
+            file_collection = self.db.get_collection(release_type.FILE_MODEL)
+            release_collection = self.db.get_collection(release_type)
+
+            with self.db.start_session() as session:
+                with session.start_transaction():
+                    file_collection.delete_many({'cid': {'$in': [str(file.cid) for file in files]}}, session=session)
+                    release_collection.delete_one({'cid': str(release.cid)}, session=session)
+
+            # delete files from disk that no other file entry references #
+                    
+            self._unlink_unreferenced(files)
+
+        else:
+            self.db.delete(release_type, cid=release.cid)
+
+        logging.info(f'deleted {_release_name(release_type)} {release.cid} delete_files={delete_files}')
+
     # images #
 
-    def image_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[ImageFile]:
-        return list(self.db.find(ImageFile, offset=offset, size=size))
+    def image_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[ImageFile]:
+        return list(self.db.find(ImageFile, offset=offset, size=size, after=after, fields=fields))
+    
+    def image_file_read(self, id:ImageFileId=None, cid:ImageFileCid=None, fields:list[str]=None) -> ImageFile:
+        return self.db.read(ImageFile, id=id, cid=cid, fields=fields)
     
-    def image_file_read(self, id:ImageFileId=None, cid:ImageFileCid=None) -> ImageFile:
-        return self.db.read(ImageFile, id=id, cid=cid)
+    def image_file_read_many(self, ids:list[ImageFileId]=None, cids:list[ImageFileCid]=None) -> BatchReadResult[ImageFile]:
+        items, missing = self.db.read_many(ImageFile, ids=ids, cids=cids)
+        return BatchReadResult[ImageFile](items=items, missing=missing)
     
     def image_file_delete(self, logged_in_user:User, id:ImageFileId=None, cid:ImageFileCid=None) -> None:
 
@@ -204,310 +602,508 @@ class MCoreOps:
 
         self.db.delete(ImageFile, id=id, cid=cid)
 
-        try:
-            image_file.local_path.unlink()
-        except FileNotFoundError:
-            pass
-        except Exception as e:
-            logging.warning(f'error deleting image file cid={image_file.cid} path={image_file.local_path.as_posix()}: {e}', exc_info=True)
+        self._unlink_unreferenced([image_file])
 
         logging.info(f'deleted image file {image_file.cid}')
     
     def image_release_create(self, creator:ImageReleaseCreator, logged_in_user:User) -> ImageRelease:
-        
-        try:
-            master = self.image_file_read(cid=creator.master)
-            alt_formats = [self.image_file_read(cid=cid) for cid in creator.alt_formats]
-        except NotFoundError as e:
-            raise MStackUserError(f'Error creating image release: {e}')
-
-        for image_file in [master] + alt_formats:
-            if image_file.user_cid != logged_in_user.cid:
-                raise MStackUserError(f'User {logged_in_user.cid} does not have permission to create image release with file {image_file.cid}')
-
-        image_release = creator.create_model(user_cid=logged_in_user.cid)
-        self.db.create(image_release)
-        return image_release
+        return self._release_create(creator, logged_in_user)
     
-    def image_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[ImageRelease]:
-        return list(self.db.find(ImageRelease, offset=offset, size=size))
+    def image_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[ImageRelease]:
+        return list(self.db.find(ImageRelease, offset=offset, size=size, after=after, fields=fields))
     
-    def image_release_read(self, id:ImageReleaseId=None, cid:ImageReleaseCid=None) -> ImageRelease:
-        return self.db.read(ImageRelease, id=id, cid=cid)
+    def image_release_read(self, id:ImageReleaseId=None, cid:ImageReleaseCid=None, fields:list[str]=None) -> ImageRelease:
+        return self.db.read(ImageRelease, id=id, cid=cid, fields=fields)
+    
+    def image_release_read_many(self, ids:list[ImageReleaseId]=None, cids:list[ImageReleaseCid]=None) -> BatchReadResult[ImageRelease]:
+        items, missing = self.db.read_many(ImageRelease, ids=ids, cids=cids)
+        return BatchReadResult[ImageRelease](items=items, missing=missing)
     
     def image_release_delete(self, logged_in_user:User, id:ImageReleaseId=None, cid:ImageReleaseCid=None, delete_files:bool = False) -> None:
+        self._release_delete(ImageRelease, logged_in_user, id, cid, delete_files)
+    
+    # audio #
+
+    def audio_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[AudioFile]:
+        return list(self.db.find(AudioFile, offset=offset, size=size, after=after, fields=fields))
+    
+    def audio_file_read(self, id:AudioFileId=None, cid:AudioFileCid=None, fields:list[str]=None) -> AudioFile:
+        return self.db.read(AudioFile, id=id, cid=cid, fields=fields)
+    
+    def audio_file_read_many(self, ids:list[AudioFileId]=None, cids:list[AudioFileCid]=None) -> BatchReadResult[AudioFile]:
+        items, missing = self.db.read_many(AudioFile, ids=ids, cids=cids)
+        return BatchReadResult[AudioFile](items=items, missing=missing)
+    
+    def audio_file_delete(self, logged_in_user:User, id:AudioFileId=None, cid:AudioFileCid=None) -> None:
 
         # see note on file deletions at the top of this file
 
         try:
-            image_release = self.image_release_read(id, cid)
+            audio_file = self.audio_file_read(id, cid)
         except NotFoundError:
             return
 
-        if image_release.user_cid != logged_in_user.cid:
-            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete image release {image_release.cid}')
+        if audio_file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete audio file {audio_file.cid}')
 
-        logging.info(f'deleting image release {image_release.cid} delete_files={delete_files}')
-        
-        if delete_files:
-            
-            # get files from db - ignoring not found errors #
+        logging.info(f'deleting audio file {audio_file.cid}')
 
-            image_files:List[ImageFile] = []
-            
-            for cid in image_release.alt_formats:
-                try:
-                    image_files.append(self.image_file_read(cid=cid))
-                except NotFoundError:
-                    pass
+        self.db.delete(AudioFile, id=id, cid=cid)
 
-            try:
-                image_files.append(self.image_file_read(cid=image_release.master))
-            except NotFoundError:
-                pass
+        self._unlink_unreferenced([audio_file])
 
-            # delete files and release in transaction #
+        logging.info(f'deleted audio file {audio_file.cid}')
+    
+    def audio_release_create(self, creator:AudioReleaseCreator, logged_in_user:User) -> AudioRelease:
+        return self._release_create(creator, logged_in_user)
+    
+    def audio_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[AudioRelease]:
+        return list(self.db.find(AudioRelease, offset=offset, size=size, after=after, fields=fields))
+    
+    def audio_release_read(self, id:AudioReleaseId=None, cid:AudioReleaseCid=None, fields:list[str]=None) -> AudioRelease:
+        return self.db.read(AudioRelease, id=id, cid=cid, fields=fields)
+    
+    def audio_release_read_many(self, ids:list[AudioReleaseId]=None, cids:list[AudioReleaseCid]=None) -> BatchReadResult[AudioRelease]:
+        items, missing = self.db.read_many(AudioRelease, ids=ids, cids=cids)
+        return BatchReadResult[AudioRelease](items=items, missing=missing)
+    
+    def audio_release_delete(self, logged_in_user:User, id:AudioReleaseId=None, cid:AudioReleaseCid=None, delete_files:bool = False) -> None:
+        self._release_delete(AudioRelease, logged_in_user, id, cid, delete_files)
 
-            img_file_collection = self.db.get_collection(ImageFile)
-            img_release_collection = self.db.get_collection(ImageRelease)
+    # video #
 
-            with self.db.start_session() as session:
-                with session.start_transaction():
-                    img_file_collection.delete_many({'cid': {'$in': [img.cid for img in image_files]}}, session=session)
-                    img_release_collection.delete_one({'cid': image_release.cid}, session=session)
+    def video_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[VideoFile]:
+        return list(self.db.find(VideoFile, offset=offset, size=size, after=after, fields=fields))
+    
+    def video_file_read(self, id:VideoFileId=None, cid:VideoFileCid=None, fields:list[str]=None) -> VideoFile:
+        return self.db.read(VideoFile, id=id, cid=cid, fields=fields)
+    
+    def video_file_read_many(self, ids:list[VideoFileId]=None, cids:list[VideoFileCid]=None) -> BatchReadResult[VideoFile]:
+        items, missing = self.db.read_many(VideoFile, ids=ids, cids=cids)
+        return BatchReadResult[VideoFile](items=items, missing=missing)
+    
+    def video_file_delete(self, logged_in_user:User, id:VideoFileId=None, cid:VideoFileCid=None) -> None:
+            
+        # see note on file deletions at the top of this file
 
-            # delete files from disk #
-                    
-            for img_file in image_files:
-                try:
-                    img_file.local_path.unlink()
-                except FileNotFoundError:
-                    pass
-                except Exception as e:
-                    logging.warning(f'error deleting image file cid={img_file.cid} path={img_file.local_path.as_posix()}: {e}', exc_info=True)
+        try:
+            video_file = self.video_file_read(id, cid)
+        except NotFoundError:
+            return
+        
+        if video_file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete video file {video_file.cid}')
+        
+        logging.info(f'deleting video file {video_file.cid}')
 
-        else:
-            self.db.delete(ImageRelease, cid=image_release.cid)
+        self.db.delete(VideoFile, id=id, cid=cid)
 
-        logging.info(f'deleted image release {image_release.cid} delete_files={delete_files}')
-    
-    # audio #
+        self._unlink_unreferenced([video_file])
+
+        logging.info(f'deleted video file {video_file.cid}')
 
-    def audio_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[AudioFile]:
-        return list(self.db.find(AudioFile, offset=offset, size=size))
+    def video_release_create(self, creator:VideoReleaseCreator, logged_in_user:User) -> VideoRelease:
+        return self._release_create(creator, logged_in_user)
     
-    def audio_file_read(self, id:AudioFileId=None, cid:AudioFileCid=None) -> AudioFile:
-        return self.db.read(AudioFile, id=id, cid=cid)
+    def video_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[VideoRelease]:
+        return list(self.db.find(VideoRelease, offset=offset, size=size, after=after, fields=fields))
     
-    def audio_file_delete(self, logged_in_user:User, id:AudioFileId=None, cid:AudioFileCid=None) -> None:
+    def video_release_read(self, id:VideoReleaseId=None, cid:VideoReleaseCid=None, fields:list[str]=None) -> VideoRelease:
+        return self.db.read(VideoRelease, id=id, cid=cid, fields=fields)
+    
+    def video_release_read_many(self, ids:list[VideoReleaseId]=None, cids:list[VideoReleaseCid]=None) -> BatchReadResult[VideoRelease]:
+        items, missing = self.db.read_many(VideoRelease, ids=ids, cids=cids)
+        return BatchReadResult[VideoRelease](items=items, missing=missing)
 
-        # see note on file deletions at the top of this file
+    def video_release_delete(self, logged_in_user:User, id:VideoReleaseId=None, cid:VideoReleaseCid=None, delete_files:bool = False) -> None:
+        self._release_delete(VideoRelease, logged_in_user, id, cid, delete_files)
 
+class AsyncMCoreOps:
+    """
+    asyncio counterpart to MCoreOps used by the web server, db calls are awaited on AsyncMongoDB
+    and disk writes are moved off of the event loop so that a slow query or upload does not block other requests
+    """
+
+    def __init__(self) -> None:
+        self.db = AsyncMongoDB.from_cache()
+
+    # users #
+
+    async def user_create(self, user_creator:UserCreator) -> User:
+        return await create_new_user_async(user_creator)
+    
+    async def user_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[User]:
+        return [user async for user in self.db.find(User, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def user_read(self, id:UserId=None, cid: UserCid=None, fields:list[str]=None) -> User:
+        return await self.db.read(User, id=id, cid=cid, fields=fields)
+    
+    async def user_read_many(self, ids:list[UserId]=None, cids:list[UserCid]=None) -> BatchReadResult[User]:
+        items, missing = await self.db.read_many(User, ids=ids, cids=cids)
+        return BatchReadResult[User](items=items, missing=missing)
+    
+    async def user_delete(self, logged_in_user: User) -> None:
+        await delete_user_async(logged_in_user)
+
+    # profiles #
+        
+    async def profile_create(self, creator:ProfileCreator, logged_in_user:User) -> Profile:
+        profile = creator.create_model(user_cid=logged_in_user.cid)
+        await self.db.create(profile)
+        return profile
+    
+    async def profile_create_many(self, creators:list[ProfileCreator], logged_in_user:User) -> list[Profile]:
+        profiles = [creator.create_model(user_cid=logged_in_user.cid) for creator in creators]
+        await self.db.create_many(profiles)
+        return profiles
+    
+    async def profile_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[Profile]:
+        return [profile async for profile in self.db.find(Profile, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def profile_read(self, id:ProfileId=None, cid:ProfileCid=None, fields:list[str]=None) -> Profile:
+        return await self.db.read(Profile, id=id, cid=cid, fields=fields)
+    
+    async def profile_read_many(self, ids:list[ProfileId]=None, cids:list[ProfileCid]=None) -> BatchReadResult[Profile]:
+        items, missing = await self.db.read_many(Profile, ids=ids, cids=cids)
+        return BatchReadResult[Profile](items=items, missing=missing)
+    
+    async def profile_delete(self, logged_in_user:User, id:ProfileId=None, cid:ProfileCid=None) -> None:
         try:
-            audio_file = self.audio_file_read(id, cid)
+            profile = await self.profile_read(id, cid)
+            await delete_profile_async(profile, logged_in_user)
         except NotFoundError:
             return
 
-        if audio_file.user_cid != logged_in_user.cid:
-            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete audio file {audio_file.cid}')
+    async def profile_delete_many(self, logged_in_user:User, ids:list[ProfileId]=None, cids:list[ProfileCid]=None) -> None:
+        profiles, _ = await self.db.read_many(Profile, ids=ids, cids=cids)
+        if len(profiles) == 0:
+            return
 
-        logging.info(f'deleting audio file {audio_file.cid}')
+        for profile in profiles:
+            if profile.user_cid != logged_in_user.cid:
+                raise MStackAuthenticationError('Only logged in user can delete their own profile')
 
-        self.db.delete(AudioFile, id=id, cid=cid)
+        await self.db.delete_many(Profile, ids=[profile.id for profile in profiles])
+
+    # file uploader #
 
+    async def file_uploader_create(self, creator:FileUploaderCreator, logged_in_user:User) -> FileUploader:
+        uploader:FileUploader = creator.create_model(user_cid=logged_in_user.cid)
+        await self.db.create(uploader)
+        return uploader
+    
+    async def file_uploader_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None) -> list[FileUploader]:
+        return [uploader async for uploader in self.db.find(FileUploader, offset=offset, size=size, after=after)]
+    
+    async def file_uploader_read(self, id:FileUploaderId) -> FileUploader:
+        return await self.db.read(FileUploader, id=id)
+    
+    async def file_uploader_delete(self, file_uploader: FileUploader | FileUploaderId) -> None:
         try:
-            audio_file.local_path.unlink()
-        except FileNotFoundError:
-            pass
-        except Exception as e:
-            logging.warning(f'error deleting audio file cid={audio_file.cid} path={audio_file.local_path.as_posix()}: {e}', exc_info=True)
+            id = file_uploader.id
+        except AttributeError:
+            id = file_uploader
+        await self.db.delete(FileUploader, id=id)
 
-        logging.info(f'deleted audio file {audio_file.cid}')
+    async def upload_chunk(self, uploader: FileUploader, chunk: bytes) -> FileUploader:
+        _check_upload(uploader)
+        if _is_over_size(uploader, len(chunk)):
+            await self._upload_error(uploader, 'file upload is over upload size')
+
+        written = await asyncio.to_thread(_append_chunk, uploader, chunk)
+        return await self._record_upload(uploader, written)
     
-    def audio_release_create(self, creator:AudioReleaseCreator, logged_in_user:User) -> AudioRelease:
-        
+    async def upload_stream(self, uploader: FileUploader, stream: AsyncIterator[bytes]) -> FileUploader:
+        """
+        append a stream such as a request body to the upload, data is collected into buffers of 
+        MSTACK_UPLOAD_BUFFER_SIZE bytes that are written off the event loop so memory use stays 
+        constant for any file size, progress is recorded after each buffer is written
+        """
+        _check_upload(uploader)
+
+        file = await asyncio.to_thread(_open_upload, uploader)
+        buffer = bytearray()
         try:
-            master = self.audio_file_read(cid=creator.master)
-            alt_formats = [self.audio_file_read(cid=cid) for cid in creator.alt_formats]
-        except NotFoundError as e:
-            raise MStackUserError(f'Error creating audio release: {e}')
+            async for data in stream:
+                buffer += data
+                if len(buffer) >= MSTACK_UPLOAD_BUFFER_SIZE:
+                    uploader = await self._write_buffer(uploader, file, buffer)
+                    buffer.clear()
 
-        for audio_file in [master] + alt_formats:
-            if audio_file.user_cid != logged_in_user.cid:
-                raise MStackUserError(f'User {logged_in_user.cid} does not have permission to create audio release with file {audio_file.cid}')
+            if len(buffer) > 0:
+                uploader = await self._write_buffer(uploader, file, buffer)
+        finally:
+            await asyncio.to_thread(file.close)
 
-        audio_release = creator.create_model(user_cid=logged_in_user.cid)
-        self.db.create(audio_release)
-        return audio_release
+        return uploader
     
-    def audio_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[AudioRelease]:
-        return list(self.db.find(AudioRelease, offset=offset, size=size))
+    async def _write_buffer(self, uploader:FileUploader, file:BinaryIO, buffer:bytearray) -> FileUploader:
+        if _is_over_size(uploader, len(buffer)):
+            await self._upload_error(uploader, 'file upload is over upload size')
+
+        written = await asyncio.to_thread(_write_upload, file, buffer, uploader)
+        return await self._record_upload(uploader, written)
     
-    def audio_release_read(self, id:AudioReleaseId=None, cid:AudioReleaseCid=None) -> AudioRelease:
-        return self.db.read(AudioRelease, id=id, cid=cid)
+    async def upload_part(self, uploader: FileUploader, part_number:int, stream: AsyncIterator[bytes], checksum:str=None) -> FileUploader:
+        """
+        write one part of a part upload at its offset in the preallocated file, parts can be sent 
+        concurrently and in any order, the upload is finished when every part has been received,
+        if checksum is given the part is only recorded if the sha3-256 hex digest of the data matches
+        """
+        offset, size = _check_part_upload(uploader, part_number)
+
+        part_hash = sha3_256()
+        fd = await asyncio.to_thread(_open_part_file, uploader)
+        written = 0
+        buffer = bytearray()
+        try:
+            async for data in stream:
+                buffer += data
+                if written + len(buffer) > size:
+                    raise MStackUserError(f'FileUploader {uploader.id} part {part_number} is larger than {size} bytes')
+                
+                if len(buffer) >= MSTACK_UPLOAD_BUFFER_SIZE:
+                    written += await asyncio.to_thread(_write_part, fd, buffer, offset + written, uploader, part_hash)
+                    buffer.clear()
+
+            if len(buffer) > 0:
+                written += await asyncio.to_thread(_write_part, fd, buffer, offset + written, uploader, part_hash)
+        finally:
+            await asyncio.to_thread(os.close, fd)
+
+        if written != size:
+            raise MStackUserError(f'FileUploader {uploader.id} part {part_number} must be {size} bytes, received {written}')
+        
+        _check_part_checksum(uploader, part_number, part_hash.hexdigest(), checksum)
+        return await self._record_upload(uploader, written, part_number, part_hash.hexdigest())
     
-    def audio_release_delete(self, logged_in_user:User, id:AudioReleaseId=None, cid:AudioReleaseCid=None, delete_files:bool = False) -> None:
-            
+    async def upload_part_reset(self, uploader: FileUploader, part_number:int) -> FileUploader:
+        """forget a received part so it can be sent again, used when resuming finds a part that doesn't match the source"""
+        _, size = _check_part_reset(uploader, part_number)
+        
+        upload_hashes.discard(uploader.id)
+        try:
+            return await self.db.find_one_and_update(FileUploader, _part_reset_filter(uploader, part_number), _part_reset(part_number, size))
+        except NotFoundError:
+            raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value} or part {part_number} is not uploaded')
+    
+    async def _record_upload(self, uploader:FileUploader, written:int, part_number:int=None, checksum:str=None) -> FileUploader:
+        if part_number is None:
+            filter, update = _uploading_filter(uploader), _upload_progress(written)
+        else:
+            filter, update = _part_filter(uploader, part_number), _part_progress(part_number, written, checksum)
+        
+        try:
+            uploader = await self.db.find_one_and_update(FileUploader, filter, update)
+        except NotFoundError:
+            raise MStackUserError(f'FileUploader {uploader.id} status is not {FileUploadStatus.uploading.value} or part is already uploaded')
+        
+        if uploader.total_uploaded == uploader.total_size:
+            uploader = await self.db.find_one_and_update(FileUploader, _upload_complete_filter(uploader), _upload_finished(uploader))
+
+        return uploader
+    
+    async def _upload_error(self, uploader:FileUploader, error:str) -> None:
+        upload_hashes.discard(uploader.id)
+        await self.db.find_one_and_update(FileUploader, {'_id': uploader.id}, _upload_status(FileUploadStatus.error, error))
+        raise MStackUserError(f'FileUploader {uploader.id}: {error}')
+
+    async def _unlink_unreferenced(self, files:list[ImageFile | AudioFile | VideoFile]) -> None:
+        filter = _payload_filter(files)
+        referenced = set()
+        for file_type in PAYLOAD_FILE_MODELS:
+            referenced.update(await self.db.get_collection(file_type).distinct('payload_cid', filter))
+        await asyncio.to_thread(_unlink_files, files, referenced)
+
+    # releases #
+
+    async def _release_create(self, creator:ModelCreator, logged_in_user:User) -> ImageRelease | AudioRelease | VideoRelease:
+        release_type = creator.MODEL
+        files, missing = await self.db.read_many(release_type.FILE_MODEL, cids=_release_file_cids(creator))
+        _check_release_files(release_type, files, missing, logged_in_user)
+
+        release = creator.create_model(user_cid=logged_in_user.cid)
+        await self.db.create(release)
+        return release
+    
+    async def _release_delete(self, release_type:Type[ContentModel], logged_in_user:User, id:str=None, cid:str=None, delete_files:bool=False) -> None:
+
         # see note on file deletions at the top of this file
 
         try:
-            audio_release = self.audio_release_read(id, cid)
+            release = await self.db.read(release_type, id=id, cid=cid)
         except NotFoundError:
             return
-        
-        if audio_release.user_cid != logged_in_user.cid:
-            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete audio release {audio_release.cid}')
 
-        logging.info(f'deleting audio release {audio_release.cid} delete_files={delete_files}')
+        _check_release_owner(release, logged_in_user)
+
+        logging.info(f'deleting {_release_name(release_type)} {release.cid} delete_files={delete_files}')
         
         if delete_files:
             
-            # get files from db - ignoring not found errors #
+            # get files from db with a single $in query - ignoring missing files #
 
-            audio_files:List[AudioFile] = []
-
-            for cid in audio_release.alt_formats:
-                try:
-                    audio_files.append(self.audio_file_read(cid=cid))
-                except NotFoundError:
-                    pass
-
-            try:
-                audio_files.append(self.audio_file_read(cid=audio_release.master))
-            except NotFoundError:
-                pass
+            files, _ = await self.db.read_many(release_type.FILE_MODEL, cids=_release_file_cids(release))
 
             # delete files and release in transaction #
 
-            audio_file_collection = self.db.get_collection(AudioFile)
-            audio_release_collection = self.db.get_collection(AudioRelease)
+            file_collection = self.db.get_collection(release_type.FILE_MODEL)
+            release_collection = self.db.get_collection(release_type)
 
-            with self.db.start_session() as session:
-                with session.start_transaction():
-                    audio_file_collection.delete_many({'cid': {'$in': [audio.cid for audio in audio_files]}}, session=session)
-                    audio_release_collection.delete_one({'cid': audio_release.cid}, session=session)
+            async with self.db.start_session() as session:
+                async with await session.start_transaction():
+                    await file_collection.delete_many({'cid': {'$in': [str(file.cid) for file in files]}}, session=session)
+                    await release_collection.delete_one({'cid': str(release.cid)}, session=session)
 
-            # delete files from disk #
+            # delete files from disk that no other file entry references #
                     
-            for audio_file in audio_files:
-                try:
-                    audio_file.local_path.unlink()
-                except FileNotFoundError:
-                    pass
-                except Exception as e:
-                    logging.warning(f'error deleting audio file cid={audio_file.cid} path={audio_file.local_path.as_posix()}: {e}', exc_info=True)
+            await self._unlink_unreferenced(files)
 
         else:
-            self.db.delete(AudioRelease, cid=audio_release.cid)
+            await self.db.delete(release_type, cid=release.cid)
 
-        logging.info(f'deleted audio release {audio_release.cid} delete_files={delete_files}')
+        logging.info(f'deleted {_release_name(release_type)} {release.cid} delete_files={delete_files}')
 
-    # video #
+    # images #
 
-    def video_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[VideoFile]:
-        return list(self.db.find(VideoFile, offset=offset, size=size))
+    async def image_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[ImageFile]:
+        return [image_file async for image_file in self.db.find(ImageFile, offset=offset, size=size, after=after, fields=fields)]
     
-    def video_file_read(self, id:VideoFileId=None, cid:VideoFileCid=None) -> VideoFile:
-        return self.db.read(VideoFile, id=id, cid=cid)
+    async def image_file_read(self, id:ImageFileId=None, cid:ImageFileCid=None, fields:list[str]=None) -> ImageFile:
+        return await self.db.read(ImageFile, id=id, cid=cid, fields=fields)
     
-    def video_file_delete(self, logged_in_user:User, id:VideoFileId=None, cid:VideoFileCid=None) -> None:
-            
+    async def image_file_read_many(self, ids:list[ImageFileId]=None, cids:list[ImageFileCid]=None) -> BatchReadResult[ImageFile]:
+        items, missing = await self.db.read_many(ImageFile, ids=ids, cids=cids)
+        return BatchReadResult[ImageFile](items=items, missing=missing)
+    
+    async def image_file_delete(self, logged_in_user:User, id:ImageFileId=None, cid:ImageFileCid=None) -> None:
+
         # see note on file deletions at the top of this file
 
         try:
-            video_file = self.video_file_read(id, cid)
+            image_file = await self.image_file_read(id, cid)
         except NotFoundError:
             return
-        
-        if video_file.user_cid != logged_in_user.cid:
-            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete video file {video_file.cid}')
-        
-        logging.info(f'deleting video file {video_file.cid}')
 
-        self.db.delete(VideoFile, id=id, cid=cid)
+        if image_file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete image file {image_file.cid}')
 
-        try:
-            video_file.local_path.unlink()
-        except FileNotFoundError:
-            pass
-        except Exception as e:
-            logging.warning(f'error deleting video file cid={video_file.cid} path={video_file.local_path.as_posix()}: {e}', exc_info=True)
+        logging.info(f'deleting image file {image_file.cid}')
 
-        logging.info(f'deleted video file {video_file.cid}')
+        await self.db.delete(ImageFile, id=id, cid=cid)
 
-    def video_release_create(self, creator:VideoReleaseCreator, logged_in_user:User) -> VideoRelease:
+        await self._unlink_unreferenced([image_file])
+
+        logging.info(f'deleted image file {image_file.cid}')
+    
+    async def image_release_create(self, creator:ImageReleaseCreator, logged_in_user:User) -> ImageRelease:
+        return await self._release_create(creator, logged_in_user)
+    
+    async def image_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[ImageRelease]:
+        return [image_release async for image_release in self.db.find(ImageRelease, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def image_release_read(self, id:ImageReleaseId=None, cid:ImageReleaseCid=None, fields:list[str]=None) -> ImageRelease:
+        return await self.db.read(ImageRelease, id=id, cid=cid, fields=fields)
+    
+    async def image_release_read_many(self, ids:list[ImageReleaseId]=None, cids:list[ImageReleaseCid]=None) -> BatchReadResult[ImageRelease]:
+        items, missing = await self.db.read_many(ImageRelease, ids=ids, cids=cids)
+        return BatchReadResult[ImageRelease](items=items, missing=missing)
+    
+    async def image_release_delete(self, logged_in_user:User, id:ImageReleaseId=None, cid:ImageReleaseCid=None, delete_files:bool = False) -> None:
+        await self._release_delete(ImageRelease, logged_in_user, id, cid, delete_files)
+    
+    # audio #
+
+    async def audio_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[AudioFile]:
+        return [audio_file async for audio_file in self.db.find(AudioFile, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def audio_file_read(self, id:AudioFileId=None, cid:AudioFileCid=None, fields:list[str]=None) -> AudioFile:
+        return await self.db.read(AudioFile, id=id, cid=cid, fields=fields)
+    
+    async def audio_file_read_many(self, ids:list[AudioFileId]=None, cids:list[AudioFileCid]=None) -> BatchReadResult[AudioFile]:
+        items, missing = await self.db.read_many(AudioFile, ids=ids, cids=cids)
+        return BatchReadResult[AudioFile](items=items, missing=missing)
+    
+    async def audio_file_delete(self, logged_in_user:User, id:AudioFileId=None, cid:AudioFileCid=None) -> None:
+
+        # see note on file deletions at the top of this file
 
         try:
-            master = self.video_file_read(cid=creator.master)
-            alt_formats = [self.video_file_read(cid=cid) for cid in creator.alt_formats]
-        except NotFoundError as e:
-            raise MStackUserError(f'Error creating video release: {e}')
-        
-        for video_file in [master] + alt_formats:
-            if video_file.user_cid != logged_in_user.cid:
-                raise MStackUserError(f'User {logged_in_user.cid} does not have permission to create video release with file {video_file.cid}')
+            audio_file = await self.audio_file_read(id, cid)
+        except NotFoundError:
+            return
+
+        if audio_file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete audio file {audio_file.cid}')
+
+        logging.info(f'deleting audio file {audio_file.cid}')
+
+        await self.db.delete(AudioFile, id=id, cid=cid)
+
+        await self._unlink_unreferenced([audio_file])
 
-        video_release = creator.create_model(user_cid=logged_in_user.cid)
-        self.db.create(video_release)
-        return video_release
+        logging.info(f'deleted audio file {audio_file.cid}')
+    
+    async def audio_release_create(self, creator:AudioReleaseCreator, logged_in_user:User) -> AudioRelease:
+        return await self._release_create(creator, logged_in_user)
     
-    def video_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE) -> list[VideoRelease]:
-        return list(self.db.find(VideoRelease, offset=offset, size=size))
+    async def audio_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[AudioRelease]:
+        return [audio_release async for audio_release in self.db.find(AudioRelease, offset=offset, size=size, after=after, fields=fields)]
     
-    def video_release_read(self, id:VideoReleaseId=None, cid:VideoReleaseCid=None) -> VideoRelease:
-        return self.db.read(VideoRelease, id=id, cid=cid)
+    async def audio_release_read(self, id:AudioReleaseId=None, cid:AudioReleaseCid=None, fields:list[str]=None) -> AudioRelease:
+        return await self.db.read(AudioRelease, id=id, cid=cid, fields=fields)
+    
+    async def audio_release_read_many(self, ids:list[AudioReleaseId]=None, cids:list[AudioReleaseCid]=None) -> BatchReadResult[AudioRelease]:
+        items, missing = await self.db.read_many(AudioRelease, ids=ids, cids=cids)
+        return BatchReadResult[AudioRelease](items=items, missing=missing)
+    
+    async def audio_release_delete(self, logged_in_user:User, id:AudioReleaseId=None, cid:AudioReleaseCid=None, delete_files:bool = False) -> None:
+        await self._release_delete(AudioRelease, logged_in_user, id, cid, delete_files)
 
-    def video_release_delete(self, logged_in_user:User, id:VideoReleaseId=None, cid:VideoReleaseCid=None, delete_files:bool = False) -> None:
+    # video #
+
+    async def video_file_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[VideoFile]:
+        return [video_file async for video_file in self.db.find(VideoFile, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def video_file_read(self, id:VideoFileId=None, cid:VideoFileCid=None, fields:list[str]=None) -> VideoFile:
+        return await self.db.read(VideoFile, id=id, cid=cid, fields=fields)
+    
+    async def video_file_read_many(self, ids:list[VideoFileId]=None, cids:list[VideoFileCid]=None) -> BatchReadResult[VideoFile]:
+        items, missing = await self.db.read_many(VideoFile, ids=ids, cids=cids)
+        return BatchReadResult[VideoFile](items=items, missing=missing)
+    
+    async def video_file_delete(self, logged_in_user:User, id:VideoFileId=None, cid:VideoFileCid=None) -> None:
             
         # see note on file deletions at the top of this file
 
         try:
-            video_release = self.video_release_read(id, cid)
+            video_file = await self.video_file_read(id, cid)
         except NotFoundError:
             return
         
-        if video_release.user_cid != logged_in_user.cid:
-            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete video release {video_release.cid}')
-
-        logging.info(f'deleting video release {video_release.cid} delete_files={delete_files}')
+        if video_file.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete video file {video_file.cid}')
         
-        if delete_files:
-            
-            # get files from db #
-
-            video_files:List[VideoFile] = []
-            for cid in video_release.alt_formats:
-                try:
-                    video_files.append(self.video_file_read(cid=cid))
-                except NotFoundError:
-                    pass
-            
-            try:
-                video_files.append(self.video_file_read(cid=video_release.master))
-            except NotFoundError:
-                pass
-
-            # delete files and release in transaction #
+        logging.info(f'deleting video file {video_file.cid}')
 
-            video_file_collection = self.db.get_collection(VideoFile)
-            video_release_collection = self.db.get_collection(VideoRelease)
+        await self.db.delete(VideoFile, id=id, cid=cid)
 
-            with self.db.start_session() as session:
-                with session.start_transaction():
-                    video_file_collection.delete_many({'cid': {'$in': [video.cid for video in video_files]}}, session=session)
-                    video_release_collection.delete_one({'cid': video_release.cid}, session=session)
+        await self._unlink_unreferenced([video_file])
 
-            # delete files from disk #
-                    
-            for video_file in video_files:
-                try:
-                    video_file.local_path.unlink()
-                except FileNotFoundError:
-                    pass
-                except Exception as e:
-                    logging.warning(f'error deleting video file cid={video_file.cid} path={video_file.local_path.as_posix()}: {e}', exc_info=True)
+        logging.info(f'deleted video file {video_file.cid}')
 
-        else:
-            self.db.delete(VideoRelease, cid=video_release.cid)
+    async def video_release_create(self, creator:VideoReleaseCreator, logged_in_user:User) -> VideoRelease:
+        return await self._release_create(creator, logged_in_user)
+    
+    async def video_release_list(self, offset:int=SDK_DEFAULT_OFFSET, size:int=SDK_DEFAULT_SIZE, after:str=None, fields:list[str]=None) -> list[VideoRelease]:
+        return [video_release async for video_release in self.db.find(VideoRelease, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def video_release_read(self, id:VideoReleaseId=None, cid:VideoReleaseCid=None, fields:list[str]=None) -> VideoRelease:
+        return await self.db.read(VideoRelease, id=id, cid=cid, fields=fields)
+    
+    async def video_release_read_many(self, ids:list[VideoReleaseId]=None, cids:list[VideoReleaseCid]=None) -> BatchReadResult[VideoRelease]:
+        items, missing = await self.db.read_many(VideoRelease, ids=ids, cids=cids)
+        return BatchReadResult[VideoRelease](items=items, missing=missing)
 
-        logging.info(f'deleted video release {video_release.cid} delete_files={delete_files}')
\ No newline at end of file
+    async def video_release_delete(self, logged_in_user:User, id:VideoReleaseId=None, cid:VideoReleaseCid=None, delete_files:bool = False) -> None:
+        await self._release_delete(VideoRelease, logged_in_user, id, cid, delete_files)
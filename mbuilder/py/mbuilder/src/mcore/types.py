@@ -6,7 +6,8 @@ import base64
 from enum import Enum
 from pathlib import Path
 from hashlib import sha3_256
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Annotated, ClassVar, ClassVar, Union, Dict, List, BinaryIO, Optional
 from bson import ObjectId
 from bson.errors import InvalidId
@@ -51,32 +52,48 @@ class ModelIdType(str, Enum):
 # content id
 #
 
-@dataclass
+MSTACK_CID_PARSE_CACHE_SIZE = int(os.environ.get('MSTACK_CID_PARSE_CACHE_SIZE', 8192))
+
+# the canonical json for ContentId.from_dict, this must stay byte for byte the output of
+# json.dumps(data, sort_keys=True) or the cids of existing models would change #
+_CANONICAL_JSON = json.JSONEncoder(sort_keys=True)
+
+# version, 43 character url safe base64 sha3-256 hash, size, optional extension #
+_CID_PATTERN = re.compile(r'([0-9])([A-Za-z0-9_-]{43})([0-9]+)(?:\.(.*))?', re.DOTALL)
+
+@dataclass(frozen=True, slots=True)
 class ContentId:
+    """
+    content ids are immutable so parsed ids are shared through an lru cache of recent identifiers,
+    the same cids are parsed over and over when models are loaded and listed
+    """
+
     hash:str
     size:int
     ext:str = ''
+    identifier:str = field(init=False, repr=False, compare=False)
 
     read_buffer_len: ClassVar[int] = 1024 * 1024 * 256
     cid_version: ClassVar[int] = 0
 
     # core methods #
 
+    def __post_init__(self):
+        identifier = f'{self.cid_version}{self.hash}{self.size}'
+        if self.ext != '':
+            identifier += f'.{self.ext}'
+        object.__setattr__(self, 'identifier', identifier)
+
     def __str__(self) -> str:
         return self.identifier
-    
-    @property
-    def identifier(self) -> str:
-        cid = f'{self.cid_version}{self.hash}{self.size}'
-        if self.ext != '':
-            cid += f'.{self.ext}'
-        return cid
         
     # initilization methods #
 
     @classmethod
     def validate(cls, content_id:Union[str, 'ContentId']) -> 'ContentId':
-        if isinstance(content_id, str):
+        if type(content_id) is cls:
+            return content_id
+        elif isinstance(content_id, str):
             return cls.parse(content_id)
         elif isinstance(content_id, dict):
             return cls(**content_id)
@@ -87,29 +104,19 @@ class ContentId:
 
     @classmethod
     def parse(cls, content_id:str) -> 'ContentId':
-        version = int(content_id[0])
-        if version != 0:
-            raise ValueError(f'Invalid CID version')
-        
-        hash = content_id[1:44]
-        if not re.match(r'[A-Za-z0-9-_]{43}', hash):
-            raise ValueError('Invalid content id hash')
-
-        period_index = content_id.find('.')
-
-        if period_index == -1:
-            size = int(content_id[44:])
-            ext = ''
-        else:
-            size = int(content_id[44:period_index])
-            ext = content_id[period_index + 1:]
-
-        return cls(hash=hash, size=size, ext=ext)
+        if cls is ContentId:
+            return _parse_cached(content_id)
+        return _parse(cls, content_id)
     
     @staticmethod
     def _hash_from_digest(digest:bytes) -> str:
         return base64.urlsafe_b64encode(digest).decode('utf-8')[0:-1]   # remove final padding (=)
     
+    @classmethod
+    def from_digest(cls:'ContentId', digest:bytes, size:int, ext:str) -> 'ContentId':
+        """build a content id from a sha3-256 digest computed elsewhere, such as while the file was uploaded"""
+        return cls(hash=cls._hash_from_digest(digest), size=size, ext=ext)
+
     @classmethod
     def from_string(cls:'ContentId', string:str, ext:str) -> 'ContentId':
         hash_obj = sha3_256(string.encode('utf-8'))
@@ -118,7 +125,7 @@ class ContentId:
 
     @classmethod
     def from_dict(cls:'ContentId', data:Dict) -> 'ContentId':
-        json_string = json.dumps(data, sort_keys=True)
+        json_string = _CANONICAL_JSON.encode(data)
         return cls.from_string(json_string, 'json')
 
     @classmethod
@@ -180,6 +187,22 @@ class ContentId:
         return cls(hash=hash, size=size, ext=ext)
 
 
+def _parse(cls:type[ContentId], content_id:str) -> ContentId:
+    match = _CID_PATTERN.fullmatch(content_id)
+    if match is None:
+        raise ValueError(f'Invalid content id: {content_id!r}')
+    
+    version, hash, size, ext = match.groups()
+    if int(version) != cls.cid_version:
+        raise ValueError(f'Invalid CID version')
+    
+    return cls(hash=hash, size=int(size), ext=ext or '')
+
+@lru_cache(maxsize=MSTACK_CID_PARSE_CACHE_SIZE)
+def _parse_cached(content_id:str) -> ContentId:
+    return _parse(ContentId, content_id)
+
+
 def id_schema(description):
     return WithJsonSchema({'type': 'string', 'description': description})
 
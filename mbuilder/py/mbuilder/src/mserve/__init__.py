@@ -3,16 +3,19 @@ import logging
 
 from os import environ
 from os.path import join
+from contextlib import asynccontextmanager
 
 from mserve.core import core_router
+from mserve.files import PayloadFiles
+from mcore.db import AsyncMongoDB
+from mcore.auth import user_cache, hash_pool
 from mcore.util import utc_now
 from mcore.models import MSERVE_LOCAL_STORAGE_DIRECTORY, init_storage_directories
-from mcore.errors import NotFoundError, MStackAuthenticationError, MStackUserError
+from mcore.errors import NotFoundError, MStackAuthenticationError, MStackUserError, MStackBusyError
 
 from fastapi import FastAPI, APIRouter, Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 
@@ -39,6 +42,8 @@ MSERVE_STATIC_FILES = env_to_bool('MSERVE_STATIC_FILES', '1')
 MSERVE_INCLUDE_MAIN = env_to_bool('MSERVE_INCLUDE_MAIN', '1')
 MSERVE_INCLUDE_CORE = env_to_bool('MSERVE_INCLUDE_CORE', '1')
 MSERVE_INCLUDE_MART = env_to_bool('MSERVE_INCLUDE_MART', '1')
+MSERVE_ENSURE_INDEXES = env_to_bool('MSERVE_ENSURE_INDEXES', '1')
+MSERVE_EXPOSE_METRICS = env_to_bool('MSERVE_EXPOSE_METRICS', '0')
 
 MSERVE_API_PREFIX = environ.get('MSERVE_API_PREFIX', '/api/v0')
 
@@ -57,11 +62,37 @@ class IndexResponse(BaseModel):
 async def index():
     return IndexResponse(mserve_version=MSERVE_VERSION, utc_time=utc_now())
 
+class UserCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_rate: float
+    signed_claims: bool
+
+
+# the metrics routes report on authenticated users, only serve them where the api isn't public #
+if MSERVE_EXPOSE_METRICS:
+
+    @main_router.get('/metrics/user-cache', response_model=UserCacheStats)
+    async def user_cache_stats():
+        return UserCacheStats(**user_cache.stats())
+
 #
 # app
 #
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MSERVE_ENSURE_INDEXES:
+        # models from apps that include this server are imported by now, so their indexes are created too
+        created = await AsyncMongoDB.from_cache().ensure_indexes()
+        logger.info(f'ensured indexes for collections: {", ".join(created.keys())}')
+    yield
+    hash_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -90,13 +121,15 @@ async def exception_wrapper(request: Request, call_next):
         return JSONResponse(status_code=400, content={'detail': str(e)})
     except NotFoundError as e:
         return JSONResponse(status_code=404, content={'detail': str(e)})
+    except MStackBusyError as e:
+        return JSONResponse(status_code=503, content={'detail': str(e)}, headers={'Retry-After': '1'})
     except Exception:
         logger.exception('Internal Server Error', exc_info=True)
         return JSONResponse(status_code=500, content={'detail': 'Internal Server Error'})
 
 if MSERVE_STATIC_FILES:
     init_storage_directories()
-    app.mount('/files', StaticFiles(directory=MSERVE_LOCAL_STORAGE_DIRECTORY), name='static')
+    app.mount('/files', PayloadFiles(directory=MSERVE_LOCAL_STORAGE_DIRECTORY), name='static')
 
 if MSERVE_INCLUDE_MAIN:
     app.include_router(main_router, prefix=MSERVE_API_PREFIX)
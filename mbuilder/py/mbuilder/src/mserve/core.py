@@ -1,19 +1,26 @@
-from typing import List, Annotated
+import os
+
+from typing import List, Type, Annotated, AsyncIterator
 from datetime import timedelta
 
 from mcore.auth import (
-    authenticate_user, 
+    authenticate_user_async, 
     create_access_token,
+    user_token_claims,
     MSTACK_AUTH_LOGIN_EXPIRATION_MINUTES
 )
 
 from mcore.models import (
+    BatchIds,
+    BatchReadResult,
     User,
     UserCreator,
     Profile,
     ProfileCreator,
     FileUploader,
     FileUploaderCreator,
+    FileUploaderRanges,
+    FILE_UPLOAD_CHECKSUM_HEADER,
     ImageFile,
     ImageRelease,
     ImageReleaseCreator,
@@ -26,16 +33,37 @@ from mcore.models import (
 )
 
 from mcore.types import ModelIdType
-from mserve.dependencies import current_user
-from mcore.ops import MCoreOps
+from mserve.dependencies import current_user, split_fields, RawDocumentsResponse
+from mserve.files import payload_response
+from mcore.ops import AsyncMCoreOps
 
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, Request, Response, UploadFile
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
 
+__all__ = [
+    'core_router',
+    'RawDocumentsResponse',
+    'raw_list',
+    'split_fields',
+    'MSERVE_RAW_LIST_RESPONSES'
+]
+
+
+# list routes serve stored documents straight from MongoDB.find_raw instead of validating a model per row
+# and then revalidating it against the response model, only enable this for collections the api writes #
+MSERVE_RAW_LIST_RESPONSES = os.environ.get('MSERVE_RAW_LIST_RESPONSES', '0').lower() in ('1', 't', 'true')
+
 core_router = APIRouter(tags=['Core'])
-ops = MCoreOps()
+ops = AsyncMCoreOps()
+
+#
+# raw list responses
+#
+
+async def raw_list(model_type:Type[BaseModel], filter:dict=None, offset:int=0, size:int=50, after:str=None) -> RawDocumentsResponse:
+    return RawDocumentsResponse([document async for document in ops.db.find_raw(model_type, filter, offset, size, after)])
 
 #
 # auth
@@ -47,10 +75,10 @@ class AccessToken(BaseModel):
 
 @core_router.post('/auth/login', response_model=AccessToken)
 async def auth_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user_async(form_data.username, form_data.password)
     
     token_expires = timedelta(minutes=MSTACK_AUTH_LOGIN_EXPIRATION_MINUTES)
-    access_token = create_access_token(data={'sub': str(user.id)}, expires_delta=token_expires)
+    access_token = create_access_token(data=user_token_claims(user), expires_delta=token_expires)
 
     return AccessToken(access_token=access_token, token_type='bearer')
 
@@ -64,22 +92,33 @@ async def read_users_me(user:User = Depends(current_user)):
 
 @core_router.post('/users', response_model=User, response_model_by_alias=False)
 async def create_user(user_creator:UserCreator):
-    return ops.user_create(user_creator)
+    return await ops.user_create(user_creator)
 
 
 @core_router.get('/users', response_model=List[User], response_model_by_alias=False)
-async def list_users(offset:int=0, size:int=50):
-    return ops.user_list(offset, size)
+async def list_users(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.user_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(User, offset=offset, size=size, after=after)
+    return await ops.user_list(offset, size, after)
 
 
 @core_router.get('/users/{id_type}/{id}', response_model=User, response_model_by_alias=False)
-async def read_user(id_type:ModelIdType, id:str):
-    return ops.user_read(**{id_type.value: id})
+async def read_user(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.user_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.user_read(**{id_type.value: id})
+
+
+@core_router.post('/users/batch/read', response_model=BatchReadResult[User], response_model_by_alias=False)
+async def read_user_batch(batch:BatchIds):
+    return await ops.user_read_many(batch.ids, batch.cids)
 
 
 @core_router.delete('/users/me', status_code=201)
 async def delete_user(user:User = Depends(current_user)):
-    return ops.user_delete(user)
+    return await ops.user_delete(user)
 
 #
 # profiles
@@ -87,26 +126,51 @@ async def delete_user(user:User = Depends(current_user)):
     
 @core_router.post('/profiles', response_model=Profile, response_model_by_alias=False)
 async def create_profile(creator:ProfileCreator, user:User = Depends(current_user)):
-    return ops.profile_create(creator, user)
+    return await ops.profile_create(creator, user)
+
+
+@core_router.post('/profiles/batch', response_model=List[Profile], response_model_by_alias=False)
+async def create_profile_batch(creators:List[ProfileCreator], user:User = Depends(current_user)):
+    return await ops.profile_create_many(creators, user)
 
 
 @core_router.get('/profiles/me', response_model=List[Profile], response_model_by_alias=False)
-async def list_profiles(offset:int=0, size:int=50, user:User = Depends(current_user)):
-    return list(ops.db.find(Profile, filter={'user_cid': user.cid}, offset=offset, size=size))
+async def list_profiles(offset:int=0, size:int=50, after:str=None, fields:str=None, user:User = Depends(current_user)):
+    if fields:
+        profiles = ops.db.find(Profile, filter={'user_cid': str(user.cid)}, offset=offset, size=size, after=after, fields=split_fields(fields))
+        return RawDocumentsResponse([profile async for profile in profiles])
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(Profile, filter={'user_cid': str(user.cid)}, offset=offset, size=size, after=after)
+    return [profile async for profile in ops.db.find(Profile, filter={'user_cid': str(user.cid)}, offset=offset, size=size, after=after)]
 
 
 @core_router.get('/profiles', response_model=List[Profile], response_model_by_alias=False)
-async def list_profiles(offset:int=0, size:int=50):
-    return ops.profile_list(offset, size)
+async def list_profiles(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.profile_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(Profile, offset=offset, size=size, after=after)
+    return await ops.profile_list(offset, size, after)
 
 
 @core_router.get('/profiles/{id_type}/{id}', response_model=Profile, response_model_by_alias=False)
-async def read_profile(id_type:ModelIdType, id:str):
-    return ops.profile_read(**{id_type.value: id})
+async def read_profile(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.profile_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.profile_read(**{id_type.value: id})
+
+
+@core_router.post('/profiles/batch/read', response_model=BatchReadResult[Profile], response_model_by_alias=False)
+async def read_profile_batch(batch:BatchIds):
+    return await ops.profile_read_many(batch.ids, batch.cids)
     
 @core_router.delete('/profiles/{id_type}/{id}', status_code=201)
 async def delete_profile(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    ops.profile_delete(user, **{id_type.value: id})
+    await ops.profile_delete(user, **{id_type.value: id})
+
+@core_router.post('/profiles/batch/delete', status_code=201)
+async def delete_profile_batch(batch:BatchIds, user:User = Depends(current_user)):
+    await ops.profile_delete_many(user, batch.ids, batch.cids)
 
 #
 # file uploads
@@ -114,22 +178,65 @@ async def delete_profile(id_type:ModelIdType, id:str, user:User = Depends(curren
 
 @core_router.post('/file-uploader', response_model=FileUploader, response_model_by_alias=False)
 async def create_file_uploader(creator: FileUploaderCreator, user:User = Depends(current_user)):
-    return ops.file_uploader_create(creator, user)
+    return await ops.file_uploader_create(creator, user)
 
 
 @core_router.get('/file-uploader', response_model=List[FileUploader], response_model_by_alias=False)
-async def list_file_uploaders(offset:int=0, size:int=50):
-    return ops.file_uploader_list(offset, size)
+async def list_file_uploaders(offset:int=0, size:int=50, after:str=None):
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(FileUploader, offset=offset, size=size, after=after)
+    return await ops.file_uploader_list(offset, size, after)
 
 
 @core_router.get('/file-uploader/{id}', response_model=FileUploader, response_model_by_alias=False)
 async def read_file_uploader(id:str):
-    return ops.file_uploader_read(id)
+    return await ops.file_uploader_read(id)
+
+
+async def _read_blocks(file:UploadFile, size:int=64 * 1024) -> AsyncIterator[bytes]:
+    while block := await file.read(size):
+        yield block
 
 
 @core_router.post('/file-uploader/{id}', response_model=FileUploader, response_model_by_alias=False, status_code=201)
 async def upload_file(id: str, chunk: UploadFile):
-    return ops.upload_chunk(ops.file_uploader_read(id), await chunk.read())
+    return await ops.upload_stream(await ops.file_uploader_read(id), _read_blocks(chunk))
+
+
+@core_router.put('/file-uploader/{id}', response_model=FileUploader, response_model_by_alias=False, status_code=201)
+async def upload_file_stream(id: str, request: Request):
+    """upload the raw request body, the whole file can be sent in one request since it is streamed to disk"""
+    return await ops.upload_stream(await ops.file_uploader_read(id), request.stream())
+
+
+@core_router.get('/file-uploader/{id}/ranges', response_model=FileUploaderRanges)
+async def read_file_uploader_ranges(id:str):
+    """the byte ranges and part checksums received so far, used to verify and resume an interrupted upload"""
+    return FileUploaderRanges.from_uploader(await ops.file_uploader_read(id))
+
+
+@core_router.put('/file-uploader/{id}/parts/{part_number}', response_model=FileUploader, response_model_by_alias=False, status_code=201)
+async def upload_file_part(id: str, part_number: int, request: Request):
+    """
+    upload one numbered part of an uploader created with a part_size, parts can be sent concurrently,
+    if the X-Checksum-Sha3-256 header is set the part is rejected unless its digest matches
+    """
+    checksum = request.headers.get(FILE_UPLOAD_CHECKSUM_HEADER)
+    return await ops.upload_part(await ops.file_uploader_read(id), part_number, request.stream(), checksum)
+
+
+@core_router.delete('/file-uploader/{id}/parts/{part_number}', response_model=FileUploader, response_model_by_alias=False)
+async def reset_file_part(id: str, part_number: int):
+    """forget a received part so it can be uploaded again"""
+    return await ops.upload_part_reset(await ops.file_uploader_read(id), part_number)
+
+# payloads #
+
+@core_router.api_route('/payloads/{payload_cid}', methods=['GET', 'HEAD'], response_class=Response)
+def download_payload(payload_cid: str, request: Request):
+    """download a stored payload by its cid, supports Range and If-None-Match"""
+    # a plain def so locating the payload in the sharded and flat paths runs in the threadpool, not on the event loop #
+    return payload_response(request, payload_cid)
 
 #
 # images
@@ -139,34 +246,54 @@ async def upload_file(id: str, chunk: UploadFile):
 
 @core_router.post('/image-release', response_model=ImageRelease, response_model_by_alias=False)
 async def create_image_release(image_release_creator:ImageReleaseCreator, user:User = Depends(current_user)):
-    return ops.image_release_create(image_release_creator, user)
+    return await ops.image_release_create(image_release_creator, user)
 
 @core_router.get('/image-release', response_model=List[ImageRelease], response_model_by_alias=False)
-async def list_image_releases(offset:int=0, size:int=50):
-    return ops.image_release_list(offset, size)
+async def list_image_releases(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.image_release_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(ImageRelease, offset=offset, size=size, after=after)
+    return await ops.image_release_list(offset, size, after)
 
 @core_router.get('/image-release/{id_type}/{id}', response_model=ImageRelease, response_model_by_alias=False)
-async def read_image_release(id_type:ModelIdType, id:str):
-    return ops.image_release_read(**{id_type.value: id})
+async def read_image_release(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.image_release_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.image_release_read(**{id_type.value: id})
+
+@core_router.post('/image-release/batch/read', response_model=BatchReadResult[ImageRelease], response_model_by_alias=False)
+async def read_image_release_batch(batch:BatchIds):
+    return await ops.image_release_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/image-release/{id_type}/{id}', status_code=201)
 async def delete_image_release(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.image_release_delete(user, **{id_type.value: id})
+    return await ops.image_release_delete(user, **{id_type.value: id})
 
 # image files #
 
 @core_router.get('/image-files', response_model=List[ImageFile], response_model_by_alias=False)
-async def list_image_files(offset:int=0, size:int=50):
-    return ops.image_file_list(offset, size)
+async def list_image_files(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.image_file_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(ImageFile, offset=offset, size=size, after=after)
+    return await ops.image_file_list(offset, size, after)
 
 
 @core_router.get('/image-files/{id_type}/{id}', response_model=ImageFile, response_model_by_alias=False)
-async def read_image_file(id_type:ModelIdType, id:str):
-    return ops.image_file_read(**{id_type.value: id})
+async def read_image_file(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.image_file_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.image_file_read(**{id_type.value: id})
+
+@core_router.post('/image-files/batch/read', response_model=BatchReadResult[ImageFile], response_model_by_alias=False)
+async def read_image_file_batch(batch:BatchIds):
+    return await ops.image_file_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/image-files/{id_type}/{id}', status_code=201)
-async def delete_image_file(id_type:ModelIdType, id:str):
-    return ops.image_file_delete(**{id_type.value: id})
+async def delete_image_file(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
+    return await ops.image_file_delete(user, **{id_type.value: id})
 
 #
 # audio
@@ -176,33 +303,53 @@ async def delete_image_file(id_type:ModelIdType, id:str):
 
 @core_router.post('/audio-release', response_model=AudioRelease, response_model_by_alias=False)
 async def create_audio_release(creator:AudioReleaseCreator, user:User = Depends(current_user)):
-    return ops.audio_release_create(creator, user)
+    return await ops.audio_release_create(creator, user)
 
 @core_router.get('/audio-release', response_model=List[AudioRelease], response_model_by_alias=False)
-async def list_audio_releases(offset:int=0, size:int=50):
-    return ops.audio_release_list(offset, size)
+async def list_audio_releases(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.audio_release_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(AudioRelease, offset=offset, size=size, after=after)
+    return await ops.audio_release_list(offset, size, after)
 
 @core_router.get('/audio-release/{id_type}/{id}', response_model=AudioRelease, response_model_by_alias=False)
-async def read_audio_release(id_type:ModelIdType, id:str):
-    return ops.audio_release_read(**{id_type.value: id})
+async def read_audio_release(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.audio_release_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.audio_release_read(**{id_type.value: id})
+
+@core_router.post('/audio-release/batch/read', response_model=BatchReadResult[AudioRelease], response_model_by_alias=False)
+async def read_audio_release_batch(batch:BatchIds):
+    return await ops.audio_release_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/audio-release/{id_type}/{id}', status_code=201)
 async def delete_audio_release(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.audio_release_delete(user, **{id_type.value: id})
+    return await ops.audio_release_delete(user, **{id_type.value: id})
 
 # audio files #
 
 @core_router.get('/audio-files', response_model=List[AudioFile], response_model_by_alias=False)
-async def list_audio_files(offset:int=0, size:int=50):
-    return ops.audio_file_list(offset, size)
+async def list_audio_files(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.audio_file_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(AudioFile, offset=offset, size=size, after=after)
+    return await ops.audio_file_list(offset, size, after)
 
 @core_router.get('/audio-files/{id_type}/{id}', response_model=AudioFile, response_model_by_alias=False)
-async def read_audio_file(id_type:ModelIdType, id:str):
-    return ops.audio_file_read(**{id_type.value: id})
+async def read_audio_file(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.audio_file_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.audio_file_read(**{id_type.value: id})
+
+@core_router.post('/audio-files/batch/read', response_model=BatchReadResult[AudioFile], response_model_by_alias=False)
+async def read_audio_file_batch(batch:BatchIds):
+    return await ops.audio_file_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/audio-files/{id_type}/{id}', status_code=201)
 async def delete_audio_file(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.audio_file_delete(user, **{id_type.value: id})
+    return await ops.audio_file_delete(user, **{id_type.value: id})
 
 #
 # video
@@ -212,30 +359,50 @@ async def delete_audio_file(id_type:ModelIdType, id:str, user:User = Depends(cur
 
 @core_router.post('/video-release', response_model=VideoRelease, response_model_by_alias=False)
 async def create_video_release(creator:VideoReleaseCreator, user:User = Depends(current_user)):
-    return ops.video_release_create(creator, user)
+    return await ops.video_release_create(creator, user)
 
 @core_router.get('/video-release', response_model=List[VideoRelease], response_model_by_alias=False)
-async def list_video_releases(offset:int=0, size:int=50):
-    return ops.video_release_list(offset, size)
+async def list_video_releases(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.video_release_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(VideoRelease, offset=offset, size=size, after=after)
+    return await ops.video_release_list(offset, size, after)
 
 @core_router.get('/video-release/{id_type}/{id}', response_model=VideoRelease, response_model_by_alias=False)
-async def read_video_release(id_type:ModelIdType, id:str):
-    return ops.video_release_read(**{id_type.value: id})
+async def read_video_release(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.video_release_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.video_release_read(**{id_type.value: id})
+
+@core_router.post('/video-release/batch/read', response_model=BatchReadResult[VideoRelease], response_model_by_alias=False)
+async def read_video_release_batch(batch:BatchIds):
+    return await ops.video_release_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/video-release/{id_type}/{id}', status_code=201)
 async def delete_video_release(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.video_release_delete(user, **{id_type.value: id})
+    return await ops.video_release_delete(user, **{id_type.value: id})
 
 # video files #
 
 @core_router.get('/video-files', response_model=List[VideoFile], response_model_by_alias=False)
-async def list_video_files(offset:int=0, size:int=50):
-    return ops.video_file_list(offset, size)
+async def list_video_files(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.video_file_list(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(VideoFile, offset=offset, size=size, after=after)
+    return await ops.video_file_list(offset, size, after)
 
 @core_router.get('/video-files/{id_type}/{id}', response_model=VideoFile, response_model_by_alias=False)
-async def read_video_file(id_type:ModelIdType, id:str):
-    return ops.video_file_read(**{id_type.value: id})
+async def read_video_file(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.video_file_read(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.video_file_read(**{id_type.value: id})
+
+@core_router.post('/video-files/batch/read', response_model=BatchReadResult[VideoFile], response_model_by_alias=False)
+async def read_video_file_batch(batch:BatchIds):
+    return await ops.video_file_read_many(batch.ids, batch.cids)
 
 @core_router.delete('/video-files/{id_type}/{id}', status_code=201)
 async def delete_video_file(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.video_file_delete(user, **{id_type.value: id})
\ No newline at end of file
+    return await ops.video_file_delete(user, **{id_type.value: id})
\ No newline at end of file
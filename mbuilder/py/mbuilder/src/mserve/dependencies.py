@@ -1,19 +1,21 @@
-from typing import List, Annotated
+from typing import Any, List, Annotated
 from datetime import timedelta
 
-from mcore.auth import MSTACK_AUTH_SECRET_KEY, MSTACK_AUTH_ALGORITHM
+from mcore.auth import MSTACK_AUTH_SECRET_KEY, MSTACK_AUTH_ALGORITHM, MSTACK_AUTH_SIGNED_CLAIMS, user_cache
 from mcore.models import User, ContentModel, ModelCreator
-from mcore.db import MongoDB
+from mcore.db import AsyncMongoDB
 from mcore.errors import NotFoundError
 from mcore.types import ModelIdType
 
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from pydantic_core import to_json
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/v0/core/auth/login')
 
-async def current_user(token: Annotated[str, Depends(oauth2_scheme)], db:MongoDB = Depends(MongoDB.from_cache)):
+async def current_user(token: Annotated[str, Depends(oauth2_scheme)], db:AsyncMongoDB = Depends(AsyncMongoDB.from_cache)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate credentials',
@@ -29,14 +31,42 @@ async def current_user(token: Annotated[str, Depends(oauth2_scheme)], db:MongoDB
     except JWTError:
         raise credentials_exception
     
-    user = db.read(User, id=user_id)
+    # signed claims, then cached user, then database #
 
-    if user is None:
+    if user_cache.is_revoked(user_id):
         raise credentials_exception
     
+    claims = payload.get('user')
+    if MSTACK_AUTH_SIGNED_CLAIMS and claims is not None:
+        return User(**claims)
+    
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    try:
+        user = await db.read(User, id=user_id)
+    except NotFoundError:
+        raise credentials_exception
+    
+    user_cache.set(user)
     return user
 
 
+class RawDocumentsResponse(JSONResponse):
+    """
+    json for documents from find_raw or the partial models of a fields= request, written without revalidating
+    against the route's response model, bson values such as ObjectId that json has no type for are written as strings
+    """
+
+    def render(self, content:Any) -> bytes:
+        return to_json(content, by_alias=False, fallback=str)
+
+def split_fields(fields:str) -> list[str]:
+    """the fields= query parameter of read and list routes, a comma separated list of field names"""
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
 def add_crud_routes(router:APIRouter, model_type:ContentModel, model_creator:ModelCreator):
     try:
         prefix:str = model_type.ENDPOINT
@@ -50,23 +80,27 @@ def add_crud_routes(router:APIRouter, model_type:ContentModel, model_creator:Mod
         raise ValueError('prefix must not end with /')
 
     @router.post(prefix, response_model=model_type, response_model_by_alias=False)
-    def _create(body:model_creator, db:MongoDB = Depends(MongoDB.from_cache), user:User = Depends(current_user)):
+    async def _create(body:model_creator, db:AsyncMongoDB = Depends(AsyncMongoDB.from_cache), user:User = Depends(current_user)):
         model = body.create_model(user_cid=user.cid)
-        db.create(model)
+        await db.create(model)
         return model
 
     @router.get(prefix, response_model=List[model_type], response_model_by_alias=False)
-    def _list(offset:int=0, size:int=50, db:MongoDB = Depends(MongoDB.from_cache)):
-        return list(db.find(model_type, offset=offset, size=size))
+    async def _list(offset:int=0, size:int=50, after:str=None, fields:str=None, db:AsyncMongoDB = Depends(AsyncMongoDB.from_cache)):
+        if fields is not None:
+            return RawDocumentsResponse([model async for model in db.find(model_type, offset=offset, size=size, after=after, fields=split_fields(fields))])
+        return [model async for model in db.find(model_type, offset=offset, size=size, after=after)]
 
 
     @router.get(prefix + '/{id_type}/{id}', response_model=model_type, response_model_by_alias=False)
-    def _read(id_type:ModelIdType, id:str, db:MongoDB = Depends(MongoDB.from_cache)):
+    async def _read(id_type:ModelIdType, id:str, fields:str=None, db:AsyncMongoDB = Depends(AsyncMongoDB.from_cache)):
         try:
-            return db.read(model_type, **{id_type.value: id})
+            if fields is not None:
+                return RawDocumentsResponse(await db.read(model_type, **{id_type.value: id}, fields=split_fields(fields)))
+            return await db.read(model_type, **{id_type.value: id})
         except NotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e))
 
     @router.delete(prefix + '/{id_type}/{id}', status_code=201)
-    def _delete(id_type:ModelIdType, id:str, db:MongoDB = Depends(MongoDB.from_cache)):
-        db.delete(model_type, **{id_type.value: id})
+    async def _delete(id_type:ModelIdType, id:str, db:AsyncMongoDB = Depends(AsyncMongoDB.from_cache)):
+        await db.delete(model_type, **{id_type.value: id})
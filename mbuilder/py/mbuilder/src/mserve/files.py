@@ -0,0 +1,85 @@
+import os
+
+from mimetypes import guess_type
+
+from mcore.errors import NotFoundError, MStackUserError
+from mcore.models import storage_relative_path, locate_payload, MSERVE_LOCAL_STORAGE_DIRECTORY
+from mcore.types import ContentId
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+
+__all__ = [
+    'PayloadFiles',
+    'payload_response',
+    'MSERVE_FILES_ACCEL_REDIRECT'
+]
+
+
+# when the server is behind nginx, set this to an internal location that aliases MSERVE_LOCAL_STORAGE_DIRECTORY
+# and payload downloads are handed to nginx with X-Accel-Redirect so it can sendfile any range of the payload
+MSERVE_FILES_ACCEL_REDIRECT = os.environ.get('MSERVE_FILES_ACCEL_REDIRECT', '')
+
+# payloads are addressed by their content id so a stored payload never changes
+PAYLOAD_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _payload_etag(payload_cid:ContentId | str) -> str:
+    return f'"{payload_cid}"'
+
+def _payload_headers(payload_cid:ContentId | str) -> dict[str, str]:
+    return {'ETag': _payload_etag(payload_cid), 'Cache-Control': PAYLOAD_CACHE_CONTROL}
+
+def _etag_matches(if_none_match:str, etag:str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag in tags
+
+def payload_response(request:Request, payload_cid:str) -> Response:
+    """
+    a response for a stored payload, the etag is the payload cid and the body is sent with FileResponse
+    which answers Range requests and uses the server's zero-copy pathsend extension when it has one
+    """
+    try:
+        cid = ContentId.parse(payload_cid)
+    except ValueError:
+        raise MStackUserError(f'Invalid payload cid: {payload_cid}')
+    if os.sep in cid.ext:
+        raise MStackUserError(f'Invalid payload cid: {payload_cid}')
+
+    headers = _payload_headers(cid)
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None and _etag_matches(if_none_match, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    path = locate_payload(cid)
+    try:
+        stat_result = path.stat()
+    except FileNotFoundError:
+        raise NotFoundError(f'Payload not found: {payload_cid}')
+
+    if MSERVE_FILES_ACCEL_REDIRECT:
+        relative_path = path.relative_to(MSERVE_LOCAL_STORAGE_DIRECTORY)
+        headers['X-Accel-Redirect'] = f'{MSERVE_FILES_ACCEL_REDIRECT.rstrip("/")}/{relative_path.as_posix()}'
+        return Response(media_type=guess_type(path.name)[0] or 'application/octet-stream', headers=headers)
+
+    return FileResponse(path, headers=headers, stat_result=stat_result)
+
+
+class PayloadFiles(StaticFiles):
+    """
+    serves /files/<payload cid> from the payload's path in the sharded storage layout,
+    while a store is being migrated the flat path is checked if it isn't there yet
+    """
+
+    def lookup_path(self, path:str) -> tuple[str, os.stat_result | None]:
+        if os.sep in path:
+            return super().lookup_path(path)
+
+        full_path, stat_result = super().lookup_path(str(storage_relative_path(path)))
+        if stat_result is None:
+            return super().lookup_path(path)
+        return full_path, stat_result
@@ -2,11 +2,15 @@ import os
 import sys
 import logging
 import time
+import multiprocessing
 
+from typing import Generator
 from hashlib import md5
+from datetime import timedelta
 from socket import gethostname
 from pathlib import Path
-from mimetypes import guess_type
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 
 from mcore.models import (
     FileUploader,
@@ -15,15 +19,35 @@ from mcore.models import (
     ImageFile,
     AudioFile,
     VideoFile,
-    MSERVE_LOCAL_STORAGE_DIRECTORY
+    MSERVE_LOCAL_STORAGE_DIRECTORY,
+    MSERVE_STORAGE_SHARD_LEVELS,
+    MSERVE_STORAGE_SHARD_WIDTH,
+    storage_path
 )
 from mcore.db import MongoDB
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError, OperationFailure
 from mcore.errors import MStackFilePayloadError, NotFoundError
 from mcore.util import DaemonController, utc_now
 
 
 
 MSERVE_INGEST_DAEMON_INTERVAL = float(os.environ.get('MSERVE_INGEST_DAEMON_INTERVAL', 2.5))
+MSERVE_INGEST_DAEMON_FALLBACK_INTERVAL = float(os.environ.get('MSERVE_INGEST_DAEMON_FALLBACK_INTERVAL', 60))
+MSERVE_INGEST_WORKERS = int(os.environ.get('MSERVE_INGEST_WORKERS', os.cpu_count() or 1))
+MSERVE_INGEST_TYPE_LIMITS = {
+    FileUploadTypes.image: int(os.environ.get('MSERVE_INGEST_IMAGE_LIMIT', MSERVE_INGEST_WORKERS)),
+    FileUploadTypes.audio: int(os.environ.get('MSERVE_INGEST_AUDIO_LIMIT', MSERVE_INGEST_WORKERS)),
+    FileUploadTypes.video: int(os.environ.get('MSERVE_INGEST_VIDEO_LIMIT', max(1, MSERVE_INGEST_WORKERS // 2))),
+}
+MSERVE_INGEST_CHANGE_STREAM = os.environ.get('MSERVE_INGEST_CHANGE_STREAM', 'true').lower() in ('1', 'true', 'yes')
+MSERVE_INGEST_LEASE_SECONDS = float(os.environ.get('MSERVE_INGEST_LEASE_SECONDS', 30))
+MSERVE_INGEST_MAX_ATTEMPTS = int(os.environ.get('MSERVE_INGEST_MAX_ATTEMPTS', 3))
+MSERVE_CLEAN_FILES_GRACE_SECONDS = int(os.environ.get('MSERVE_CLEAN_FILES_GRACE_SECONDS', 3600))
+MSERVE_CLEAN_FILES_BATCH_SIZE = int(os.environ.get('MSERVE_CLEAN_FILES_BATCH_SIZE', 10_000))
+MSERVE_CLEAN_FILES_WORKERS = int(os.environ.get('MSERVE_CLEAN_FILES_WORKERS', 16))
+MSERVE_CLEAN_UPLOADS_BATCH_SIZE = int(os.environ.get('MSERVE_CLEAN_UPLOADS_BATCH_SIZE', 1000))
 MSERVE_UPLOAD_CLEANUP_THRESHOLD = int(os.environ.get('MSERVE_UPLOAD_CLEANUP_THRESHOLD', 3600))
 MSERVE_UPLOAD_TIMEOUT_THRESHOLD = int(os.environ.get('MSERVE_UPLOAD_TIMEOUT_THRESHOLD', 3600))
 
@@ -40,6 +64,37 @@ logging.basicConfig(handlers=[stream_handler], level=logging.INFO)
 #
 
 
+def _lock_name() -> str:
+    return md5(f'{gethostname()}-{os.getpid()}'.encode()).hexdigest()
+
+
+def _claim_update() -> dict:
+    now = utc_now()
+    return {
+        '$set': {
+            'status': FileUploadStatus.processing.value, 
+            'lock': _lock_name(), 
+            'lease_expires': now + timedelta(seconds=MSERVE_INGEST_LEASE_SECONDS), 
+            'modifed': now
+        },
+        '$inc': {'attempts': 1}
+    }
+
+
+def _owned(uploader:FileUploader) -> dict:
+    """filter matching the uploader only while this process holds its claim"""
+    return {'_id': uploader.id, 'status': FileUploadStatus.processing.value, 'lock': _lock_name()}
+
+
+def _requeue_update() -> dict:
+    return {'$set': {'status': FileUploadStatus.process_queue.value, 'lock': None, 'lease_expires': None, 'modifed': utc_now()}}
+
+
+def _attempts_error_update() -> dict:
+    error = f'ingest did not finish after {MSERVE_INGEST_MAX_ATTEMPTS} attempts'
+    return {'$set': {'status': FileUploadStatus.error.value, 'error': error, 'lock': None, 'lease_expires': None, 'modifed': utc_now()}}
+
+
 def obtain_lock(uploader:FileUploader) -> FileUploader | None:
     """atttempt to obtain a lock on the file uploader for processing,
     returns the updated file uploader if successful, None if not"""
@@ -50,82 +105,386 @@ def obtain_lock(uploader:FileUploader) -> FileUploader | None:
 
     if uploader.id is None:
         raise ValueError(f'FileUploader must have an id to obtain a lock')
-    if uploader.lock is not None:
-        raise ValueError(f'FileUploader already has a lock')
     if uploader.status != FileUploadStatus.process_queue:
         raise ValueError(f'FileUploader status must be {status} to obtain a lock')
     
-    collection = db.get_collection(uploader)
+    # a single update filtered on the status, if another process claimed it first nothing matches #
+    try:
+        locked_uploader = db.find_one_and_update(FileUploader, {'_id': uploader.id, 'status': status}, _claim_update())
+    except NotFoundError:
+        logging.info(f'could not obtain lock for: {uploader.id}')
+        return None
     
-    # create lock name and set on database object
-    # this call uses collection.update_one instead of db.update method so that
-    # it can filter for the id & status instead of just the id bc there may be a race
-    # condition where another process has already changed the status
-    lock_name = md5(f'{gethostname()}-{os.getpid()}'.encode()).hexdigest()
-    result = collection.update_one({'_id': uploader.id, 'status': status}, {'$set': {'lock': lock_name}})
-    if result.modified_count != 1:
+    logging.info(f'lock obtained for: {uploader.id}')
+    return locked_uploader
+
+
+def claim_upload(types:list[FileUploadTypes]=None) -> FileUploader | None:
+    """lock the oldest queued uploader of one of types, returns None if there is nothing to claim"""
+    filter = {'status': FileUploadStatus.process_queue.value}
+    if types is not None:
+        filter['type'] = {'$in': [upload_type.value for upload_type in types]}
+
+    try:
+        return db.find_one_and_update(FileUploader, filter, _claim_update(), sort=[('modifed', ASCENDING)])
+    except NotFoundError:
         return None
 
-    # query for id & lock_name and attempt to update status,
-    # if result modifies 1 document we have obtained lock,
-    # if not there was a race condition and another process has the lock
-    # this call uses collection.update_one instead of db.update method so that
-    # it can filter for the id & lock_name to verify that it obtained the lock
-    updates = {'$set': {'status': FileUploadStatus.processing, 'modifed': utc_now()}}
-    result = collection.update_one({'_id': uploader.id, 'lock': lock_name, 'status': status}, updates)
-    if result.modified_count == 1:
-        logging.info(f'lock obtained for: {uploader.id}')
-        return db.read(uploader)
-    else:
-        logging.info(f'could not obtain lock for: {uploader.id}')
+
+def renew_leases(uploaders:list[FileUploader]) -> int:
+    """heartbeat for uploaders this process is ingesting, returns the number of leases still held"""
+    if len(uploaders) == 0:
+        return 0
+    
+    now = utc_now()
+    filter = {'_id': {'$in': [uploader.id for uploader in uploaders]}, 'status': FileUploadStatus.processing.value, 'lock': _lock_name()}
+    updates = {'$set': {'lease_expires': now + timedelta(seconds=MSERVE_INGEST_LEASE_SECONDS), 'modifed': now}}
+    return db.get_collection(FileUploader).update_many(filter, updates).matched_count
+
+
+def requeue_expired_leases() -> int:
+    """put uploads whose lock owner stopped renewing back in the queue, or fail them after MSERVE_INGEST_MAX_ATTEMPTS, returns the number requeued"""
+    collection = db.get_collection(FileUploader)
+    expired = {'status': FileUploadStatus.processing.value, 'lease_expires': {'$lt': utc_now()}}
+
+    failed = collection.update_many({**expired, 'attempts': {'$gte': MSERVE_INGEST_MAX_ATTEMPTS}}, _attempts_error_update())
+    requeued = collection.update_many({**expired, 'attempts': {'$lt': MSERVE_INGEST_MAX_ATTEMPTS}}, _requeue_update())
+
+    if failed.modified_count > 0 or requeued.modified_count > 0:
+        logging.warning(f'expired ingest leases - requeued: {requeued.modified_count} failed: {failed.modified_count}')
+    return requeued.modified_count
+
+
+def release_lease(uploader:FileUploader) -> None:
+    """give up a claim without an ingest result so the upload is retried, or failed if it is out of attempts"""
+    collection = db.get_collection(FileUploader)
+    owned = _owned(uploader)
+
+    result = collection.update_one({**owned, 'attempts': {'$lt': MSERVE_INGEST_MAX_ATTEMPTS}}, _requeue_update())
+    if result.modified_count == 0:
+        collection.update_one(owned, _attempts_error_update())
+
+
+INGEST_FILE_MODELS = {
+    FileUploadTypes.image: ImageFile,
+    FileUploadTypes.audio: AudioFile,
+    FileUploadTypes.video: VideoFile
+}
+
+
+def _file_model(uploader:FileUploader) -> type[ImageFile | AudioFile | VideoFile]:
+    try:
+        return INGEST_FILE_MODELS[uploader.type]
+    except KeyError:
+        raise ValueError(f'unknown file upload type: {uploader.type}')
+
+
+def known_probe(uploader:FileUploader) -> dict | None:
+    """
+    the probed fields of an existing file with the same payload as the upload, so a re-upload 
+    skips probing, None if the payload hash wasn't computed during upload or it is a new payload
+    """
+    payload_cid = uploader.payload_cid()
+    if payload_cid is None:
+        return None
+    
+    file_model = _file_model(uploader)
+    projection = {field: 1 for field in file_model.PROBE_FIELDS}
+    try:
+        entry = db.get_collection(file_model).find_one({'payload_cid': str(payload_cid)}, projection)
+    except PyMongoError as e:
+        logging.error(f'error looking up probe for: {uploader.id} - {e}')
+        return None
+    
+    if entry is None:
         return None
+    return {field: entry[field] for field in file_model.PROBE_FIELDS if field in entry}
+
+
+def ingest_payload(uploader:FileUploader, probe:dict=None) -> ImageFile | AudioFile | VideoFile:
+    """hash, probe and move the uploaded file into storage, does not touch the database so it can run in a worker process"""
+
+    # the hash computed while uploading saves reading the whole file again #
+    payload_cid = uploader.payload_cid()
+    file_model = _file_model(uploader)
+
+    # a worker that lost its lease may have already moved the upload into storage, ingest the stored copy #
+    if not uploader.local_path().exists():
+        if payload_cid is None:
+            raise MStackFilePayloadError(f'Upload {uploader.id} was moved out of the upload directory and its payload hash is unknown')
+        if not storage_path(payload_cid).exists():
+            raise MStackFilePayloadError(f'Upload {uploader.id} is missing from the upload directory and storage')
+        return file_model.ingest(storage_path(payload_cid), uploader.user_cid, leave_original=True, payload_cid=payload_cid, probe=probe)
+
+    return file_model.ingest(uploader.local_path(), uploader.user_cid, payload_cid=payload_cid, probe=probe)
+
+
+def finish_ingest(uploader:FileUploader, obj:ImageFile | AudioFile | VideoFile) -> bool:
+    """
+    complete the upload and create its file entry if this process still holds the claim, 
+    returns False and drops the result if the lease expired and the upload was claimed again
+    """
+    complete = {'$set': {
+        'status': FileUploadStatus.complete.value, 
+        'result_cid': str(obj.cid), 
+        'lock': None, 
+        'lease_expires': None, 
+        'modifed': utc_now()
+    }}
+    try:
+        db.find_one_and_update(FileUploader, _owned(uploader), complete)
+    except NotFoundError:
+        logging.warning(f'lost claim on file uploader: {uploader.id}, dropping ingest result: {obj.cid}')
+        return False
+
+    try:
+        db.create(obj)
+    except Exception:
+        # hand the claim back so the caller can fail the upload #
+        db.get_collection(FileUploader).update_one(
+            {'_id': uploader.id, 'status': FileUploadStatus.complete.value, 'result_cid': str(obj.cid)},
+            {'$set': {'status': FileUploadStatus.processing.value, 'result_cid': None, 'lock': _lock_name()}}
+        )
+        raise
+
+    return True
+
+
+def fail_ingest(uploader:FileUploader, e:Exception) -> bool:
+    """fail the upload if this process still holds the claim, returns False if the claim was lost"""
+    failed = {'$set': {
+        'status': FileUploadStatus.error.value, 
+        'error': str(e) if isinstance(e, MStackFilePayloadError) else 'Error during ingest process', 
+        'lock': None, 
+        'lease_expires': None, 
+        'modifed': utc_now()
+    }}
+    try:
+        db.find_one_and_update(FileUploader, _owned(uploader), failed)
+    except NotFoundError:
+        logging.warning(f'lost claim on file uploader: {uploader.id}, dropping ingest error: {e}')
+        return False
+
+    logging.error(f'error ingest file uploader: {uploader.id} - {e}', exc_info=e)
+    return True
 
 
 def ingest_uploaded_file(uploader:FileUploader):
     logging.info(f'ingesting: {uploader.id}')
+    obj = ingest_payload(uploader, known_probe(uploader))
+    if finish_ingest(uploader, obj):
+        logging.info(f'ingest complete, created: {obj}')
 
-    if uploader.type == FileUploadTypes.image:
-        obj = ImageFile.ingest(uploader.local_path(), uploader.user_cid)
-    elif uploader.type == FileUploadTypes.audio:
-        obj = AudioFile.ingest(uploader.local_path(), uploader.user_cid)
-    elif uploader.type == FileUploadTypes.video:
-        obj = VideoFile.ingest(uploader.local_path(), uploader.user_cid)
-    else:
-        raise ValueError(f'unknown file upload type: {uploader.type}')
+
+def _ingest_job(uploader:FileUploader, probe:dict=None) -> tuple[ImageFile | AudioFile | VideoFile, float]:
+    """runs in a worker process, returns (file, seconds spent ingesting)"""
+    start = time.perf_counter()
+    obj = ingest_payload(uploader, probe)
+    return obj, time.perf_counter() - start
+
+
+class IngestPool:
+    """
+    ingests uploads in a pool of worker processes, the daemon claims jobs with claim_upload and only 
+    the hashing and probing runs in the workers, database writes stay in the daemon process,
+    each upload type is limited to its MSERVE_INGEST_TYPE_LIMITS slots so long video jobs can't 
+    take every worker from images
+    """
+
+    def __init__(self, workers:int=MSERVE_INGEST_WORKERS, type_limits:dict[FileUploadTypes, int]=None) -> None:
+        self.workers = max(1, workers)
+        self.type_limits = MSERVE_INGEST_TYPE_LIMITS if type_limits is None else type_limits
+        self.jobs:dict[Future, tuple[FileUploader, float]] = {}
+        self.executor = self._executor()
+        self.last_heartbeat = time.monotonic()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # spawn so workers don't inherit the daemon's mongo client #
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+    
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'IngestPool':
+        return self
+    
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    @property
+    def busy(self) -> bool:
+        return len(self.jobs) > 0
+
+    def _open_types(self) -> list[FileUploadTypes]:
+        """upload types with a free slot"""
+        running = {upload_type: 0 for upload_type in FileUploadTypes}
+        for uploader, _ in self.jobs.values():
+            running[uploader.type] += 1
+        return [upload_type for upload_type in FileUploadTypes if running[upload_type] < self.type_limits.get(upload_type, self.workers)]
     
-    db.create(obj)
+    def heartbeat(self) -> None:
+        """renew the leases of running jobs every third of MSERVE_INGEST_LEASE_SECONDS"""
+        if time.monotonic() - self.last_heartbeat < MSERVE_INGEST_LEASE_SECONDS / 3:
+            return
+        
+        self.last_heartbeat = time.monotonic()
+        uploaders = [uploader for uploader, _ in self.jobs.values()]
+        held = renew_leases(uploaders)
+        if held < len(uploaders):
+            logging.warning(f'lost {len(uploaders) - held} of {len(uploaders)} ingest leases')
+
+    def fill(self) -> int:
+        """claim queued uploads for the free slots, returns the number of jobs started"""
+        started = 0
+        while len(self.jobs) < self.workers:
+            open_types = self._open_types()
+            if len(open_types) == 0:
+                break
+
+            locked_uploader = claim_upload(open_types)
+            if locked_uploader is None:
+                break
+
+            job = self.executor.submit(_ingest_job, locked_uploader, known_probe(locked_uploader))
+            self.jobs[job] = (locked_uploader, time.perf_counter())
+            started += 1
+
+        return started
+    
+    def collect(self, timeout:float=None) -> int:
+        """wait up to timeout seconds for jobs to finish and record their results, returns the number finished"""
+        if not self.busy:
+            return 0
+        
+        done, _ = wait(self.jobs, timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            uploader, submitted = self.jobs.pop(future)
+            try:
+                obj, elapsed = future.result()
+                if not finish_ingest(uploader, obj):
+                    continue
+                logging.info(f'ingest complete: {uploader.id} {uploader.type.value} {uploader.total_size} bytes - ingest: {elapsed:.2f}s total: {time.perf_counter() - submitted:.2f}s')
+            except BrokenProcessPool as e:
+                broken = True
+                release_lease(uploader)
+                logging.error(f'worker died ingesting file uploader: {uploader.id} - {e}')
+            except Exception as e:
+                fail_ingest(uploader, e)
+
+        if broken:
+            # a worker died, every job left in the pool went with it, they are retried until out of attempts #
+            for uploader, _ in self.jobs.values():
+                release_lease(uploader)
+            self.jobs.clear()
+            self.executor.shutdown(wait=False)
+            self.executor = self._executor()
+
+        return len(done)
+
+
+# wake up on queued uploads #
+
+_process_queue_pipeline = [
+    {'$match': {'$or': [
+        {'operationType': 'insert', 'fullDocument.status': FileUploadStatus.process_queue.value},
+        {'operationType': 'update', 'updateDescription.updatedFields.status': FileUploadStatus.process_queue.value}
+    ]}}
+]
+
+# server error code when change streams are used on a standalone server #
+_CHANGE_STREAM_NOT_SUPPORTED = 40573
+
+
+class ProcessQueueWatcher:
+    """
+    blocks until a file uploader enters the process queue using a change stream on the file uploads collection,
+    change streams need a replica set so on a standalone server, or if MSERVE_INGEST_CHANGE_STREAM is off, 
+    it falls back to sleeping for MSERVE_INGEST_DAEMON_INTERVAL, events missed while the stream is 
+    reconnecting are picked up because the daemon drains the queue every time it wakes
+    """
 
-    uploader.status = FileUploadStatus.complete
-    uploader.result_cid = obj.cid
-    db.update(uploader)
+    def __init__(self, controller:DaemonController, enabled:bool=MSERVE_INGEST_CHANGE_STREAM) -> None:
+        self.controller = controller
+        self.enabled = enabled
+        self.stream = None
 
-    logging.info(f'ingest complete, created: {obj}')
+    def open(self) -> bool:
+        """start watching, returns True if a change stream is open"""
+        if not self.enabled or self.stream is not None:
+            return self.stream is not None
+        
+        try:
+            self.stream = db.get_collection(FileUploader).watch(_process_queue_pipeline, max_await_time_ms=500)
+            logging.info('watching file uploads change stream')
+        except OperationFailure as e:
+            if e.code == _CHANGE_STREAM_NOT_SUPPORTED:
+                logging.info('change streams not supported by server, polling for uploads')
+                self.enabled = False
+            else:
+                logging.error(f'error opening file uploads change stream: {e}', exc_info=True)
+        except PyMongoError as e:
+            logging.error(f'error opening file uploads change stream: {e}', exc_info=True)
+
+        return self.stream is not None
+
+    def close(self) -> None:
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except PyMongoError:
+                pass
+            self.stream = None
+
+    def wait(self) -> None:
+        """return when an upload is queued, after the fallback interval, or when the daemon is stopping"""
+        if not self.open():
+            self.controller.sleep(MSERVE_INGEST_DAEMON_INTERVAL)
+            return
+        
+        # wake at least once per lease so expired leases of other daemons are requeued #
+        end_time = time.time() + min(MSERVE_INGEST_DAEMON_FALLBACK_INTERVAL, MSERVE_INGEST_LEASE_SECONDS)
+        while self.controller.run_daemon and time.time() < end_time:
+            try:
+                if self.stream.try_next() is not None:
+                    return
+            except PyMongoError as e:
+                logging.error(f'error reading file uploads change stream: {e}', exc_info=True)
+                self.close()
+                return
 
 
 def ingest_daemon():
 
-    logging.info('begin ingest daemon')
+    logging.info(f'begin ingest daemon - workers: {MSERVE_INGEST_WORKERS} limits: { {t.value: n for t, n in MSERVE_INGEST_TYPE_LIMITS.items()} }')
     
     controller = DaemonController()
+    watcher = ProcessQueueWatcher(controller)
 
-    while controller.run_daemon:
-        try:
-            for uploader in db.find(FileUploader, filter={'status': FileUploadStatus.process_queue}, size=3):
-                locked_uploader = obtain_lock(uploader)
-                if locked_uploader is not None:
-                    try:
-                        ingest_uploaded_file(locked_uploader)
-                    except Exception as e:
-                        msg = str(e) if isinstance(e, MStackFilePayloadError) else 'Error during ingest process'
-                        locked_uploader.error = msg
-                        locked_uploader.status = FileUploadStatus.error
-                        db.update(locked_uploader)
-                        logging.error(f'error ingest file uploader: {locked_uploader.id} - {e}', exc_info=True)
+    # open the stream before the first drain so uploads queued in between still wake the daemon #
+    watcher.open()
 
-        except Exception as e:
-            logging.error(f'error in ingest daemon: {e}', exc_info=True)
+    with IngestPool() as pool:
+        while controller.run_daemon:
+            try:
+                requeue_expired_leases()
+                pool.heartbeat()
+                pool.fill()
+                if pool.busy:
+                    # new uploads are picked up by the next fill after a job finishes or the interval passes #
+                    pool.collect(timeout=MSERVE_INGEST_DAEMON_INTERVAL)
+                    continue
+            except Exception as e:
+                logging.error(f'error in ingest daemon: {e}', exc_info=True)
 
-        controller.sleep(MSERVE_INGEST_DAEMON_INTERVAL)
+            watcher.wait()
+
+        # finish the jobs that are already claimed before exiting #
+        while pool.busy:
+            pool.heartbeat()
+            pool.collect(timeout=MSERVE_INGEST_DAEMON_INTERVAL)
+
+    watcher.close()
         
     logging.info('exiting ingest daemon')
 
@@ -134,24 +493,71 @@ def ingest_daemon():
 # clean up
 #
 
-def cleanup_upload(uploader:FileUploader):
-    try:
-        uploader.local_path().unlink()
-    except FileNotFoundError:
-        pass
-    db.delete(uploader)
+def _upload_paths(entries:list[dict]) -> list[Path]:
+    """local paths of uploaders read with the _id and ext projection"""
+    return [FileUploader.model_construct(id=entry['_id'], ext=entry['ext']).local_path() for entry in entries]
 
 
-def timeout_upload(uploader:FileUploader):
-    try:
-        uploader.local_path().unlink()
-    except FileNotFoundError:
-        pass
+def _batches(filter:dict, batch_size:int) -> Generator[list[dict], None, None]:
+    """_id and ext of matching uploaders in lists of batch_size, the ids are collected before any are changed"""
+    cursor = db.get_collection(FileUploader).find(filter, {'_id': 1, 'ext': 1}, batch_size=batch_size)
+    entries = list(cursor)
+    for n in range(0, len(entries), batch_size):
+        yield entries[n:n + batch_size]
+
+
+def _stale_filter(statuses:list[FileUploadStatus], threshold:int) -> dict:
+    cutoff = utc_now() - timedelta(seconds=threshold)
+    return {
+        'status': {'$in': [status.value for status in statuses]},
+        '$or': [
+            {'modifed': {'$lt': cutoff}},
+            {'modifed': None, 'created': {'$lt': cutoff}}
+        ]
+    }
+
+
+def cleanup_uploads(executor:ThreadPoolExecutor, batch_size:int) -> int:
+    """delete the files and db entries of finished and errored uploads, returns the number deleted"""
+    collection = db.get_collection(FileUploader)
+    filter = _stale_filter([FileUploadStatus.error, FileUploadStatus.complete], MSERVE_UPLOAD_CLEANUP_THRESHOLD)
 
-    uploader.error = 'upload timeout'
-    uploader.status = FileUploadStatus.error
-    uploader.update_timestamp()
-    db.update(uploader)
+    deleted = 0
+    for entries in _batches(filter, batch_size):
+        list(executor.map(_unlink, _upload_paths(entries)))
+        deleted += collection.delete_many({'_id': {'$in': [entry['_id'] for entry in entries]}}).deleted_count
+    return deleted
+
+
+def timeout_uploads(executor:ThreadPoolExecutor, batch_size:int) -> int:
+    """
+    mark stale uploads as timed out and delete their files, returns the number timed out,
+    the stale filter is applied again in the update so an upload that made progress since 
+    the ids were read is left alone, the update tags the uploaders it changes with a marker 
+    unique to the batch and only files of uploaders carrying that marker are deleted
+    """
+    collection = db.get_collection(FileUploader)
+    statuses = [FileUploadStatus.uploading, FileUploadStatus.processing, FileUploadStatus.process_queue]
+    filter = _stale_filter(statuses, MSERVE_UPLOAD_TIMEOUT_THRESHOLD)
+
+    timed_out = 0
+    for entries in _batches(filter, batch_size):
+        ids = [entry['_id'] for entry in entries]
+        marker = ObjectId()
+        updates = {'$set': {
+            'status': FileUploadStatus.error.value, 
+            'error': 'upload timeout', 
+            'lock': None, 
+            'lease_expires': None, 
+            'modifed': utc_now(),
+            'timeout_marker': marker
+        }}
+        timed_out += collection.update_many({**filter, '_id': {'$in': ids}}, updates).modified_count
+
+        changed = list(collection.find({'timeout_marker': marker}, {'_id': 1, 'ext': 1}))
+        list(executor.map(_unlink, _upload_paths(changed)))
+        collection.update_many({'timeout_marker': marker}, {'$unset': {'timeout_marker': ''}})
+    return timed_out
 
 
 def clean_uploads():
@@ -161,102 +567,225 @@ def clean_uploads():
             -> deletes file and db entry
         * looks for uploads with status (uploading|processing|pending) and modifed data > TIMEOUT_THRESHOLD 
             -> sets status to error with timeout message and deletes file but keeps db entry
+    
+    uploaders are read with a projection of id and ext, files are unlinked in parallel and the 
+    db is changed with one delete_many or update_many per MSERVE_CLEAN_UPLOADS_BATCH_SIZE uploaders
     """
     start = time.time()
     logging.info('begin clean uploads process')
 
-    #
-    # clean up finished and errored uploads
-    #
+    with ThreadPoolExecutor(max_workers=MSERVE_CLEAN_FILES_WORKERS) as executor:
 
-    logging.info('cleaning finished and errored uploads')
+        #
+        # clean up finished and errored uploads
+        #
 
-    try:
-        query = {
-            'status': {'$in': [FileUploadStatus.error, FileUploadStatus.complete]}, 
-            'modified': {'$lt': utc_now() - MSERVE_UPLOAD_CLEANUP_THRESHOLD}
-        }
-        for uploader in db.find(FileUploader, filter=query):
-            try:
-                cleanup_upload(uploader)
-            except Exception as e:
-                logging.error(f'error cleaning up file uploader: {uploader.id} - {e}', exc_info=True)
-    except Exception as e:
-        logging.error(f'error cleaning uploads: {e}', exc_info=True)
+        logging.info('cleaning finished and errored uploads')
 
-    #
-    # mark stale uploads as timeout out
-    #
-    
-    logging.info(f'timing out uploads')
-        
-    try:
-        query = {
-            'status': {'$in': [FileUploadStatus.uploading, FileUploadStatus.processing, FileUploadStatus.process_queue]},
-            'modified': {'$lt': utc_now() - MSERVE_UPLOAD_TIMEOUT_THRESHOLD}
-        }
-        for uploader in db.find(FileUploader, filter=query):
-            try:
-                timeout_upload(uploader)
-            except Exception as e:
-                logging.error(f'error timing out file: {e}', exc_info=True)
+        try:
+            deleted = cleanup_uploads(executor, MSERVE_CLEAN_UPLOADS_BATCH_SIZE)
+            logging.info(f'deleted uploads: {deleted}')
+        except Exception as e:
+            logging.error(f'error cleaning uploads: {e}', exc_info=True)
 
-    except Exception as e:
-        logging.error(f'error timing out uploads: {e}', exc_info=True)
+        #
+        # mark stale uploads as timeout out
+        #
+        
+        logging.info(f'timing out uploads')
+            
+        try:
+            timed_out = timeout_uploads(executor, MSERVE_CLEAN_UPLOADS_BATCH_SIZE)
+            logging.info(f'timed out uploads: {timed_out}')
+        except Exception as e:
+            logging.error(f'error timing out uploads: {e}', exc_info=True)
 
     elapsed = round(time.time() - start, 1)
     logging.info(f'end clean uploads process - elapsed: {elapsed}')
 
 
-def clean_files():
+def _walk_storage(storage_dir:Path) -> Generator[os.DirEntry, None, None]:
+    """every file in storage_dir and its shard directories, in any layout"""
+    directories = [storage_dir]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _storage_candidates(storage_dir:Path, modified_before:float) -> tuple[list[Path], int]:
+    """
+    files in storage last changed before modified_before, returns (paths, number skipped as too recent),
+    ctime is checked as well as mtime because ingest renames the upload into storage which keeps its mtime
+    """
+    paths = []
+    skipped = 0
+    for entry in _walk_storage(storage_dir):
+        stat = entry.stat(follow_symlinks=False)
+        if max(stat.st_mtime, stat.st_ctime) >= modified_before:
+            skipped += 1
+        else:
+            paths.append(Path(entry.path))
+    return paths, skipped
+
+
+def _known_payload_cids(batch_size:int) -> set[str]:
+    """
+    every payload cid in the file collections, read from the payload_cid index without fetching documents,
+    indexes are left to the server or the mcore.db cli so a collection without one is scanned instead
+    """
+    payload_cid_key = [('payload_cid', ASCENDING)]
+
+    known = set()
+    for file_type in [ImageFile, AudioFile, VideoFile]:
+        collection = db.get_collection(file_type)
+        cursor = collection.find({}, {'payload_cid': 1, '_id': 0}, batch_size=batch_size)
+
+        if any(list(index['key']) == payload_cid_key for index in collection.index_information().values()):
+            cursor = cursor.hint(payload_cid_key)
+        else:
+            logging.warning(f'{collection.name} has no payload_cid index, scanning the collection')
+
+        known.update(entry['payload_cid'] for entry in cursor if 'payload_cid' in entry)
+    return known
+
+
+def _unlink(path:Path) -> bool:
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return True
+    except Exception as e:
+        logging.error(f'error deleting file: {path} - {e}', exc_info=True)
+        return False
+
+
+def clean_files(dry_run:bool=False) -> dict:
+    """
+    delete files in storage that no image, audio or video file references, 
+    the directory is scanned first and the known payload cids are read after so a file ingested 
+    during the scan has its record by the time it is checked, files changed within the last 
+    MSERVE_CLEAN_FILES_GRACE_SECONDS are never deleted, returns a report of the run
+    """
 
     #
     # clean up dangling files
     #
 
     start = time.time()
-    logging.info('begin clean files process')
+    logging.info(f'begin clean files process{" (dry run)" if dry_run else ""}')
 
     storage_dir = Path(MSERVE_LOCAL_STORAGE_DIRECTORY)
 
-    for path in storage_dir.iterdir():
-        if path.is_file():
-            file_type = guess_type(path.name)[0]
+    paths, skipped = _storage_candidates(storage_dir, start - MSERVE_CLEAN_FILES_GRACE_SECONDS)
+    scanned = time.time()
 
-            if file_type is None or file_type.startswith('image'):
-                try:
-                    db.find_one(ImageFile, filter={'payload_cid': str(path.name)})
-                    continue
-                except NotFoundError:
-                    pass
-            
-            if file_type is None or file_type.startswith('audio'):
-                try:
-                    db.find_one(AudioFile, filter={'payload_cid': str(path.name)})
-                    continue
-                except NotFoundError:
-                    pass
+    known = _known_payload_cids(MSERVE_CLEAN_FILES_BATCH_SIZE)
+    orphans = [path for path in paths if path.name not in known]
+    loaded = time.time()
+
+    if dry_run:
+        for path in orphans:
+            logging.info(f'dangling file: {path}')
+        deleted = 0
+    else:
+        with ThreadPoolExecutor(max_workers=MSERVE_CLEAN_FILES_WORKERS) as executor:
+            deleted = sum(executor.map(_unlink, orphans))
+
+    elapsed = time.time() - start
+    report = {
+        'dry_run': dry_run,
+        'files': len(paths) + skipped,
+        'skipped_recent': skipped,
+        'known_cids': len(known),
+        'orphans': len(orphans),
+        'deleted': deleted,
+        'errors': 0 if dry_run else len(orphans) - deleted,
+        'scan_seconds': round(scanned - start, 3),
+        'load_seconds': round(loaded - scanned, 3),
+        'elapsed': round(elapsed, 3),
+        'files_per_second': round((len(paths) + skipped) / elapsed) if elapsed > 0 else None
+    }
+    logging.info(f'end clean files process - {report}')
+    return report
+
+
+def _relocate(path:Path, dry_run:bool) -> bool:
+    """move a stored payload to its path in the configured layout, returns True if it was moved"""
+    target = storage_path(path.name)
+    if path == target:
+        return False
+    
+    if dry_run:
+        logging.info(f'move: {path} -> {target}')
+        return True
+    
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # payloads are content addressed, if the target exists it is identical #
+        os.replace(path, target)
+        return True
+    except FileNotFoundError:
+        # deleted or moved since the scan #
+        return False
 
-            if file_type is None or file_type.startswith('video'):
-                try:
-                    db.find_one(VideoFile, filter={'payload_cid': str(path.name)})
-                    continue
-                except NotFoundError:
-                    pass
 
+def _in_layout(parts:tuple[str, ...]) -> bool:
+    """True if a directory relative to storage is a shard directory of the configured layout"""
+    return len(parts) <= MSERVE_STORAGE_SHARD_LEVELS and all(len(part) == MSERVE_STORAGE_SHARD_WIDTH for part in parts)
+
+
+def migrate_storage(dry_run:bool=False) -> dict:
+    """
+    move every stored payload to its path in the layout set by MSERVE_STORAGE_SHARD_LEVELS and 
+    MSERVE_STORAGE_SHARD_WIDTH, it can run while the server is up because payloads are read 
+    with locate_payload which falls back to the flat path and each move is a single rename,
+    empty shard directories of the old layout are removed, returns a report of the run
+    """
+    start = time.time()
+    logging.info(f'begin migrate storage process - levels: {MSERVE_STORAGE_SHARD_LEVELS} width: {MSERVE_STORAGE_SHARD_WIDTH}{" (dry run)" if dry_run else ""}')
+
+    storage_dir = Path(MSERVE_LOCAL_STORAGE_DIRECTORY)
+    paths = [Path(entry.path) for entry in _walk_storage(storage_dir)]
+
+    with ThreadPoolExecutor(max_workers=MSERVE_CLEAN_FILES_WORKERS) as executor:
+        moved = sum(executor.map(lambda path: _relocate(path, dry_run), paths))
+
+    # directories of the current layout are kept so a concurrent ingest never loses the directory it just made #
+    removed = 0
+    if not dry_run:
+        for directory, _, _ in sorted(os.walk(storage_dir), key=lambda walk: walk[0].count(os.sep), reverse=True):
+            parts = Path(directory).relative_to(storage_dir).parts
+            if len(parts) == 0 or _in_layout(parts):
+                continue
             try:
-                path.unlink()
-            except Exception as e:
-                logging.error(f'error cleaning up dangling file: {path} - {e}', exc_info=True)
-    
-    elapsed = round(time.time() - start, 1)
-    logging.info(f'end clean files process - elapsed: {elapsed}')
+                os.rmdir(directory)
+                removed += 1
+            except OSError:
+                pass
+
+    elapsed = time.time() - start
+    report = {
+        'dry_run': dry_run,
+        'files': len(paths),
+        'moved': moved,
+        'removed_directories': removed,
+        'elapsed': round(elapsed, 3),
+        'files_per_second': round(len(paths) / elapsed) if elapsed > 0 else None
+    }
+    logging.info(f'end migrate storage process - {report}')
+    return report
 
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('command', choices=['ingest', 'clean-uploads', 'clean-files'])
+    parser.add_argument('command', choices=['ingest', 'clean-uploads', 'clean-files', 'migrate-storage'])
+    parser.add_argument('--dry-run', action='store_true', help='clean-files, migrate-storage: report changes without making them')
     args = parser.parse_args()
 
     match args.command:
@@ -265,6 +794,8 @@ if __name__ == '__main__':
         case 'clean-uploads':
             clean_uploads()
         case 'clean-files':
-            clean_files()
+            clean_files(dry_run=args.dry_run)
+        case 'migrate-storage':
+            migrate_storage(dry_run=args.dry_run)
         case _:
             raise ValueError(f'invalid command: {args.command}')
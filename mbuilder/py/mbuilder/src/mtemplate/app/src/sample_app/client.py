@@ -46,15 +46,15 @@ class SampClient(MStackClient):
         data = self._post('sample-app/sample-item', json=creator.model_dump())
         return SampleItem(**data)
     
-    def read_sample_item(self, id:str = None, cid:str = None) -> SampleItem:
+    def read_sample_item(self, id:str = None, cid:str = None, fields:List[str] = None) -> SampleItem:
         url = self._model_id_type_url('sample-app/sample-item', id, cid)
-        data = self._get(url)
-        return SampleItem(**data)
+        data = self._get(url, params={'fields': self._fields_param(fields)})
+        return self._load(SampleItem, data, fields)
     
     def delete_sample_item(self, id:str = None, cid:str = None) -> None:
         self._delete(self._model_id_type_url('sample-app/sample-item', id, cid))
 
-    def list_sample_items(self, offset:int=0, size:int=50) -> List[SampleItem]:
-        data = self._get('sample-app/sample-item', params={'offset': offset, 'size': size})
-        return [SampleItem(**sample_item) for sample_item in data]
+    def list_sample_items(self, offset:int=0, size:int=50, after:str=None, fields:List[str] = None) -> List[SampleItem]:
+        data = self._get('sample-app/sample-item', params={'offset': offset, 'size': size, 'after': after, 'fields': self._fields_param(fields)})
+        return [self._load(SampleItem, sample_item, fields) for sample_item in data]
     # endfor ::
\ No newline at end of file
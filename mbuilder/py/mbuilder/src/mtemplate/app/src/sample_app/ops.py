@@ -1,6 +1,6 @@
 import os
 
-from mcore.ops import MCoreOps
+from mcore.ops import MCoreOps, AsyncMCoreOps
 from mcore.models import *
 from mcore.errors import MStackUserError, NotFoundError
 from sample_app.models import *
@@ -10,7 +10,8 @@ from sample_app.models import *
 __all__ = [
     'SAMP_SDK_DEFAULT_LIST_OFFSET',
     'SAMP_SDK_DEFAULT_LIST_SIZE',
-    'SampOps'
+    'SampOps',
+    'AsyncSampOps'
 ]
 
 SAMP_SDK_DEFAULT_LIST_OFFSET = os.environ.get('SAMP_SDK_DEFAULT_LIST_OFFSET', 0)
@@ -26,11 +27,11 @@ class SampOps(MCoreOps):
         self.db.create(sample_item)
         return sample_item
     
-    def list_sample_item(self, offset:int=SAMP_SDK_DEFAULT_LIST_OFFSET, size:int=SAMP_SDK_DEFAULT_LIST_SIZE) -> list[SampleItem]:
-        return list(self.db.find(SampleItem, offset=offset, size=size))
+    def list_sample_item(self, offset:int=SAMP_SDK_DEFAULT_LIST_OFFSET, size:int=SAMP_SDK_DEFAULT_LIST_SIZE, after:str=None, fields:list[str]=None) -> list[SampleItem]:
+        return list(self.db.find(SampleItem, offset=offset, size=size, after=after, fields=fields))
     
-    def read_sample_item(self, id:SampleItemId=None, cid:SampleItemCid=None) -> SampleItem:
-        return self.db.read(SampleItem, id=id, cid=cid)
+    def read_sample_item(self, id:SampleItemId=None, cid:SampleItemCid=None, fields:list[str]=None) -> SampleItem:
+        return self.db.read(SampleItem, id=id, cid=cid, fields=fields)
     
     def delete_sample_item(self, logged_in_user:User, id:SampleItemId=None, cid:SampleItemCid=None) -> None:
         
@@ -43,4 +44,34 @@ class SampOps(MCoreOps):
             raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete sample item ' + sample_item.cid)
         
         self.db.delete(SampleItem, id=id, cid=cid)
+    # endfor ::
+
+
+class AsyncSampOps(AsyncMCoreOps):
+
+    # for :: {% for model in models.with_db %} :: {"sample_item": "model.snake_case", "sample item": "model.lower_case", "SampleItem": "model.pascal_case"}
+    # sample item
+
+    async def create_sample_item(self, creator:SampleItemCreator, logged_in_user:User) -> SampleItem:
+        sample_item:SampleItem = creator.create_model(user_cid=logged_in_user.cid)
+        await self.db.create(sample_item)
+        return sample_item
+    
+    async def list_sample_item(self, offset:int=SAMP_SDK_DEFAULT_LIST_OFFSET, size:int=SAMP_SDK_DEFAULT_LIST_SIZE, after:str=None, fields:list[str]=None) -> list[SampleItem]:
+        return [sample_item async for sample_item in self.db.find(SampleItem, offset=offset, size=size, after=after, fields=fields)]
+    
+    async def read_sample_item(self, id:SampleItemId=None, cid:SampleItemCid=None, fields:list[str]=None) -> SampleItem:
+        return await self.db.read(SampleItem, id=id, cid=cid, fields=fields)
+    
+    async def delete_sample_item(self, logged_in_user:User, id:SampleItemId=None, cid:SampleItemCid=None) -> None:
+        
+        try:
+            sample_item = await self.read_sample_item(id, cid)
+        except NotFoundError:
+            return
+
+        if sample_item.user_cid != logged_in_user.cid:
+            raise MStackUserError(f'User {logged_in_user.cid} does not have permission to delete sample item ' + sample_item.cid)
+        
+        await self.db.delete(SampleItem, id=id, cid=cid)
     # endfor ::
\ No newline at end of file
@@ -1,10 +1,11 @@
 from mcore.models import User
 from mcore.types import ModelIdType
 from mserve import app, MSERVE_API_PREFIX
+from mserve.core import raw_list, split_fields, RawDocumentsResponse, MSERVE_RAW_LIST_RESPONSES
 from mserve.dependencies import current_user
 
 from sample_app.models import *
-from sample_app.ops import SampOps
+from sample_app.ops import AsyncSampOps
 
 from fastapi import APIRouter, Depends
 from typing import List
@@ -13,26 +14,32 @@ from os.path import join
 # vars :: {"sample_app":"package_name", "SampOps": "ops_class_name", "sample-app": "api_prefix"}
 
 sample_app_router = APIRouter(tags=['sample_app'])
-ops = SampOps()
+ops = AsyncSampOps()
 
 # for :: {% for model in models.with_endpoint %} :: {"sample_item": "model.snake_case", "sample item": "model.lower_case", "SampleItem": "model.pascal_case", "sample-item": "model.kebab_case"}
 # sample item #
 
 @sample_app_router.post('/sample-item', response_model=SampleItem, response_model_by_alias=False)
 async def create_sample_item(creator:SampleItemCreator, user:User = Depends(current_user)):
-    return ops.create_sample_item(creator, user)
+    return await ops.create_sample_item(creator, user)
 
 @sample_app_router.get('/sample-item', response_model=List[SampleItem], response_model_by_alias=False)
-async def list_sample_item(offset:int=0, size:int=50):
-    return ops.list_sample_item(offset, size)
+async def list_sample_item(offset:int=0, size:int=50, after:str=None, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.list_sample_item(offset, size, after, split_fields(fields)))
+    if MSERVE_RAW_LIST_RESPONSES:
+        return await raw_list(SampleItem, offset=offset, size=size, after=after)
+    return await ops.list_sample_item(offset, size, after)
 
 @sample_app_router.get('/sample-item/{id_type}/{id}', response_model=SampleItem, response_model_by_alias=False)
-async def read_sample_item(id_type:ModelIdType, id:str):
-    return ops.read_sample_item(**{id_type.value: id})
+async def read_sample_item(id_type:ModelIdType, id:str, fields:str=None):
+    if fields:
+        return RawDocumentsResponse(await ops.read_sample_item(**{id_type.value: id}, fields=split_fields(fields)))
+    return await ops.read_sample_item(**{id_type.value: id})
 
 @sample_app_router.delete('/sample-item/{id_type}/{id}', status_code=201)
 async def delete_sample_item(id_type:ModelIdType, id:str, user:User = Depends(current_user)):
-    return ops.delete_sample_item(user, **{id_type.value: id})
+    return await ops.delete_sample_item(user, **{id_type.value: id})
 # endfor ::
 
 app.include_router(sample_app_router, prefix=join(MSERVE_API_PREFIX, 'sample-app'))
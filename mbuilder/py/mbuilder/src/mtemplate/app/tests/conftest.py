@@ -1,6 +1,7 @@
 import pytest
 from pydantic import BaseModel
 from bson import ObjectId
+from pymongo import ASCENDING
 
 from typing import Type, Callable
 from pathlib import Path
@@ -9,7 +10,7 @@ from mcore.auth import create_new_user
 from mcore.types import ContentId
 from mcore.models import *
 from mcore.db import MongoDB
-from mcore.errors import NotFoundError, MStackDBError
+from mcore.errors import NotFoundError, MStackDBError, MStackUserError
 from mcore.util import example_model, example_cid
 
 # vars :: {"sample_app": "package_name", "SampClient": "client_class_name"}
@@ -252,6 +253,27 @@ def _test_db_pagination(model:BaseModel, model_type:Type):
 
     assert total == 10
 
+    # keyset pagination by 3 #
+
+    ids = []
+    after = None
+    while True:
+        page = list(db.find(model_type, size=3, after=after))
+        ids.extend(entry.id for entry in page)
+        if len(page) < 3:
+            break
+        after = page[-1].id
+
+    assert len(ids) == 10
+    assert ids == sorted(ids)
+
+    with pytest.raises(MStackUserError):
+        list(db.find(model_type, after='not an id'))
+
+    # the cursor only holds an _id, it can't page another sort order #
+    with pytest.raises(MStackUserError):
+        list(db.find(model_type, after=ids[0], sort=[('cid', ASCENDING)]))
+
     reset_collection(model_type)
 
 
@@ -328,6 +350,13 @@ def _test_client_crud_ops(
     assert total == 10
     _check_client_response_id(client)
 
+    # keyset pagination by 3 #
+
+    models = list(client.iter_all(list_op, size=3))
+    assert len(models) == 10
+    assert len(set(model.id for model in models)) == 10
+    _check_client_response_id(client)
+
     # read #
 
     reset_collection(model_type)
@@ -1,13 +1,17 @@
 from mcore.models import User, UserCreator, UserPasswordHash
-from mcore.errors import MStackAuthenticationError, NotFoundError
+from mcore.errors import MStackAuthenticationError, MStackBusyError, NotFoundError
 from mcore.auth import *
 from mcore.util import example_model
 from mcore.db import MongoDB
 
 from ..conftest import reset_collection
 
+import asyncio
+import threading
 import pytest
 
+from bson import ObjectId
+
 db = MongoDB.from_cache()
 
 def test_user_creator():
@@ -84,3 +88,58 @@ def test_user_create_procedure():
 
     with pytest.raises(NotFoundError):
         db.find_one(User, {'email': user.email})
+
+
+def test_token_user_cache():
+    cache = TokenUserCache(max_size=2, ttl=60)
+    users = [example_model(UserCreator).create_model() for _ in range(3)]
+    for user in users:
+        user.id = ObjectId()
+
+    assert cache.get(users[0].id) is None
+
+    cache.set(users[0])
+    cache.set(users[1])
+    assert cache.get(users[0].id).email == users[0].email
+
+    # least recently used entry is evicted #
+    cache.set(users[2])
+    assert cache.get(users[1].id) is None
+    assert cache.get(users[2].id) is not None
+
+    # invalidated users are removed and can't be cached again #
+    cache.invalidate(users[0].id)
+    assert cache.get(users[0].id) is None
+    assert cache.is_revoked(users[0].id)
+    cache.set(users[0])
+    assert cache.get(users[0].id) is None
+
+    # expired entries are misses #
+    expired = TokenUserCache(max_size=2, ttl=-1)
+    expired.set(users[0])
+    assert expired.get(users[0].id) is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 4
+    assert stats['hit_rate'] == 2 / 6
+
+
+def test_password_hash_pool():
+    pool = PasswordHashPool(workers=1, queue_size=1)
+
+    hash = asyncio.run(pool.run(get_password_hash, 'password'))
+    assert asyncio.run(pool.run(verify_password, 'password', hash))
+
+    # calls beyond workers + queue_size are rejected #
+    release = threading.Event()
+    futures = [pool.submit(release.wait) for _ in range(2)]
+    with pytest.raises(MStackBusyError):
+        pool.submit(release.wait)
+
+    release.set()
+    for future in futures:
+        future.result()
+    assert pool.pending == 0
+
+    pool.shutdown()
@@ -1,8 +1,12 @@
-from ..conftest import reset_collection, _check_client_response_id, _test_client_crud_ops
+from ..conftest import reset_collection, example_model, _check_client_response_id, _test_client_crud_ops
 
+import os
 import time
+import pytest
 
 from typing import List
+from io import BytesIO
+from hashlib import sha3_256
 from pathlib import Path
 
 from mcore.types import ContentId
@@ -10,6 +14,8 @@ from mcore.db import MongoDB
 from mcore.client import *
 from mcore.models import *
 from mserve import IndexResponse
+from mcore.errors import MStackFilePayloadError
+from mserve.uploads import obtain_lock, ingest_payload, finish_ingest, fail_ingest
 
 db = MongoDB.from_cache()
 
@@ -36,6 +42,40 @@ def test_profiles(client:MStackClient):
         client.profile_delete
     )
 
+def test_profiles_batch(client:MStackClient):
+    reset_collection(Profile)
+
+    creators = [example_model(ProfileCreator) for _ in range(3)]
+    profiles = client.profile_create_many(creators)
+    assert len(profiles) == 3
+    _check_client_response_id(client)
+
+    result = client.profile_read_many(ids=[profiles[2].id, profiles[0].id])
+    assert [profile.id for profile in result.items] == [profiles[2].id, profiles[0].id]
+    assert result.missing == []
+
+    client.profile_delete_many(ids=[profile.id for profile in profiles])
+    assert client.response.status_code == 201
+
+    result = client.profile_read_many(ids=[profiles[0].id])
+    assert result.items == []
+    assert result.missing == [str(profiles[0].id)]
+
+def test_profiles_fields(client:MStackClient):
+    reset_collection(Profile)
+    profiles = client.profile_create_many([example_model(ProfileCreator) for _ in range(3)])
+
+    partials = client.profile_list(fields=['cid', 'name'])
+    assert [partial.model_dump() for partial in partials] == [profile.model_dump(include={'id', 'cid', 'name'}) for profile in profiles]
+
+    partial = client.profile_read(id=profiles[0].id, fields=['name'])
+    assert partial.name == profiles[0].name
+    assert not hasattr(partial, 'cid')
+
+    with pytest.raises(MStackClientError):
+        client.profile_list(fields=['not_a_field'])
+    assert client.response.status_code == 400
+
 def test_file_uploader(client:MStackClient):
 
     # init #
@@ -133,6 +173,127 @@ def test_file_upload_process(image_file_path, client:MStackClient):
     assert uploader.result_cid is not None
     assert isinstance(uploader.result_cid, ContentId)
 
+def test_file_upload_stream(image_file_path, client:MStackClient):
+    uploader = client.upload_file(image_file_path, FileUploadTypes.image, stream=True)
+
+    assert uploader.status == FileUploadStatus.process_queue
+    assert uploader.total_uploaded == uploader.total_size == image_file_path.stat().st_size
+    assert uploader.local_path().stat().st_size == uploader.total_size
+
+def test_file_upload_parts(image_file_path, client:MStackClient):
+    uploader = client.upload_file(image_file_path, FileUploadTypes.image, part_size=FILE_UPLOAD_MIN_PART_SIZE, concurrency=4)
+    uploader = client.file_uploader_read(uploader.id)
+
+    assert uploader.status == FileUploadStatus.process_queue
+    assert sorted(uploader.parts) == list(range(uploader.part_count))
+    assert uploader.local_path().read_bytes() == image_file_path.read_bytes()
+
+def test_file_upload_resume(client:MStackClient):
+    part_size = FILE_UPLOAD_MIN_PART_SIZE
+    data = os.urandom(part_size * 3 + 100)
+    uploader = client.file_uploader_create(FileUploaderCreator(total_size=len(data), type=FileUploadTypes.image, ext='jpg', part_size=part_size))
+
+    # an interrupted upload, part 1 was received and part 2 was corrupted without a checksum to catch it #
+    client.upload_part(uploader.id, 1, data[part_size:part_size * 2])
+    client._put(f'core/file-uploader/{uploader.id}/parts/2', data=bytes(part_size), headers={'Content-Type': 'application/octet-stream'})
+
+    ranges = client.file_uploader_ranges(uploader.id)
+    assert ranges.ranges == [(part_size, part_size * 3)]
+    assert ranges.missing_parts == [0, 3]
+
+    uploader = client.resume_upload_obj(uploader.id, BytesIO(data))
+
+    assert uploader.status == FileUploadStatus.process_queue
+    assert uploader.local_path().read_bytes() == data
+
+def test_ingest_lost_claim(client:MStackClient, image_file:ImageFile):
+    uploader = client.file_uploader_create(example_model(FileUploaderCreator))
+    db.get_collection(FileUploader).update_one({'_id': uploader.id}, {'$set': {'status': FileUploadStatus.process_queue.value}})
+    stale = obtain_lock(db.read(FileUploader, id=uploader.id))
+
+    # the lease expired and another daemon claimed the upload before the stale worker finished #
+    db.get_collection(FileUploader).update_one({'_id': uploader.id}, {'$set': {'lock': 'another-daemon'}})
+    assert not finish_ingest(stale, image_file)
+    assert not fail_ingest(stale, Exception('stale'))
+
+    current = db.read(FileUploader, id=uploader.id)
+    assert current.status == FileUploadStatus.processing
+    assert current.lock == 'another-daemon'
+    assert db.get_collection(ImageFile).count_documents({'cid': str(image_file.cid)}) == 0
+
+    # the claim owner's result is recorded #
+    db.get_collection(FileUploader).update_one({'_id': uploader.id}, {'$set': {'lock': stale.lock}})
+    assert finish_ingest(stale, image_file)
+
+    current = db.read(FileUploader, id=uploader.id)
+    assert current.status == FileUploadStatus.complete
+    assert current.result_cid == image_file.cid
+    assert current.lock is None
+    assert db.get_collection(ImageFile).count_documents({'cid': str(image_file.cid)}) == 1
+
+    db.delete(ImageFile, id=image_file.id)
+
+def test_ingest_moved_upload(client:MStackClient):
+    uploader = client.file_uploader_create(example_model(FileUploaderCreator))
+    db.get_collection(FileUploader).update_one({'_id': uploader.id}, {'$set': {'status': FileUploadStatus.process_queue.value}})
+    claimed = obtain_lock(db.read(FileUploader, id=uploader.id))
+
+    # a worker that lost its lease moved the upload into storage, without a payload hash it can't be found #
+    claimed.local_path().unlink(missing_ok=True)
+    assert claimed.payload_hash is None
+
+    with pytest.raises(MStackFilePayloadError) as e:
+        ingest_payload(claimed)
+    assert fail_ingest(claimed, e.value)
+
+    current = db.read(FileUploader, id=uploader.id)
+    assert current.status == FileUploadStatus.error
+    assert 'payload hash is unknown' in current.error
+
+def test_download_file(client:MStackClient, tmp_path:Path):
+    data = os.urandom(1024 * 1024 + 100)
+    cid = ContentId.from_digest(sha3_256(data).digest(), len(data), 'bin')
+    payload_path = storage_path(cid)
+    payload_path.parent.mkdir(parents=True, exist_ok=True)
+    payload_path.write_bytes(data)
+
+    # an interrupted download, only the missing range is requested #
+    path = tmp_path / 'download.bin'
+    path.write_bytes(data[:1000])
+    client.download_file(cid, path, chunk_size=64 * 1024)
+
+    assert client.response.status_code == 206
+    assert client.response.headers['ETag'] == f'"{cid}"'
+    assert 'immutable' in client.response.headers['Cache-Control']
+    assert path.read_bytes() == data
+
+    response = client.session.get(f'{client.url_base}/core/payloads/{cid}', headers={'If-None-Match': f'"{cid}"'})
+    assert response.status_code == 304
+
+    payload_path.unlink()
+
+def test_download_file_corrupt(client:MStackClient, tmp_path:Path):
+    data = os.urandom(256 * 1024)
+    cid = ContentId.from_digest(sha3_256(data).digest(), len(data), 'bin')
+    payload_path = storage_path(cid)
+    payload_path.parent.mkdir(parents=True, exist_ok=True)
+    payload_path.write_bytes(data)
+
+    # a stale prefix is only found once the resumed file is hashed, the whole payload is downloaded again #
+    path = tmp_path / 'download.bin'
+    path.write_bytes(os.urandom(1000))
+    client.download_file(cid, path, chunk_size=64 * 1024)
+
+    assert client.response.status_code == 200
+    assert path.read_bytes() == data
+
+    # a file of the right size is not trusted without its digest #
+    path.write_bytes(bytes(len(data)))
+    client.download_file(cid, path)
+    assert path.read_bytes() == data
+
+    payload_path.unlink()
+
 def test_image_file(image_file, client:MStackClient):
     pass
 
@@ -1,6 +1,15 @@
-from ..conftest import example_model, example_cid, _test_db_crud, _test_db_pagination
+from ..conftest import example_model, example_cid, reset_collection, _test_db_crud, _test_db_pagination
 
+import asyncio
+import pytest
+
+from mcore.db import AsyncMongoDB, MongoDB
+from mcore.errors import NotFoundError, MStackDBError, MStackUserError
 from mcore.models import *
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+
+db = MongoDB.from_cache()
 
 
 def test_user():
@@ -60,3 +69,148 @@ def test_video_release():
 
 def test_text_file():
     pass
+
+
+def test_async_db():
+    profile_creator:ProfileCreator = example_model(ProfileCreator)
+    profile = profile_creator.create_model(user_cid=example_cid(User))
+
+    async def crud():
+        # create a new client for each event loop, the cached client is bound to the server's loop #
+        db = AsyncMongoDB()
+
+        await db.create(profile)
+        assert profile.id is not None
+
+        assert await db.read(profile) == profile
+        assert await db.read(Profile, id=profile.id) == profile
+        assert await db.read(Profile, cid=example_cid(Profile)) == profile
+        assert await db.find_one(Profile, {'user_cid': str(example_cid(User))}) == profile
+        assert [item async for item in db.find(Profile)] == [profile]
+
+        with pytest.raises(MStackDBError):
+            await db.read(Profile)
+
+        await db.delete(Profile, id=profile.id)
+
+        with pytest.raises(NotFoundError):
+            await db.read(Profile, id=profile.id)
+
+    reset_collection(Profile)
+    asyncio.run(crud())
+    reset_collection(Profile)
+
+
+def test_stored_cid():
+    reset_collection(Profile)
+    profile_creator:ProfileCreator = example_model(ProfileCreator)
+    profile = profile_creator.create_model(user_cid=example_cid(User))
+    db.create(profile)
+    assert db.read(Profile, id=profile.id).verify_cid()
+
+    # loaded documents keep their stored cid, verify_cid recomputes it #
+    db.get_collection(Profile).update_one({'_id': profile.id}, {'$set': {'name': 'changed outside the app'}})
+    loaded = db.read(Profile, id=profile.id)
+    assert loaded.cid == profile.cid
+    assert not loaded.verify_cid()
+    assert loaded.compute_cid() != profile.cid
+
+    reset_collection(Profile)
+
+
+def test_find_raw():
+    reset_collection(Profile)
+    profiles = [example_model(ProfileCreator).create_model(user_cid=example_cid(User)) for _ in range(5)]
+    db.create_many(profiles)
+    db.get_collection(Profile).update_many({}, {'$set': {'not_a_field': True}})
+
+    documents = list(db.find_raw(Profile, size=3))
+    assert documents == [profile.model_dump(mode='json') for profile in profiles[:3]]
+
+    after = list(db.find_raw(Profile, after=documents[-1]['id']))
+    assert [document['id'] for document in after] == [str(profile.id) for profile in profiles[3:]]
+
+    reset_collection(Profile)
+
+
+def test_find_fields():
+    reset_collection(Profile)
+    profiles = [example_model(ProfileCreator).create_model(user_cid=example_cid(User)) for _ in range(3)]
+    db.create_many(profiles)
+
+    partials = list(db.find(Profile, fields=['cid', 'name']))
+    assert [partial.model_dump() for partial in partials] == [profile.model_dump(include={'id', 'cid', 'name'}) for profile in profiles]
+
+    partial = db.read(Profile, id=profiles[1].id, fields=['name'])
+    assert partial.model_dump() == profiles[1].model_dump(include={'id', 'name'})
+
+    with pytest.raises(MStackUserError):
+        db.read(Profile, id=profiles[1].id, fields=['not_a_field'])
+
+    reset_collection(Profile)
+
+
+def test_indexes():
+    reset_collection(User)
+    reset_collection(UserPasswordHash)
+
+    db.ensure_indexes([User, UserPasswordHash])
+    db.ensure_indexes([User, UserPasswordHash])     # should be idempotent
+
+    for collection, indexes in db.verify_indexes([User, UserPasswordHash]).items():
+        for name, is_covered in indexes.items():
+            assert is_covered, f'{collection}.{name} is not index covered'
+
+    assert 'IXSCAN' in db.explain(User, {'email': 'email@example.com'})
+    assert 'COLLSCAN' in db.explain(User, {'first_name': 'Alice'})
+
+    user = example_model(UserCreator).create_model()
+    db.create(user)
+
+    duplicate = example_model(UserCreator).create_model()
+    with pytest.raises(DuplicateKeyError):
+        db.create(duplicate)
+
+    reset_collection(User)
+    reset_collection(UserPasswordHash)
+
+
+def test_bulk_operations():
+    reset_collection(Profile)
+
+    creator:ProfileCreator = example_model(ProfileCreator)
+    profiles = [creator.create_model(user_cid=example_cid(User)) for _ in range(5)]
+
+    # create many #
+    db.create_many(profiles)
+    for profile in profiles:
+        assert isinstance(profile.id, ObjectId)
+
+    # read many, request order and missing ids #
+    missing_id = ObjectId()
+    ids = [profiles[3].id, missing_id, profiles[0].id]
+    items, missing = db.read_many(Profile, ids=ids)
+    assert [item.id for item in items] == [profiles[3].id, profiles[0].id]
+    assert missing == [str(missing_id)]
+
+    items, missing = db.read_many(Profile, cids=[example_cid(Profile)])
+    assert len(items) == 1
+    assert missing == []
+
+    with pytest.raises(MStackDBError):
+        db.read_many(Profile)
+
+    # update many #
+    for profile in profiles:
+        profile.name = 'updated'
+    assert db.update_many(profiles, ordered=False) == 5
+    assert all(item.name == 'updated' for item in db.read_many(Profile, ids=[p.id for p in profiles])[0])
+
+    # delete many #
+    assert db.delete_many(Profile, ids=[profile.id for profile in profiles[0:2]]) == 2
+    assert len(list(db.find(Profile))) == 3
+
+    with pytest.raises(NotFoundError):
+        db.update_many(profiles)
+
+    reset_collection(Profile)
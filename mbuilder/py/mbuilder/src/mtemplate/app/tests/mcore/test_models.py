@@ -1,5 +1,8 @@
 from ..conftest import *
 
+import zlib
+import struct
+
 from mcore.models import *
 
 
@@ -71,6 +74,30 @@ def test_image_file(image_file, image_file_cid, image_file_payload):
     _test_model_json_str(image_file, image_file_cid, ImageFile)
 
 
+def _write_png(path, width:int, height:int) -> None:
+    def chunk(kind:bytes, data:bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    
+    rows = b''.join(b'\x00' + b'\x80' * 3 * width for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+def test_image_file_probe(tmp_path):
+    path = tmp_path / 'probe.png'
+    _write_png(path, 37, 21)
+
+    info = mediainfo(path).image_tracks[0]
+    assert image_header_size(path) == (info.width, info.height) == (37, 21)
+
+    probe_cache.clear()
+    first = ImageFile.from_filepath(path, example_cid(User))
+    second = ImageFile.from_filepath(path, example_cid(User))
+
+    assert (probe_cache.misses, probe_cache.hits) == (1, 1)
+    assert (second.width, second.height) == (first.width, first.height) == (37, 21)
+
+
 def test_image_release(image_release_cid):
     _test_model_examples(ImageRelease)
     _test_model_creator_and_examples(ImageRelease, ImageReleaseCreator)
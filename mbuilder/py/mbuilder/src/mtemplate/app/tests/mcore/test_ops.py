@@ -1,3 +1,11 @@
+from hashlib import sha3_256
+
+from bson import ObjectId
+
+from mcore.ops import UploadHashes
+from mcore.types import ContentId
+
+
 
 
 def test_user():
@@ -25,4 +33,25 @@ def test_video_file():
     pass
 
 def test_video_release():
-    pass
\ No newline at end of file
+    pass
+
+def test_upload_hashes():
+    hashes = UploadHashes(max_size=10)
+    data = b'0123456789' * 1000
+    expected = ContentId.from_digest(sha3_256(data).digest(), len(data), '').hash
+
+    # in order chunks #
+    uploader_id = ObjectId()
+    hashes.update(uploader_id, 0, data[:4000])
+    hashes.update(uploader_id, 4000, data[4000:])
+    assert hashes.pop_hash(uploader_id, len(data)) == expected
+    assert hashes.pop_hash(uploader_id, len(data)) is None
+
+    # out of order chunk breaks the chain #
+    hashes.update(uploader_id, 0, data[:4000])
+    hashes.update(uploader_id, 5000, data[5000:])
+    assert hashes.pop_hash(uploader_id, len(data)) is None
+
+    # incomplete upload #
+    hashes.update(uploader_id, 0, data[:4000])
+    assert hashes.pop_hash(uploader_id, len(data)) is None
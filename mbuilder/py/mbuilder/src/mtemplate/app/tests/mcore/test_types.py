@@ -2,7 +2,9 @@ import pytest
 from bson import ObjectId
 from typing import Annotated, List
 from pydantic import BaseModel, ValidationError
-from mcore.types import DataHierarchy, _validate_object_id, unique_list_validator, _list_is_unique, TagList
+from io import BytesIO
+from hashlib import sha3_256
+from mcore.types import DataHierarchy, _validate_object_id, unique_list_validator, _list_is_unique, TagList, ContentId
 
 
 def test_mongo_id():
@@ -94,3 +96,25 @@ def test_tag_list():
     
     with pytest.raises(ValidationError):
         TestModel(tags=long_tag_list)
+
+def test_content_id_from_digest():
+    data = b'some file payload' * 1000
+    expected = ContentId.from_io(BytesIO(data), len(data), 'bin')
+    assert ContentId.from_digest(sha3_256(data).digest(), len(data), 'bin') == expected
+
+def test_content_id_parse():
+    cid = ContentId.from_string('some string', 'tar.gz')
+    parsed = ContentId.parse(str(cid))
+
+    assert parsed == cid
+    assert parsed.ext == 'tar.gz'
+    assert ContentId.parse(str(cid)) is parsed, 'recent identifiers should be served from the parse cache'
+    assert ContentId.validate(parsed) is parsed
+    assert {cid: 1}[parsed] == 1
+
+    with pytest.raises(ValueError):
+        ContentId.parse('1' + str(cid)[1:])
+
+    for invalid in ['', str(cid)[:40], str(cid).replace(str(cid.size), 'x'), '0' + '!' * 43 + '5.json']:
+        with pytest.raises(ValueError):
+            ContentId.parse(invalid)
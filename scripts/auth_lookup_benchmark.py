@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+login lookup benchmark - compares fetching a user and their password hash with two queries
+against the single $lookup aggregation used by authenticate_user, password verification is
+excluded so only the database round trips are measured
+
+    python scripts/auth_lookup_benchmark.py --iterations 1000
+"""
+import time
+import argparse
+import statistics
+
+from mcore.db import MongoDB
+from mcore.auth import create_new_user, delete_user, _user_password_pipeline, _user_and_password_hash
+from mcore.models import User, UserCreator, UserPasswordHash
+from mcore.util import example_model
+
+
+def two_queries(db:MongoDB, email:str) -> tuple[User, UserPasswordHash]:
+    """the lookup authenticate_user used before the aggregation"""
+    user = db.find_one(User, {'email': email.lower()})
+    user_pw = list(db.find(UserPasswordHash, {'user_id': user.id}))[0]
+    return user, user_pw
+
+
+def one_aggregation(db:MongoDB, email:str) -> tuple[User, UserPasswordHash]:
+    return _user_and_password_hash(db.aggregate(User, _user_password_pipeline(email)))
+
+
+def measure(lookup, db:MongoDB, email:str, iterations:int) -> list[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        lookup(db, email)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summary(latencies:list[float]) -> str:
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f'p50={quantiles[49] * 1000:.3f}ms p95={quantiles[94] * 1000:.3f}ms mean={statistics.mean(latencies) * 1000:.3f}ms'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='login lookup benchmark')
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoDB.from_cache()
+    db.ensure_indexes([User, UserPasswordHash])
+
+    user_creator:UserCreator = example_model(UserCreator)
+    user_creator.email = f'lookup-benchmark-{time.time_ns()}@example.com'
+    user = create_new_user(user_creator)
+
+    try:
+        # warm up connections and caches #
+        measure(two_queries, db, user.email, 10)
+        measure(one_aggregation, db, user.email, 10)
+
+        print(f'two queries     {summary(measure(two_queries, db, user.email, args.iterations))}')
+        print(f'one aggregation {summary(measure(one_aggregation, db, user.email, args.iterations))}')
+
+    finally:
+        delete_user(user)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+content id benchmark - parse and serialize throughput of ContentId, with and without the parse cache,
+and validating and dumping a model that holds a list of 50 content ids
+
+    python scripts/cid_benchmark.py --number 20000
+"""
+import timeit
+import argparse
+
+from typing import List
+
+from mcore.types import ContentId, ContentIdType, _parse
+from pydantic import BaseModel
+
+
+LIST_SIZE = 50
+
+
+class Listing(BaseModel):
+    cids: List[ContentIdType]
+
+
+def throughput(fn, number:int) -> float:
+    return number / timeit.timeit(fn, number=number)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='content id benchmark')
+    parser.add_argument('--number', type=int, default=20_000)
+    args = parser.parse_args()
+
+    cids = [ContentId.from_string(f'item {n}', 'json') for n in range(LIST_SIZE)]
+    identifiers = [str(cid) for cid in cids]
+    listing = {'cids': identifiers}
+    model_number = max(1, args.number // LIST_SIZE)
+
+    results = {
+        'parse (cached)': throughput(lambda: ContentId.parse(identifiers[0]), args.number),
+        'parse (uncached)': throughput(lambda: _parse(ContentId, identifiers[0]), args.number),
+        'validate str': throughput(lambda: ContentId.validate(identifiers[0]), args.number),
+        'serialize': throughput(lambda: str(cids[0]), args.number),
+        f'model validate x{LIST_SIZE}': throughput(lambda: Listing.model_validate(listing), model_number) * LIST_SIZE,
+        f'model dump x{LIST_SIZE}': throughput(lambda: Listing.model_validate(listing).model_dump(mode='json'), model_number) * LIST_SIZE,
+    }
+
+    for name, per_second in results.items():
+        print(f'{name:<20} {per_second:>12,.0f} / s')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+list benchmark - compares a size=500 page of profiles served through models and the response model
+against the raw document path enabled by MSERVE_RAW_LIST_RESPONSES, requests are made in process
+so only the app and database are measured, the seeded profiles are deleted afterwards
+
+    python scripts/list_benchmark.py --size 500 --iterations 50
+"""
+import time
+import argparse
+import statistics
+
+import mserve
+import mserve.core
+
+from mcore.db import MongoDB
+from mcore.models import Profile, ProfileCreator, User
+from mcore.util import example_model, example_cid
+
+from fastapi.testclient import TestClient
+
+
+def measure(client:TestClient, url:str, iterations:int) -> list[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+def summary(latencies:list[float], size:int) -> str:
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f'p50={quantiles[49] * 1000:.2f}ms p95={quantiles[94] * 1000:.2f}ms rows/s={size / statistics.mean(latencies):,.0f}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='list benchmark')
+    parser.add_argument('--size', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    db = MongoDB.from_cache()
+    user_cid = example_cid(User)
+    profiles = [example_model(ProfileCreator).create_model(user_cid=user_cid) for _ in range(args.size)]
+    db.create_many(profiles)
+
+    client = TestClient(mserve.app)
+    url = f'{mserve.MSERVE_API_PREFIX}/core/profiles?size={args.size}'
+
+    try:
+        for raw in (False, True):
+            mserve.core.MSERVE_RAW_LIST_RESPONSES = raw
+            measure(client, url, 5)
+            latencies = measure(client, url, args.iterations)
+            print(f'{"raw documents" if raw else "models":<15} {summary(latencies, args.size)}')
+    finally:
+        db.delete_many(Profile, ids=[profile.id for profile in profiles])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+login storm benchmark - measures latency of the index endpoint while many clients log in at once,
+with password hashing off the event loop the index latency should stay flat during the storm
+
+    python scripts/login_benchmark.py --logins 200 --concurrency 32
+"""
+import time
+import argparse
+import statistics
+import threading
+
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mcore.client import MStackClient, MSTACK_API_HOST, MSTACK_API_PREFIX
+from mcore.models import UserCreator
+from mcore.util import example_model
+
+
+def percentiles(samples:list[float]) -> str:
+    if len(samples) < 2:
+        return 'n/a'
+    quantiles = statistics.quantiles(samples, n=100)
+    return f'p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms max={max(samples) * 1000:.1f}ms n={len(samples)}'
+
+
+def probe(url:str, stop:threading.Event, interval:float) -> list[float]:
+    """request url every interval seconds until stop is set, returns the latencies"""
+    session = requests.Session()
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(url).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+    return latencies
+
+
+def measure_probe(url:str, seconds:float, interval:float) -> list[float]:
+    stop = threading.Event()
+    timer = threading.Timer(seconds, stop.set)
+    timer.start()
+    return probe(url, stop, interval)
+
+
+def login_storm(url:str, email:str, password:str, logins:int, concurrency:int) -> tuple[float, dict[int, int]]:
+    """returns (elapsed seconds, count of each response status code)"""
+    statuses:dict[int, int] = {}
+    lock = threading.Lock()
+
+    def login(_):
+        response = requests.post(url, data={'username': email, 'password': password})
+        with lock:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(login, range(logins)))
+    return time.perf_counter() - start, statuses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='login storm benchmark')
+    parser.add_argument('--host', default=MSTACK_API_HOST)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--probe-interval', type=float, default=0.01)
+    parser.add_argument('--baseline-seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    url_base = join(args.host, MSTACK_API_PREFIX)
+    index_url = join(url_base, '')
+    login_url = join(url_base, 'core/auth/login')
+
+    # create a user to log in with #
+
+    user_creator:UserCreator = example_model(UserCreator)
+    user_creator.email = f'login-benchmark-{time.time_ns()}@example.com'
+    client = MStackClient()
+    client.url_base = url_base
+    client.user_create(user_creator)
+    client.login(user_creator.email, user_creator.password1)
+
+    try:
+        baseline = measure_probe(index_url, args.baseline_seconds, args.probe_interval)
+        print(f'index baseline     {percentiles(baseline)}')
+
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as probe_executor:
+            probe_future = probe_executor.submit(probe, index_url, stop, args.probe_interval)
+            elapsed, statuses = login_storm(login_url, user_creator.email, user_creator.password1, args.logins, args.concurrency)
+            stop.set()
+            during = probe_future.result()
+
+        print(f'index during storm {percentiles(during)}')
+        print(f'logins             {args.logins / elapsed:.1f}/s over {elapsed:.2f}s statuses={statuses}')
+
+    finally:
+        client.user_delete()
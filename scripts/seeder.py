@@ -110,13 +110,8 @@ class DataSeeder:
             assert len(alt_paths) > 0
 
             master = ImageFile.ingest(master_path, user_cid=artist.user_cid, leave_original=True)
-            self.db.create(master)
-
-            alts = []
-            for alt_path in alt_paths:
-                alt = ImageFile.ingest(alt_path, user_cid=artist.user_cid, leave_original=True)
-                self.db.create(alt)
-                alts.append(alt)
+            alts = [ImageFile.ingest(alt_path, user_cid=artist.user_cid, leave_original=True) for alt_path in alt_paths]
+            self.db.create_many([master] + alts)
 
             return ImageReleaseCreator(
                 master=master.cid,
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+upload benchmark - uploads a generated sample file with sequential chunks, a single streamed request
+and concurrent parts, and prints the throughput of each, the uploads are left for the clean uploads process
+
+    python scripts/upload_benchmark.py --size-mb 300 --part-size-mb 8 --concurrency 8
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from os.path import join
+from pathlib import Path
+
+from mcore.client import MStackClient, MSTACK_API_HOST, MSTACK_API_PREFIX
+from mcore.models import UserCreator, FileUploadTypes, FileUploadStatus
+from mcore.util import example_model
+
+
+def write_sample(path:Path, size:int, block_size:int=1024 * 1024) -> None:
+    with path.open('wb') as f:
+        remaining = size
+        while remaining > 0:
+            block = os.urandom(min(block_size, remaining))
+            f.write(block)
+            remaining -= len(block)
+
+
+def timed_upload(client:MStackClient, path:Path, **kwargs) -> float:
+    start = time.perf_counter()
+    uploader = client.upload_file(path, FileUploadTypes.video, extension='bin', **kwargs)
+    elapsed = time.perf_counter() - start
+    if uploader.status != FileUploadStatus.process_queue:
+        raise RuntimeError(f'upload did not finish: {uploader}')
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='upload benchmark')
+    parser.add_argument('--host', default=MSTACK_API_HOST)
+    parser.add_argument('--size-mb', type=int, default=300)
+    parser.add_argument('--chunk-size-kb', type=int, default=250)
+    parser.add_argument('--part-size-mb', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+
+    client = MStackClient()
+    client.url_base = join(args.host, MSTACK_API_PREFIX)
+
+    user_creator:UserCreator = example_model(UserCreator)
+    user_creator.email = f'upload-benchmark-{time.time_ns()}@example.com'
+    client.user_create(user_creator)
+    client.login(user_creator.email, user_creator.password1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'sample.bin'
+        write_sample(path, size)
+
+        runs = {
+            f'sequential {args.chunk_size_kb}KB chunks': dict(chunk_size=args.chunk_size_kb * 1000),
+            'single streamed request': dict(stream=True),
+            f'{args.concurrency} x {args.part_size_mb}MB parts': dict(part_size=args.part_size_mb * 1024 * 1024, concurrency=args.concurrency),
+        }
+
+        try:
+            for name, kwargs in runs.items():
+                elapsed = timed_upload(client, path, **kwargs)
+                print(f'{name:<30} {elapsed:7.2f}s {args.size_mb / elapsed:8.1f} MB/s')
+        finally:
+            client.user_delete()